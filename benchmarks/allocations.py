@@ -0,0 +1,101 @@
+"""
+Measures the memory a single message allocates on its way through the engine, once the way it was built before the
+fast paths (validating every model, joining the downloaded chunks, deep copying the context for the workflow) and
+once the way it is built now (validated once at the channel, model_construct inside, attachments in one buffer that
+is shared through a memoryview, forked context).
+
+Run it with `python -m benchmarks.allocations`.
+"""
+
+import base64
+import gc
+import tracemalloc
+from collections.abc import Callable
+from copy import deepcopy
+
+import typer
+
+from models.context import Context
+from models.message import FileModel
+from models.request import RequestMessageModel
+from models.response import ResponseMessageModel
+from models.system_prompt import SystemPrompt
+
+CHUNK_SIZE = 64 * 2**10
+
+
+def download_chunks(size: int) -> list[bytes]:
+    return [b"\xff" * min(CHUNK_SIZE, size - i) for i in range(0, size, CHUNK_SIZE)]
+
+
+def message_before(chunks: list[bytes], history: list[RequestMessageModel]) -> Context:
+    file = FileModel(mimetype="image/jpeg", data=b"".join(chunks))
+    request = RequestMessageModel(role="user", content=["What is on this picture?", file])
+    ctx = Context(request=request, listener="Benchmark", emitter="Benchmark")
+    ctx.user_id = "user"
+    workflow_ctx = deepcopy(ctx)
+    workflow_ctx.shortterm_memory = [RequestMessageModel.model_validate(m.model_dump()) for m in history]
+    workflow_ctx.system_prompts.append(SystemPrompt(name="DateTime", content="It's Monday."))
+    base64.b64encode(file.data)
+    workflow_ctx.response = ResponseMessageModel(role="llm", content=["A cat."])
+    return workflow_ctx
+
+
+def message_after(chunks: list[bytes], history: list[RequestMessageModel]) -> Context:
+    buffer = bytearray(sum(len(chunk) for chunk in chunks))
+    size = 0
+    for chunk in chunks:
+        buffer[size : size + len(chunk)] = chunk
+        size += len(chunk)
+    file = FileModel.model_construct(mimetype="image/jpeg", data=memoryview(buffer).toreadonly())
+    request = RequestMessageModel(role="user", content=["What is on this picture?", file])
+    ctx = Context.model_construct(request=request, listener="Benchmark", emitter="Benchmark", user_id="user")
+    workflow_ctx = ctx.fork()
+    workflow_ctx.shortterm_memory = list(history)
+    workflow_ctx.system_prompts.append(SystemPrompt.model_construct(name="DateTime", content="It's Monday."))
+    base64.b64encode(file.data)
+    workflow_ctx.response = ResponseMessageModel.model_construct(role="llm", content=["A cat."])
+    return workflow_ctx
+
+
+def measure(fn: Callable[[list[bytes], list[RequestMessageModel]], Context], size: int, history_length: int) -> dict:
+    """
+    Runs fn once with the chunks and history already allocated and returns what it allocated.
+
+    Returns:
+        dict: The peak and the retained bytes and the number of allocated blocks.
+    """
+    chunks = download_chunks(size)
+    history = [RequestMessageModel(role="user", content=[f"Message {i}"]) for i in range(history_length)]
+    fn(chunks, history)  # Warm up the pydantic caches
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.take_snapshot()
+    tracemalloc.reset_peak()
+    ctx = fn(chunks, history)
+    _, peak = tracemalloc.get_traced_memory()
+    after = tracemalloc.take_snapshot()
+    tracemalloc.stop()
+    stats = after.compare_to(before, "filename")
+    del ctx
+    return {
+        "peak": peak,
+        "retained": sum(stat.size_diff for stat in stats),
+        "blocks": sum(stat.count_diff for stat in stats),
+    }
+
+
+def main(size: int = 2 * 2**20, history_length: int = 20) -> None:
+    """
+    Compares the allocations of one message with an attachment of size bytes before and after the fast paths.
+    """
+    for name, fn in (("before", message_before), ("after", message_after)):
+        result = measure(fn, size, history_length)
+        typer.echo(
+            f"{name:>6}: peak {result['peak'] / 2**20:7.2f} MiB, retained {result['retained'] / 2**20:7.2f} MiB, "
+            f"{result['blocks']:6} blocks",
+        )
+
+
+if __name__ == "__main__":
+    typer.run(main)
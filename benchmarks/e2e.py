@@ -0,0 +1,205 @@
+"""
+Measures the overhead of the engine itself: synthetic messages are injected by a receiver plugin at a fixed rate and
+run through the real DefaultWorkflowPlugin, SimpleMemoryPlugin and system prompt plugins, with a stub LLM that only
+sleeps, an emitter that only counts and an LLM function plugin without functions. The report (json) has the throughput,
+the latency percentiles of the whole workflow and of every stage, the CPU time and the peak RSS.
+
+Run it from the repository root with `python -m benchmarks.e2e --messages 2000 --rate 200 --output result.json`. The
+benchmark plugins are in benchmarks/plugins.
+"""
+
+import functools
+import json
+import tempfile
+import time
+from collections.abc import Awaitable, Callable
+from pathlib import Path
+from typing import Literal, Optional
+
+import anyio
+import typer
+from pydantic import BaseModel
+
+from benchmarks.report import environment, peak_rss, summarize
+from models.character import CharacterModel, PluginModel
+from models.context import Context
+from plugin_system.abc.workflow import WorkflowPlugin
+from plugin_system.plugin_manager import PluginManager
+from utilities.logging import LoggingConfig, configure_logging
+
+PLUGIN_DIR = Path(__file__).resolve().parent / "plugins"
+
+# The stages of the DefaultWorkflowPlugin, in the order they run
+STAGES = (
+    "get_shortterm_memory",
+    "gather_system_prompts",
+    "gather_llm_functions",
+    "update_status",
+    "call_llm",
+    "reply",
+    "add_to_shortterm_memory",
+)
+
+
+class E2eConfig(BaseModel):
+    messages: int = 1000
+    rate: float = 100  # messages per second, 0 injects all at once
+    users: int = 10
+    message_words: int = 20
+    attachment_rate: float = 0.0
+    attachment_size: int = 256 * 2**10
+    llm_latency: float = 0.2
+    llm_latency_jitter: float = 0.05
+    memory_format: Literal["json", "binary"] = "json"
+    seed: int | None = 0
+    log_level: str = "WARNING"  # INFO logs every stage of every message, that would be measured too
+
+
+def build_character(config: E2eConfig, data_dir: Path) -> CharacterModel:
+    return CharacterModel(
+        name="Benchmark",
+        author="wasurenakusa team",
+        plugins=[
+            PluginModel(
+                name="BenchReceiverPlugin",
+                config={
+                    "messages": config.messages,
+                    "rate": config.rate,
+                    "users": config.users,
+                    "message_words": config.message_words,
+                    "attachment_rate": config.attachment_rate,
+                    "attachment_size": config.attachment_size,
+                    "seed": config.seed,
+                },
+            ),
+            PluginModel(
+                name="BenchLlmPlugin",
+                config={
+                    "latency": config.llm_latency,
+                    "latency_jitter": config.llm_latency_jitter,
+                    "seed": config.seed,
+                },
+            ),
+            PluginModel(name="BenchEmitterPlugin", config=None),
+            PluginModel(name="BenchFunctionsPlugin", config=None),
+            PluginModel(name="DefaultWorkflowPlugin", config=None),
+            PluginModel(
+                name="SimpleMemoryPlugin",
+                config={"memory_file": str(data_dir / "memory.json"), "memory_format": config.memory_format},
+            ),
+            PluginModel(
+                name="CharacterDescriptionsPlugin",
+                config={"introduction": "You are a benchmark.", "personality": "Fast and precise."},
+            ),
+            PluginModel(name="DateTimePlugin", config={"locale": "en"}),
+        ],
+    )
+
+
+def instrument_workflow(workflow: WorkflowPlugin) -> dict[str, list[float]]:
+    """
+    Wraps the stage methods of the workflow instance, so every call is timed.
+
+    Returns:
+        dict[str, list[float]]: The durations in seconds per stage, filled while the benchmark runs.
+    """
+    timings: dict[str, list[float]] = {}
+
+    def timed(fn: Callable[[Context], Awaitable[None]], samples: list[float]) -> Callable[[Context], Awaitable[None]]:
+        @functools.wraps(fn)
+        async def wrapper(ctx: Context) -> None:
+            start = time.perf_counter()
+            try:
+                await fn(ctx)
+            finally:
+                samples.append(time.perf_counter() - start)
+
+        return wrapper
+
+    for stage in STAGES:
+        timings[stage] = []
+        setattr(workflow, stage, timed(getattr(workflow, stage), timings[stage]))
+    return timings
+
+
+async def run_benchmark(config: E2eConfig) -> dict:
+    """
+    Runs the engine with the benchmark character until every message is answered.
+
+    Returns:
+        dict: The report.
+    """
+    configure_logging(LoggingConfig(level=config.log_level))
+    with tempfile.TemporaryDirectory() as data_dir:
+        character = build_character(config, Path(data_dir))
+        cpu_start = time.process_time()
+        async with anyio.create_task_group() as tg:
+            pm = await PluginManager(character, task_group=tg, plugin_dirs=[PLUGIN_DIR]).init()
+            stage_timings = instrument_workflow(pm.call("start_workflow").plugin_list[0])
+            receiver = pm.call("listen").plugin_list[0]
+            emitter = pm.call("emit").plugin_list[0]
+            llm = pm.call("get_llm_response").plugin_list[0]
+            try:
+                await pm.call("listen").all_async()
+            finally:
+                with anyio.CancelScope(shield=True):
+                    await pm.shutdown()
+                tg.cancel_scope.cancel()
+        cpu_time = time.process_time() - cpu_start
+
+    duration = receiver.finished - receiver.started
+    return {
+        "benchmark": "e2e",
+        "environment": environment(),
+        "config": config.model_dump(),
+        "messages": config.messages,
+        "completed": len(receiver.latencies),
+        "errors": receiver.errors,
+        "emitted": emitter.emitted,
+        "llm_calls": llm.calls,
+        "duration": duration,
+        "throughput": len(receiver.latencies) / duration if duration else None,  # messages per second
+        "latency_ms": {
+            "workflow": summarize(receiver.latencies),
+            "stages": {stage: summarize(samples) for stage, samples in stage_timings.items()},
+        },
+        "cpu_seconds": cpu_time,
+        "cpu_per_message_ms": cpu_time / config.messages * 1000 if config.messages else None,
+        "peak_rss_bytes": peak_rss(),
+    }
+
+
+def main(  # noqa: PLR0913 One option per knob of the benchmark
+    messages: int = 1000,
+    rate: float = 100,
+    users: int = 10,
+    attachment_rate: float = 0.0,
+    attachment_size: int = 256 * 2**10,
+    llm_latency: float = 0.2,
+    memory_format: str = "json",
+    seed: int = 0,
+    # Optional instead of "| None", typer 0.12.3 (see poetry.lock) can't parse union types
+    output: Optional[str] = None,  # noqa: UP007
+) -> None:
+    """
+    Runs the end to end benchmark and prints the report, or writes it to the output file.
+    """
+    config = E2eConfig(
+        messages=messages,
+        rate=rate,
+        users=users,
+        attachment_rate=attachment_rate,
+        attachment_size=attachment_size,
+        llm_latency=llm_latency,
+        memory_format=memory_format,
+        seed=seed,
+    )
+    report = json.dumps(anyio.run(run_benchmark, config), indent=2)
+    if output:
+        Path(output).write_text(report + "\n")
+    else:
+        typer.echo(report)
+
+
+if __name__ == "__main__":
+    typer.run(main)
@@ -0,0 +1,241 @@
+"""
+A local stand-in for the Anthropic Messages API, so the engine can be load tested without network and without paying
+for tokens. It implements the part of POST /v1/messages the AnthropicLlm plugin uses: plain and streamed (SSE)
+responses, tool_use blocks and 429/529 errors. Latency, token rate, error rates and tool calls are configurable.
+
+Start it with `python -m benchmarks.fake_anthropic --port 8089` and point the plugin to it with the base_url config
+of the AnthropicLlm plugin (or the ANTHROPIC_BASE_URL environment variable).
+"""
+
+import itertools
+import json
+import random
+import time
+from collections import deque
+from collections.abc import AsyncIterator
+from typing import Optional
+
+import anyio
+import typer
+from anyio.abc import TaskStatus
+from pydantic import BaseModel
+
+from utilities.http_server import HttpError, HttpRequest, HttpResponse, HttpServer
+from utilities.logging import get_logger
+from utilities.tokens import estimate_tokens
+
+WORDS = ("lorem", "ipsum", "dolor", "sit", "amet", "consectetur", "adipiscing", "elit", "sed", "do", "eiusmod")
+
+
+class FakeAnthropicConfig(BaseModel):
+    latency: float = 0.3  # mean seconds until the first token
+    latency_jitter: float = 0.1  # standard deviation of the latency
+    tokens_per_second: float = 80  # output token rate, 0 answers instantly
+    output_tokens: int = 60  # mean length of a text response in tokens
+    rate_limit_rate: float = 0.0  # fraction of requests answered with 429
+    overloaded_rate: float = 0.0  # fraction of requests answered with 529
+    tool_call_rate: float = 0.0  # fraction of responses that call one of the given tools
+    requests_per_minute: int | None = None  # answer with 429 above this rate and send rate limit headers
+    retry_after: float = 1.0  # seconds sent with retry-after on 429
+    seed: int | None = None
+
+
+class FakeAnthropic:
+    """
+    The request handler of the fake API.
+    """
+
+    def __init__(self, config: FakeAnthropicConfig) -> None:
+        self.logger = get_logger(__name__)
+        self.config = config
+        self.random = random.Random(config.seed)  # noqa: S311 Not used for cryptography
+        self.ids = itertools.count()
+        self.request_times: deque[float] = deque()
+        self.requests = 0
+        self.errors = 0
+
+    async def handle(self, request: HttpRequest) -> HttpResponse:
+        if request.path != "/v1/messages":
+            raise HttpError(404)
+        if request.method != "POST":
+            raise HttpError(405)
+        self.requests += 1
+        body = request.json()
+
+        error = self.pick_error()
+        if error is not None:
+            self.errors += 1
+            return error
+
+        await anyio.sleep(max(self.random.gauss(self.config.latency, self.config.latency_jitter), 0))
+        message = self.generate_message(body)
+        headers = self.rate_limit_headers()
+        if body.get("stream"):
+            headers["content-type"] = "text/event-stream"
+            return HttpResponse(200, headers=headers, stream=self.stream(message))
+
+        await anyio.sleep(self.generation_time(message["usage"]["output_tokens"]))
+        return HttpResponse.json(message, headers=headers)
+
+    def pick_error(self) -> HttpResponse | None:
+        now = time.monotonic()
+        limit = self.config.requests_per_minute
+        if limit is not None:
+            while self.request_times and self.request_times[0] < now - 60:
+                self.request_times.popleft()
+            if len(self.request_times) >= limit:
+                return self.error_response(429, "rate_limit_error", "Number of requests has exceeded your rate limit")
+            self.request_times.append(now)
+
+        roll = self.random.random()
+        if roll < self.config.rate_limit_rate:
+            return self.error_response(429, "rate_limit_error", "Number of requests has exceeded your rate limit")
+        if roll < self.config.rate_limit_rate + self.config.overloaded_rate:
+            return self.error_response(529, "overloaded_error", "Overloaded")
+        return None
+
+    def error_response(self, status: int, error_type: str, message: str) -> HttpResponse:
+        headers = self.rate_limit_headers()
+        if status == 429:  # noqa: PLR2004
+            headers["retry-after"] = str(self.config.retry_after)
+        return HttpResponse.json(
+            {"type": "error", "error": {"type": error_type, "message": message}},
+            status,
+            headers,
+        )
+
+    def rate_limit_headers(self) -> dict[str, str]:
+        limit = self.config.requests_per_minute
+        if limit is None:
+            return {}
+        return {
+            "anthropic-ratelimit-requests-limit": str(limit),
+            "anthropic-ratelimit-requests-remaining": str(max(limit - len(self.request_times), 0)),
+        }
+
+    def generate_message(self, body: dict) -> dict:
+        """
+        Generates a response message for a request body, a tool_use if a tool call is rolled and the last message
+        is no tool result (so tool loops always end), text otherwise.
+        """
+        messages = body.get("messages", [])
+        tools = body.get("tools") or []
+        last_content = messages[-1]["content"] if messages else ""
+        answers_tool = isinstance(last_content, list) and any(c.get("type") == "tool_result" for c in last_content)
+
+        max_tokens = body.get("max_tokens", 4096)
+        output_tokens = min(max(int(self.random.expovariate(1 / self.config.output_tokens)), 1), max_tokens)
+        text = " ".join(self.random.choice(WORDS) for _ in range(output_tokens))
+        content = [{"type": "text", "text": text}]
+        stop_reason = "end_turn"
+        if tools and not answers_tool and self.random.random() < self.config.tool_call_rate:
+            tool = self.random.choice(tools)
+            content.append(
+                {
+                    "type": "tool_use",
+                    "id": f"toolu_fake_{next(self.ids)}",
+                    "name": tool["name"],
+                    "input": self.tool_input(tool.get("input_schema", {})),
+                },
+            )
+            stop_reason = "tool_use"
+        elif output_tokens == max_tokens:
+            stop_reason = "max_tokens"
+
+        return {
+            "id": f"msg_fake_{next(self.ids)}",
+            "type": "message",
+            "role": "assistant",
+            "model": body.get("model", "fake"),
+            "content": content,
+            "stop_reason": stop_reason,
+            "stop_sequence": None,
+            "usage": {
+                "input_tokens": estimate_tokens(json.dumps(messages) + json.dumps(body.get("system", ""))),
+                "output_tokens": output_tokens,
+                "cache_creation_input_tokens": 0,
+                "cache_read_input_tokens": 0,
+            },
+        }
+
+    def tool_input(self, schema: dict) -> dict:
+        values = {"string": "test", "number": 1, "integer": 1, "boolean": True, "array": [], "object": {}}
+        properties = schema.get("properties", {})
+        return {name: values.get(properties[name].get("type"), "test") for name in schema.get("required", [])}
+
+    def generation_time(self, output_tokens: int) -> float:
+        return output_tokens / self.config.tokens_per_second if self.config.tokens_per_second else 0
+
+    async def stream(self, message: dict) -> AsyncIterator[bytes]:
+        """
+        Sends the message as server sent events, like the real API does with stream=True.
+        """
+        content, usage = message["content"], message["usage"]
+        yield self.event("message_start", {"message": {**message, "content": [], "stop_reason": None, "usage": usage}})
+        yield self.event("ping", {})
+        for i, block in enumerate(content):
+            if block["type"] == "text":
+                yield self.event("content_block_start", {"index": i, "content_block": {"type": "text", "text": ""}})
+                for word in block["text"].split(" "):
+                    await anyio.sleep(self.generation_time(1))
+                    delta = {"type": "text_delta", "text": word + " "}
+                    yield self.event("content_block_delta", {"index": i, "delta": delta})
+            else:
+                yield self.event("content_block_start", {"index": i, "content_block": {**block, "input": {}}})
+                delta = {"type": "input_json_delta", "partial_json": json.dumps(block["input"])}
+                yield self.event("content_block_delta", {"index": i, "delta": delta})
+            yield self.event("content_block_stop", {"index": i})
+        delta = {"stop_reason": message["stop_reason"], "stop_sequence": None}
+        yield self.event("message_delta", {"delta": delta, "usage": {"output_tokens": usage["output_tokens"]}})
+        yield self.event("message_stop", {})
+
+    def event(self, name: str, data: dict) -> bytes:
+        return f"event: {name}\ndata: {json.dumps({'type': name, **data})}\n\n".encode()
+
+
+async def serve(
+    config: FakeAnthropicConfig,
+    host: str = "127.0.0.1",
+    port: int = 0,
+    *,
+    task_status: TaskStatus[int] = anyio.TASK_STATUS_IGNORED,
+) -> None:
+    """
+    Runs the fake API until cancelled, start it with task_group.start to get the port.
+    """
+    await HttpServer(FakeAnthropic(config).handle, host, port).serve(task_status=task_status)
+
+
+def main(  # noqa: PLR0913
+    host: str = "127.0.0.1",
+    port: int = 8089,
+    latency: float = 0.3,
+    latency_jitter: float = 0.1,
+    tokens_per_second: float = 80,
+    output_tokens: int = 60,
+    rate_limit_rate: float = 0.0,
+    overloaded_rate: float = 0.0,
+    tool_call_rate: float = 0.0,
+    # Optional instead of "| None", typer 0.12.3 (see poetry.lock) can't parse union types
+    requests_per_minute: Optional[int] = None,  # noqa: UP007
+    seed: Optional[int] = None,  # noqa: UP007
+) -> None:
+    """
+    Runs a fake Anthropic Messages API for offline load and latency tests.
+    """
+    config = FakeAnthropicConfig(
+        latency=latency,
+        latency_jitter=latency_jitter,
+        tokens_per_second=tokens_per_second,
+        output_tokens=output_tokens,
+        rate_limit_rate=rate_limit_rate,
+        overloaded_rate=overloaded_rate,
+        tool_call_rate=tool_call_rate,
+        requests_per_minute=requests_per_minute,
+        seed=seed,
+    )
+    anyio.run(serve, config, host, port)
+
+
+if __name__ == "__main__":
+    typer.run(main)
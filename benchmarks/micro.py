@@ -0,0 +1,301 @@
+"""
+Microbenchmarks of the code that runs on every message: plugin call dispatch, copying the context, rendering the system
+prompt and the history for Anthropic and reading and writing the memory file. Every benchmark has a fixed name and
+fixed parameters and the inputs are generated from a fixed seed, so results of different commits can be compared. Pass
+the report of an earlier run as --baseline to get the ratio of every median to it.
+
+Run it from the repository root with `python -m benchmarks.micro --output result.json`. The memory benchmarks take a
+while at 1M messages, select benchmarks by name with --only.
+"""
+
+import functools
+import gc
+import inspect
+import json
+import random
+import statistics
+import tempfile
+import time
+from collections.abc import Awaitable, Callable
+from copy import deepcopy
+from pathlib import Path
+from typing import Optional
+
+import anyio
+import typer
+
+from benchmarks.report import environment
+from models.character import CharacterModel, PluginModel
+from models.context import Context
+from models.message import FileModel, MessageModel
+from models.request import RequestMessageModel
+from models.response import ResponseMessageModel
+from models.system_prompt import SystemPrompt
+from plugin_system.call_builder import CallBuilder
+from plugin_system.plugin_manager import PluginManager
+from utilities.logging import LoggingConfig, configure_logging
+
+WORDS = ("apple", "wheat", "wolf", "market", "coin", "river", "harvest", "journey", "festival", "wine")
+MESSAGES_PER_USER = 100  # the memory benchmarks spread the messages over users like this
+
+
+class Benchmarks:
+    """
+    Runs the benchmarks and collects their results.
+    """
+
+    def __init__(self, only: list[str] | None, min_round_time: float, rounds: int) -> None:
+        self.only = only
+        self.min_round_time = min_round_time
+        self.rounds = rounds
+        self.results: list[dict] = []
+
+    def selected(self, name: str) -> bool:
+        return not self.only or any(part in name for part in self.only)
+
+    async def run_round(self, fn: Callable[[], Awaitable[object] | object], number: int) -> float:
+        start = time.perf_counter()
+        for _ in range(number):
+            result = fn()
+            if inspect.isawaitable(result):
+                await result
+        return time.perf_counter() - start
+
+    async def bench(self, name: str, fn: Callable[[], Awaitable[object] | object], **params: object) -> None:
+        """
+        Times fn like timeit: the number of calls per round is raised until a round takes min_round_time, the garbage
+        collector is off while a round runs. The result is the time of one call.
+        """
+        if not self.selected(name):
+            return
+        await self.run_round(fn, 1)  # warm up
+        number = 1
+        while (elapsed := await self.run_round(fn, number)) < self.min_round_time:
+            number *= max(2, min(10, int(self.min_round_time / max(elapsed, 1e-9))))
+        times = []
+        gc.collect()
+        gc.disable()
+        try:
+            for _ in range(self.rounds):
+                times.append(await self.run_round(fn, number) / number)
+        finally:
+            gc.enable()
+        result = {
+            "name": name,
+            "params": params,
+            "number": number,
+            "rounds": self.rounds,
+            "min_us": min(times) * 1e6,
+            "median_us": statistics.median(times) * 1e6,
+            "mean_us": statistics.fmean(times) * 1e6,
+            "stdev_us": statistics.stdev(times) * 1e6 if len(times) > 1 else 0.0,
+        }
+        self.results.append(result)
+        typer.echo(f"{name:45} {json.dumps(params):40} {result['median_us']:14.2f} us", err=True)
+
+
+class NoopPlugin:
+    async def ping(self, ctx: Context) -> Context:
+        return ctx
+
+
+def seeded_random() -> random.Random:
+    return random.Random(0)  # noqa: S311 Not used for cryptography, the inputs have to be the same on every run
+
+
+def text(rng: random.Random, words: int) -> str:
+    return " ".join(rng.choices(WORDS, k=words))
+
+
+def history(rng: random.Random, length: int, image: FileModel | None = None) -> list[MessageModel]:
+    messages = []
+    for i in range(length):
+        if i % 2:
+            messages.append(ResponseMessageModel.model_construct(role="llm", content=[text(rng, 40)]))
+        else:
+            content = [text(rng, 20)]
+            if image is not None and i % 10 == 0:
+                content.append(image)
+            messages.append(RequestMessageModel.model_construct(role="user", content=content))
+    return messages
+
+
+def system_prompts(rng: random.Random) -> list[SystemPrompt]:
+    # Roughly what the builtin plugins produce: character descriptions, the date and recalled memories
+    descriptions = [SystemPrompt(name=name, content=text(rng, 150)) for name in ("introduction", "appearance")]
+    descriptions.append(
+        SystemPrompt(
+            name="personality",
+            content=[SystemPrompt(name=f"trait_{i}", content=text(rng, 30)) for i in range(5)],
+        ),
+    )
+    memories = [SystemPrompt(name="ConversationMemory", content=text(rng, 60)) for _ in range(5)]
+    return [*descriptions, SystemPrompt(name="DateTime", content="It's Monday morning, autumn 2026."), *memories]
+
+
+async def bench_dispatch(benchmarks: Benchmarks) -> None:
+    ctx = Context()
+    for plugins in (1, 10, 100):
+        plugin_map = {"ping": [NoopPlugin() for _ in range(plugins)]}
+        # Building the CallBuilder is part of every pm.call, so it is measured too
+        for mode in ("first", "all", "all_async"):
+            await benchmarks.bench(
+                f"dispatch.{mode}",
+                lambda m=plugin_map, mode=mode: getattr(CallBuilder(m, "ping", ctx=ctx), mode)(),
+                plugins=plugins,
+            )
+
+
+async def bench_context_copy(benchmarks: Benchmarks) -> None:
+    rng = seeded_random()
+    for attachment_size in (0, 2**20):
+        image = FileModel(mimetype="image/jpeg", data=bytes(attachment_size)) if attachment_size else None
+        content = ["What is on this picture?", image] if image else ["Hello"]
+        ctx = Context(
+            request=RequestMessageModel(role="user", content=content),
+            shortterm_memory=history(rng, 50, image),
+            system_prompts=system_prompts(rng),
+            user_id="user",
+        )
+        await benchmarks.bench("context.deepcopy", functools.partial(deepcopy, ctx), attachment_size=attachment_size)
+        await benchmarks.bench("context.fork", ctx.fork, attachment_size=attachment_size)
+
+
+async def bench_anthropic(benchmarks: Benchmarks, pm: PluginManager) -> None:
+    llm = pm.call("get_llm_response").plugin_list[0]
+    rng = seeded_random()
+    ctx = Context(system_prompts=system_prompts(rng))
+
+    def render_cold() -> None:
+        llm.render_cache.clear()
+        llm.generate_system_prompt(ctx)
+
+    await benchmarks.bench("anthropic.generate_system_prompt", render_cold, cache="cold")
+    await benchmarks.bench(
+        "anthropic.generate_system_prompt",
+        functools.partial(llm.generate_system_prompt, ctx),
+        cache="warm",
+    )
+
+    image = FileModel(mimetype="image/jpeg", data=bytes(256 * 2**10))
+    for length in (100, 1000):
+        history_ctx = Context(shortterm_memory=history(rng, length, image))
+
+        def convert_cold(c: Context = history_ctx) -> None:
+            llm.message_cache.clear()
+            llm.image_cache.clear()
+            llm.generate_message_params_from_memory(c)
+
+        await benchmarks.bench(
+            "anthropic.generate_message_params_from_memory",
+            convert_cold,
+            length=length,
+            cache="cold",
+        )
+        await benchmarks.bench(
+            "anthropic.generate_message_params_from_memory",
+            functools.partial(llm.generate_message_params_from_memory, history_ctx),
+            length=length,
+            cache="warm",
+        )
+
+
+async def bench_memory(benchmarks: Benchmarks, pm: PluginManager, sizes: list[int]) -> None:
+    if not (benchmarks.selected("memory.save_to_file") or benchmarks.selected("memory.load_from_file")):
+        return
+    memory = pm.call("add_to_shortterm_memory").plugin_list[0]
+    memory_format = memory.config.memory_format
+
+    async def load() -> None:
+        snapshot = memory.snapshot
+        await memory.load_from_file()
+        if snapshot is not None and snapshot is not memory.snapshot:
+            snapshot.close()
+
+    for size in sizes:
+        rng = seeded_random()  # The same messages for a size, no matter which sizes ran before
+        memory.memory.shortterm_memory = {
+            f"user-{u}": history(rng, min(size, MESSAGES_PER_USER)) for u in range(max(1, size // MESSAGES_PER_USER))
+        }
+        memory.memory.longterm_memory = {}
+        await benchmarks.bench("memory.save_to_file", memory.save_to_file, messages=size, format=memory_format)
+        await benchmarks.bench("memory.load_from_file", load, messages=size, format=memory_format)
+
+
+def build_character(data_dir: Path, memory_format: str) -> CharacterModel:
+    return CharacterModel(
+        name="Benchmark",
+        author="wasurenakusa team",
+        plugins=[
+            PluginModel(
+                name="AnthropicLlm",
+                config={"ANTHROPIC_API_KEY": "benchmark", "prewarm_connections": 0, "image_max_dimension": None},
+            ),
+            PluginModel(
+                name="SimpleMemoryPlugin",
+                config={
+                    "memory_file": str(data_dir / f"memory.{memory_format}"),
+                    "memory_format": memory_format,
+                    "condense_after": None,
+                },
+            ),
+        ],
+    )
+
+
+async def run_benchmarks(benchmarks: Benchmarks, memory_sizes: list[int]) -> None:
+    await bench_dispatch(benchmarks)
+    await bench_context_copy(benchmarks)
+    with tempfile.TemporaryDirectory() as data_dir:
+        for memory_format in ("json", "binary"):
+            async with anyio.create_task_group() as tg:
+                character = build_character(Path(data_dir), memory_format)
+                pm = await PluginManager(character, task_group=tg).init()
+                try:
+                    if memory_format == "json":
+                        await bench_anthropic(benchmarks, pm)
+                    await bench_memory(benchmarks, pm, memory_sizes)
+                finally:
+                    with anyio.CancelScope(shield=True):
+                        await pm.shutdown()
+                    tg.cancel_scope.cancel()
+
+
+def compare(results: list[dict], baseline: dict) -> None:
+    """
+    Adds the ratio of the median to the median of the same benchmark in the baseline report, above 1 is slower.
+    """
+    medians = {(r["name"], json.dumps(r["params"], sort_keys=True)): r["median_us"] for r in baseline["results"]}
+    for result in results:
+        base = medians.get((result["name"], json.dumps(result["params"], sort_keys=True)))
+        if base:
+            result["baseline_ratio"] = result["median_us"] / base
+
+
+def main(  # noqa: PLR0913 One option per knob of the benchmark
+    # Optional instead of "| None", typer 0.12.3 (see poetry.lock) can't parse union types
+    output: Optional[str] = None,  # noqa: UP007
+    only: Optional[str] = None,  # noqa: UP007
+    memory_sizes: str = "10000,100000,1000000",
+    rounds: int = 5,
+    min_round_time: float = 0.1,
+    baseline: Optional[str] = None,  # noqa: UP007
+) -> None:
+    """
+    Runs the microbenchmarks and prints the report, or writes it to the output file. --only takes a comma separated
+    list of name parts, --memory-sizes the number of stored messages for the memory benchmarks.
+    """
+    configure_logging(LoggingConfig(level="WARNING"))
+    benchmarks = Benchmarks(only.split(",") if only else None, min_round_time, rounds)
+    anyio.run(run_benchmarks, benchmarks, [int(size) for size in memory_sizes.split(",")])
+    if baseline:
+        compare(benchmarks.results, json.loads(Path(baseline).read_text()))
+    report = json.dumps({"benchmark": "micro", "environment": environment(), "results": benchmarks.results}, indent=2)
+    if output:
+        Path(output).write_text(report + "\n")
+    else:
+        typer.echo(report)
+
+
+if __name__ == "__main__":
+    typer.run(main)
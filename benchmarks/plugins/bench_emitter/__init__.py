@@ -0,0 +1,10 @@
+from .bench_emitter import BenchEmitterPlugin
+
+dependencies = []
+
+PluginMainClass = BenchEmitterPlugin
+
+PLUGIN_NAME = "Benchmark Emitter"
+PLUGIN_AUTHOR = "wasurenakusa team"
+PLUGIN_VERSION = "1.0.0"
+PLUGIN_DESCRIPTION = "Captures the replies instead of sending them, used by benchmarks/e2e.py"
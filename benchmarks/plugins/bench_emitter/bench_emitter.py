@@ -0,0 +1,33 @@
+from pydantic_settings import BaseSettings, SettingsConfigDict
+
+from models.context import Context
+from plugin_system.abc.emitter import EmitterPlugin
+
+
+class BenchEmitterPluginConfig(BaseSettings):
+    model_config = SettingsConfigDict(frozen=True)
+
+    keep_responses: bool = False  # keep every emitted context, to check the replies (costs memory on long runs)
+
+
+class BenchEmitterPlugin(EmitterPlugin):
+    """
+    Counts the replies instead of sending them anywhere.
+    """
+
+    config: BenchEmitterPluginConfig
+    config_model = BenchEmitterPluginConfig
+
+    async def plugin_setup(self) -> None:
+        self.load_config()
+        self.emitted = 0
+        self.status_updates = 0
+        self.responses: list[Context] = []
+
+    async def emit(self, ctx: Context) -> None:
+        self.emitted += 1
+        if self.config.keep_responses:
+            self.responses.append(ctx)
+
+    async def update_status(self, ctx: Context) -> None:  # noqa: ARG002 The status is only counted
+        self.status_updates += 1
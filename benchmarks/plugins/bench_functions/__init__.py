@@ -0,0 +1,10 @@
+from .bench_functions import BenchFunctionsPlugin
+
+dependencies = []
+
+PluginMainClass = BenchFunctionsPlugin
+
+PLUGIN_NAME = "Benchmark Functions"
+PLUGIN_AUTHOR = "wasurenakusa team"
+PLUGIN_VERSION = "1.0.0"
+PLUGIN_DESCRIPTION = "Offers no LLM functions, so the workflow has a plugin to ask, used by benchmarks/e2e.py"
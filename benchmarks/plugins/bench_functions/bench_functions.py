@@ -0,0 +1,15 @@
+from models.context import Context
+from models.llm_function import LlmFunction
+from plugin_system.abc.llm_function import LlmFunctionPlugin
+
+
+class BenchFunctionsPlugin(LlmFunctionPlugin):
+    """
+    Offers no functions. Without any LLM function plugin the workflow would log a warning for every message.
+    """
+
+    async def plugin_setup(self) -> None:
+        pass
+
+    async def generate_llm_functions(self, ctx: Context) -> list[LlmFunction]:  # noqa: ARG002 Same for every message
+        return []
@@ -0,0 +1,10 @@
+from .bench_llm import BenchLlmPlugin
+
+dependencies = []
+
+PluginMainClass = BenchLlmPlugin
+
+PLUGIN_NAME = "Benchmark LLM"
+PLUGIN_AUTHOR = "wasurenakusa team"
+PLUGIN_VERSION = "1.0.0"
+PLUGIN_DESCRIPTION = "Answers after a configurable latency without calling any API, used by benchmarks/e2e.py"
@@ -0,0 +1,39 @@
+import random
+
+import anyio
+from pydantic_settings import BaseSettings, SettingsConfigDict
+
+from models.context import Context
+from models.response import ResponseMessageModel
+from plugin_system.abc.llm import LlmPlugin
+
+WORDS = ("lorem", "ipsum", "dolor", "sit", "amet", "consectetur", "adipiscing", "elit", "sed", "do", "eiusmod")
+
+
+class BenchLlmPluginConfig(BaseSettings):
+    model_config = SettingsConfigDict(frozen=True)
+
+    latency: float = 0.2  # mean seconds until the response
+    latency_jitter: float = 0.05  # standard deviation of the latency
+    response_words: int = 40  # words of a response
+    seed: int | None = None
+
+
+class BenchLlmPlugin(LlmPlugin):
+    """
+    Answers every request with lorem ipsum after a random latency, without calling any API.
+    """
+
+    config: BenchLlmPluginConfig
+    config_model = BenchLlmPluginConfig
+
+    async def plugin_setup(self) -> None:
+        self.load_config()
+        self.random = random.Random(self.config.seed)  # noqa: S311 Not used for cryptography
+        self.calls = 0
+
+    async def get_llm_response(self, ctx: Context) -> None:
+        self.calls += 1
+        await anyio.sleep(max(0.0, self.random.gauss(self.config.latency, self.config.latency_jitter)))
+        text = " ".join(self.random.choices(WORDS, k=self.config.response_words))
+        ctx.response = ResponseMessageModel.model_construct(role="llm", content=[text])
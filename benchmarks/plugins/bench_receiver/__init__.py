@@ -0,0 +1,10 @@
+from .bench_receiver import BenchReceiverPlugin
+
+dependencies = []
+
+PluginMainClass = BenchReceiverPlugin
+
+PLUGIN_NAME = "Benchmark Receiver"
+PLUGIN_AUTHOR = "wasurenakusa team"
+PLUGIN_VERSION = "1.0.0"
+PLUGIN_DESCRIPTION = "Injects synthetic messages at a fixed rate, used by benchmarks/e2e.py"
@@ -0,0 +1,70 @@
+import random
+import time
+
+import anyio
+from pydantic_settings import BaseSettings, SettingsConfigDict
+
+from models.message import FileModel
+from models.request import RequestMessageModel
+from plugin_system.abc.reciver import ReciverPlugin
+
+WORDS = ("apple", "wheat", "wolf", "market", "coin", "river", "harvest", "journey", "festival", "wine")
+
+
+class BenchReceiverPluginConfig(BaseSettings):
+    model_config = SettingsConfigDict(frozen=True)
+
+    messages: int = 1000  # number of messages to inject
+    rate: float = 100  # messages per second (open loop, a slow engine does not slow the injection), 0 for all at once
+    users: int = 10  # the messages are spread randomly over this many users
+    message_words: int = 20  # words of the text of a message
+    attachment_rate: float = 0.0  # fraction of the messages with an image attached
+    attachment_size: int = 256 * 2**10  # bytes of an attached image
+    seed: int | None = None
+
+
+class BenchReceiverPlugin(ReciverPlugin):
+    """
+    Injects synthetic messages into call_workflow and records how long every workflow took.
+    """
+
+    config: BenchReceiverPluginConfig
+    config_model = BenchReceiverPluginConfig
+    channel_name = "benchmark"
+
+    async def plugin_setup(self) -> None:
+        self.load_config()
+        self.random = random.Random(self.config.seed)  # noqa: S311 Not used for cryptography
+        self.attachment = memoryview(bytes(self.config.attachment_size)).toreadonly()
+        self.latencies: list[float] = []  # seconds from the injection until the workflow returned
+        self.errors = 0
+        self.started: float | None = None
+        self.finished: float | None = None
+
+    def build_request(self) -> tuple[RequestMessageModel, str]:
+        text = " ".join(self.random.choices(WORDS, k=self.config.message_words))
+        content: list[str | FileModel] = [text]
+        if self.random.random() < self.config.attachment_rate:
+            content.append(FileModel.model_construct(mimetype="image/jpeg", data=self.attachment))
+        user_id = f"user-{self.random.randrange(self.config.users)}"
+        return RequestMessageModel.model_construct(role="user", content=content), user_id
+
+    async def send(self, request: RequestMessageModel, user_id: str) -> None:
+        start = time.perf_counter()
+        try:
+            await self.call_workflow(request, user_id)
+        except Exception:
+            self.errors += 1
+            self.logger.exception("Workflow failed")
+            return
+        self.latencies.append(time.perf_counter() - start)
+
+    async def listen(self) -> None:
+        self.notify_ready()
+        self.started = time.perf_counter()
+        async with anyio.create_task_group() as tg:
+            for i in range(self.config.messages):
+                if self.config.rate:
+                    await anyio.sleep(self.started + i / self.config.rate - time.perf_counter())
+                tg.start_soon(self.send, *self.build_request())
+        self.finished = time.perf_counter()
@@ -0,0 +1,10 @@
+from .bench_replay import ReplayPlugin
+
+dependencies = []
+
+PluginMainClass = ReplayPlugin
+
+PLUGIN_NAME = "Replay"
+PLUGIN_AUTHOR = "wasurenakusa team"
+PLUGIN_VERSION = "1.0.0"
+PLUGIN_DESCRIPTION = "Replays recorded traffic and optionally its LLM responses, used by benchmarks/replay.py"
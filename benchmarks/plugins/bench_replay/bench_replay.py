@@ -0,0 +1,76 @@
+import time
+from pathlib import Path
+
+import anyio
+from pydantic_settings import BaseSettings, SettingsConfigDict
+
+from models.context import Context
+from models.response import ResponseMessageModel
+from plugin_system.abc.llm import LlmPlugin
+from plugin_system.abc.reciver import ReciverPlugin
+from plugin_system.recorder import RecordedRequest, read_recording
+
+
+class ReplayPluginConfig(BaseSettings):
+    model_config = SettingsConfigDict(frozen=True)
+
+    recording: str  # the file written by the engine with --record
+    speed: float = 1.0  # 2 replays twice as fast as recorded, 0 sends everything at once
+    llm_latency: bool = True  # replayed LLM responses take as long as the recorded workflow did
+    fallback_response: str = "..."  # answer to LLM calls that are not in the recording (e.g. memory condensation)
+
+
+class ReplayPlugin(ReciverPlugin, LlmPlugin):
+    """
+    Sends the requests of a recording to call_workflow with their recorded timing. It is an LLM too: activated before
+    the real LLM plugin it answers with the recorded responses (the first LLM plugin is the one that is called),
+    activated after it the real LLM answers.
+    """
+
+    config: ReplayPluginConfig
+    config_model = ReplayPluginConfig
+    channel_name = "replay"
+
+    async def plugin_setup(self) -> None:
+        self.load_config()
+        self.records = await anyio.to_thread.run_sync(read_recording, Path(self.config.recording))
+        self.logger.info("Loaded %s recorded requests from %s", len(self.records), self.config.recording)
+        # The recorded response by the id of the request object, the workflow passes the same object to the LLM
+        self.responses: dict[int, RecordedRequest] = {}
+        self.latencies: list[float] = []
+        self.errors = 0
+        self.started: float | None = None
+        self.finished: float | None = None
+
+    async def send(self, record: RecordedRequest) -> None:
+        start = time.perf_counter()
+        try:
+            await self.call_workflow(record.request, record.user_id)
+        except Exception:
+            self.errors += 1
+            self.logger.exception("Workflow failed")
+            return
+        finally:
+            self.responses.pop(id(record.request), None)
+        self.latencies.append(time.perf_counter() - start)
+
+    async def listen(self) -> None:
+        self.notify_ready()
+        self.started = time.perf_counter()
+        first = self.records[0].arrived if self.records else 0.0  # No need to wait for the first request
+        async with anyio.create_task_group() as tg:
+            for record in self.records:
+                if self.config.speed:
+                    await anyio.sleep(self.started + (record.arrived - first) / self.config.speed - time.perf_counter())
+                self.responses[id(record.request)] = record
+                tg.start_soon(self.send, record)
+        self.finished = time.perf_counter()
+
+    async def get_llm_response(self, ctx: Context) -> None:
+        record = self.responses.get(id(ctx.request)) if ctx.request is not None else None
+        if record is None or record.response is None:
+            ctx.response = ResponseMessageModel.model_construct(role="llm", content=[self.config.fallback_response])
+            return
+        if self.config.llm_latency and self.config.speed:
+            await anyio.sleep(record.duration / self.config.speed)
+        ctx.response = record.response
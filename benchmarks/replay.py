@@ -0,0 +1,147 @@
+"""
+Replays a recording of real traffic (made with `python main.py CHARACTER --record FILE`) through a character offline,
+with the recorded timing, faster (--speed 10) or as fast as possible (--speed 0). With --replay-llm the recorded
+responses are used instead of calling the LLM, so new memory backends or workflow changes can be tested against real
+load shapes without an API key.
+
+The channel plugins of the character (--exclude, the Discord plugin by default) are replaced by the replay plugin and a
+counting emitter. Memory files are redirected into a temporary directory, a replay never touches the real memory.
+
+Run it from the repository root with `python -m benchmarks.replay characters/holo.yaml recording.jsonl.gz`.
+"""
+
+import json
+import tempfile
+import time
+from pathlib import Path
+from typing import Optional
+
+import anyio
+import typer
+
+from benchmarks.report import environment, peak_rss, summarize
+from models.character import CharacterModel, PluginModel
+from plugin_system.plugin_manager import PluginManager
+from utilities.config_loader import load_character_config
+from utilities.logging import LoggingConfig, configure_logging
+
+PLUGIN_DIR = Path(__file__).resolve().parent / "plugins"
+
+
+def replay_character(  # noqa: PLR0913 Built from the options of the replay
+    character: CharacterModel,
+    recording: Path,
+    data_dir: Path,
+    *,
+    speed: float,
+    replay_llm: bool,
+    exclude: set[str],
+) -> CharacterModel:
+    plugins = []
+    for plugin in character.plugins:
+        if plugin.name in exclude:
+            continue
+        config = dict(plugin.config or {})
+        if "memory_file" in config:
+            config["memory_file"] = str(data_dir / f"{plugin.name}_{Path(config['memory_file']).name}")
+        plugins.append(PluginModel(name=plugin.name, config=config))
+
+    replay = PluginModel(name="ReplayPlugin", config={"recording": str(recording), "speed": speed})
+    # The first LLM plugin answers, see ReplayPlugin
+    plugins = [replay, *plugins] if replay_llm else [*plugins, replay]
+    plugins.append(PluginModel(name="BenchEmitterPlugin", config=None))
+    return character.model_copy(update={"plugins": plugins})
+
+
+async def run_replay(  # noqa: PLR0913 One argument per option of the replay
+    character_config_file: Path,
+    recording: Path,
+    *,
+    speed: float = 1.0,
+    replay_llm: bool = False,
+    exclude: set[str] | None = None,
+    log_level: str = "WARNING",
+) -> dict:
+    """
+    Replays the recording and returns the report.
+    """
+    configure_logging(LoggingConfig(level=log_level))
+    character = load_character_config(character_config_file)
+    with tempfile.TemporaryDirectory() as data_dir:
+        character = replay_character(
+            character,
+            recording,
+            Path(data_dir),
+            speed=speed,
+            replay_llm=replay_llm,
+            exclude=exclude if exclude is not None else {"DiscordPlugin"},
+        )
+        cpu_start = time.process_time()
+        async with anyio.create_task_group() as tg:
+            pm = await PluginManager(character, task_group=tg, plugin_dirs=[PLUGIN_DIR]).init()
+            replay = next(p for p in pm.call("listen").plugin_list if p.__class__.__name__ == "ReplayPlugin")
+            emitter = next(p for p in pm.call("emit").plugin_list if p.__class__.__name__ == "BenchEmitterPlugin")
+            try:
+                await replay.listen()
+            finally:
+                with anyio.CancelScope(shield=True):
+                    await pm.shutdown()
+                tg.cancel_scope.cancel()
+        cpu_time = time.process_time() - cpu_start
+
+    duration = replay.finished - replay.started
+    return {
+        "benchmark": "replay",
+        "environment": environment(),
+        "recording": str(recording),
+        "character": character.name,
+        "speed": speed,
+        "replay_llm": replay_llm,
+        "messages": len(replay.records),
+        "completed": len(replay.latencies),
+        "errors": replay.errors,
+        "emitted": emitter.emitted,
+        "duration": duration,
+        "recorded_duration": replay.records[-1].arrived - replay.records[0].arrived if replay.records else 0.0,
+        "throughput": len(replay.latencies) / duration if duration else None,
+        "latency_ms": {
+            "workflow": summarize(replay.latencies),
+            "recorded": summarize([r.duration for r in replay.records]),
+        },
+        "cpu_seconds": cpu_time,
+        "peak_rss_bytes": peak_rss(),
+    }
+
+
+def main(  # noqa: PLR0913 One option per knob of the replay
+    character_config_file: str,
+    recording: str,
+    *,
+    speed: float = 1.0,
+    replay_llm: bool = False,
+    exclude: str = "DiscordPlugin",
+    # Optional instead of "| None", typer 0.12.3 (see poetry.lock) can't parse union types
+    output: Optional[str] = None,  # noqa: UP007
+) -> None:
+    """
+    Replays the recording through the character and prints the report, or writes it to the output file. --exclude
+    takes a comma separated list of plugins to leave out (the channels of the character).
+    """
+    report = anyio.run(
+        lambda: run_replay(
+            Path(character_config_file),
+            Path(recording),
+            speed=speed,
+            replay_llm=replay_llm,
+            exclude={name for name in exclude.split(",") if name},
+        ),
+    )
+    text = json.dumps(report, indent=2)
+    if output:
+        Path(output).write_text(text + "\n")
+    else:
+        typer.echo(text)
+
+
+if __name__ == "__main__":
+    typer.run(main)
@@ -0,0 +1,91 @@
+"""
+Helpers shared by the benchmarks to write machine readable results. Every report carries the commit and the machine
+it was measured on, so results of different commits can be compared (and results of different machines are not).
+"""
+
+import math
+import os
+import platform
+import resource
+import subprocess
+import sys
+from pathlib import Path
+
+from utilities.version import get_version
+
+REPO_DIR = Path(__file__).resolve().parent.parent
+
+
+def git(*args: str) -> str:
+    return subprocess.run(  # noqa: S603 Only called with fixed arguments
+        ["git", *args],  # noqa: S607 git from the PATH is fine for a benchmark
+        cwd=REPO_DIR,
+        capture_output=True,
+        text=True,
+        check=True,
+    ).stdout
+
+
+def git_commit() -> dict:
+    """
+    Returns the checked out commit and whether the working tree has uncommitted changes, None if git is missing.
+    """
+    try:
+        commit = git("rev-parse", "HEAD").strip()
+        dirty = bool(git("status", "--porcelain", "--untracked-files=no").strip())
+    except (OSError, subprocess.CalledProcessError):
+        return {"commit": None, "dirty": None}
+    return {"commit": commit, "dirty": dirty}
+
+
+def environment() -> dict:
+    """
+    Describes where the benchmark ran: engine version, commit, python and machine.
+    """
+    return {
+        "version": get_version(),
+        **git_commit(),
+        "python": sys.version.split()[0],
+        "implementation": platform.python_implementation(),
+        "platform": platform.platform(),
+        "machine": platform.machine(),
+        "cpus": os.cpu_count(),
+    }
+
+
+def percentile(sorted_samples: list[float], q: float) -> float:
+    """
+    The nearest rank percentile of already sorted samples, q between 0 and 100.
+    """
+    if not sorted_samples:
+        return math.nan
+    rank = max(1, math.ceil(q / 100 * len(sorted_samples)))
+    return sorted_samples[rank - 1]
+
+
+def summarize(samples: list[float], scale: float = 1000) -> dict:
+    """
+    Summarizes durations in seconds, by default in milliseconds.
+
+    Returns:
+        dict: count, mean, p50, p95, p99 and max.
+    """
+    ordered = sorted(samples)
+    if not ordered:
+        return {"count": 0}
+    return {
+        "count": len(ordered),
+        "mean": sum(ordered) / len(ordered) * scale,
+        "p50": percentile(ordered, 50) * scale,
+        "p95": percentile(ordered, 95) * scale,
+        "p99": percentile(ordered, 99) * scale,
+        "max": ordered[-1] * scale,
+    }
+
+
+def peak_rss() -> int:
+    """
+    The peak resident memory of this process in bytes.
+    """
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == "darwin" else peak * 1024  # macOS reports bytes, Linux KiB
@@ -1,39 +1,102 @@
 import atexit
+import functools
 from pathlib import Path
+from typing import TYPE_CHECKING, Optional
 
+# Not lazy, the CLI and the event loop need them right away. The plugin SDKs are the ones bound with lazy_import
 import anyio
 import typer
-from dotenv import load_dotenv
 
-from plugin_system.plugin_manager import PluginManager
-from utilities.config_loader import load_character_config
-from utilities.logging import get_logger
+from utilities.logging import configure_logging, get_logger
+from utilities.startup_profiler import startup_profiler
 from utilities.version import get_version
 
+if TYPE_CHECKING:
+    from plugin_system.plugin_manager import PluginManager
+
 logger = get_logger("engine.main")
-load_dotenv()
 
-version = get_version()
+# Seconds the startup profile waits for a receiver to report it is ready
+PROFILE_READY_TIMEOUT = 120
 
 
 def exit_cleanup() -> None:
     logger.warning("Engine is closing")
 
 
-async def engine(character_config_file: str) -> None:
-    logger.info("Loading character from file '%s'", character_config_file)
-    character_config = load_character_config(Path(character_config_file))
+async def report_startup(pm: "PluginManager") -> None:
+    with anyio.move_on_after(PROFILE_READY_TIMEOUT):
+        await pm.ready.wait()
+    if not pm.ready.is_set():
+        logger.warning("No receiver reported to be ready within %s seconds", PROFILE_READY_TIMEOUT)
+    logger.info(startup_profiler.report())
+
+
+async def engine(character_config_file: str, *, profile_startup: bool = False, record: str | None = None) -> None:
+    with startup_profiler.phase("engine imports"):
+        # Imported here and not at the top, so --profile-startup can time them
+        from dotenv import load_dotenv
+
+        from plugin_system.config_compiler import PluginConfigError
+        from plugin_system.plugin_manager import PluginManager, PluginSetupError
+        from plugin_system.recorder import TrafficRecorder
+        from utilities.config_loader import load_character_config
+
+    with startup_profiler.phase("config load"):
+        load_dotenv()
+        configure_logging()  # The logging settings can come from the .env file
+        logger.info("Loading character from file '%s'", character_config_file)
+        character_config = load_character_config(Path(character_config_file))
     logger.info("Character '%s' successfully loaded", character_config.name)
+    recorder = None
+    if record:
+        logger.info("Recording the requests to '%s'", record)
+        recorder = TrafficRecorder(Path(record))
     logger.info("Initialize plugin manager")
-    pm = await PluginManager(character_config).init()
-    logger.info("Start listening to channels")
-    await pm.call("listen").all_async()  # All listeners can start at the same time :)
+    async with anyio.create_task_group() as tg:
+        try:
+            pm = await PluginManager(character_config, task_group=tg, recorder=recorder).init()
+        except (PluginConfigError, PluginSetupError) as e:
+            # Setup errors were logged with their traceback already
+            logger.error(e)  # noqa: TRY400 The message lists every error, the traceback adds nothing
+            if recorder is not None:
+                await recorder.close()
+            tg.cancel_scope.cancel()  # Stops background tasks started by plugins that were set up
+            return
+        if profile_startup:
+            tg.start_soon(report_startup, pm)
+        try:
+            logger.info("Start listening to channels")
+            await pm.call("listen").all_async()  # All listeners can start at the same time :)
+        finally:
+            # Shielded, otherwise a ctrl+c would cancel the shutdown too and we would lose unsaved data
+            with anyio.CancelScope(shield=True):
+                await pm.shutdown()
+                if recorder is not None:
+                    await recorder.close()
+            if profile_startup and not pm.ready.is_set():
+                # The engine stopped before it was ready, the profile shows how far it got
+                logger.info(startup_profiler.report())
+            tg.cancel_scope.cancel()
 
 
-def main(character_config_file: str) -> None:
+def main(
+    character_config_file: str,
+    *,
+    profile_startup: bool = False,
+    # Optional instead of "| None", typer 0.12.3 (see poetry.lock) can't parse union types
+    record: Optional[str] = None,  # noqa: UP007
+) -> None:
+    """
+    Starts the engine with the given character. With --profile-startup the time of every startup phase and import is
+    logged once the first receiver is ready. With --record FILE every request is recorded, replay it with
+    benchmarks/replay.py.
+    """
+    if profile_startup:
+        startup_profiler.enable_import_timing()
     atexit.register(exit_cleanup)
-    logger.info("Wasurenakusa Engine version %s", version)
-    anyio.run(engine, character_config_file)
+    logger.info("Wasurenakusa Engine version %s", get_version())
+    anyio.run(functools.partial(engine, character_config_file, profile_startup=profile_startup, record=record))
 
 
 if __name__ == "__main__":
@@ -1,3 +1,5 @@
+import enum
+
 from pydantic import BaseModel
 
 from models.character import CharacterModel
@@ -8,6 +10,16 @@ from models.response import ResponseMessageModel
 from models.system_prompt import SystemPrompt
 
 
+class Priority(enum.IntEnum):
+    """
+    How urgent the work of a context is. Background work (e.g. condensing old memories) should use LOW so it does not
+    compete with the replies users are waiting for.
+    """
+
+    LOW = 0
+    NORMAL = 1
+
+
 class Context(BaseModel):
     character: CharacterModel | None = None
     request: RequestMessageModel | None = None
@@ -19,3 +31,19 @@ class Context(BaseModel):
     listener: str = None
     emitter: str = None
     user_id: str = None
+    request_id: str | None = None  # Set by the receiver, it is in every log record of the request
+    priority: Priority = Priority.NORMAL
+
+    def fork(self) -> "Context":
+        """
+        Returns a copy for a workflow run, much cheaper than a deepcopy. The lists are copied, so the copy can add
+        system prompts, functions and memories without changing this context. The messages, files and the character are
+        shared, replace them instead of changing them in place.
+        """
+        return self.model_copy(
+            update={
+                "system_prompts": list(self.system_prompts),
+                "llm_functions": list(self.llm_functions),
+                "shortterm_memory": list(self.shortterm_memory),
+            },
+        )
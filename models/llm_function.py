@@ -1,5 +1,5 @@
 from collections.abc import Callable
-from typing import Any
+from typing import Any, Literal
 
 from pydantic import BaseModel
 
@@ -12,6 +12,20 @@ class LlmFnParameter(BaseModel):
 
 
 class LlmFunction(BaseModel):
+    """
+    A function the LLM can call.
+
+    Attributes:
+        description (str): What the function does, the LLM decides by this when to call it.
+        parameters (list[LlmFnParameter]): The parameters of the function.
+        fn (Callable[[Any], str]): The function, sync or async.
+        cache_ttl (float | None): Seconds a result can be reused for calls with the same arguments, None disables it.
+        cache_scope (Literal["user", "global"]): Whether cached results are shared between all users or only reused
+            for the same user.
+    """
+
     description: str
     parameters: list[LlmFnParameter]
     fn: Callable[[Any], str]
+    cache_ttl: float | None = None
+    cache_scope: Literal["user", "global"] = "user"
@@ -1,11 +1,26 @@
-from typing import Literal
+from typing import Annotated, Literal
 
-from pydantic import BaseModel
+from pydantic import BaseModel, PlainSerializer, ValidatorFunctionWrapHandler, WrapValidator
+
+
+def keep_memoryview(value: object, handler: ValidatorFunctionWrapHandler) -> bytes | memoryview:
+    # Only python input can be a memoryview, json input (e.g. the memory file) is validated as bytes
+    return value if isinstance(value, memoryview) else handler(value)
+
+
+# bytes in the schema and in json, python code can also pass a memoryview
+FileData = Annotated[bytes, WrapValidator(keep_memoryview), PlainSerializer(bytes, return_type=bytes)]
 
 
 class FileModel(BaseModel):
+    """
+    A file of a message. The data can also be a read-only memoryview (e.g. over a download buffer), so big payloads are
+    passed around without copying them. Treat it as immutable either way, the same file is shared by the context, the
+    memory and the caches.
+    """
+
     mimetype: str
-    data: bytes
+    data: FileData
 
 
 class MessageModel(BaseModel):
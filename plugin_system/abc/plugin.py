@@ -9,6 +9,8 @@ from utilities.logging import get_logger
 
 class Plugin(ABC):
     pm: PluginManager
+    # The settings model of the plugin, declare it so the config is validated at startup together with all others
+    config_model: type[BaseSettings] | None = None
 
     def __init__(self, pm: PluginManager) -> None:
         self.pm = pm
@@ -22,18 +24,29 @@ class Plugin(ABC):
         under the main_class name of the plugin. This way other plugins can access the configuration too.
         """
 
-    def load_config(self, config_model: BaseSettings) -> None:
+    async def plugin_teardown(self) -> None:  # noqa: B027 Optional hook, most plugins have nothing to clean up
+        """
+        Called once when the engine shuts down. Flush buffers, stop background tasks, close connections and so on.
+        """
+
+    def load_config(self, config_model: type[BaseSettings] | None = None) -> None:
         """
         Loads the configuration from the characters plugin configuration and sets the self.config instance variable.
+        Settings of the config_model class attribute were already validated at startup and are used as they are.
 
         Args:
-            config_model (BaseSettings): The configuration model to use for loading the configuration.
+            config_model (type[BaseSettings] | None, optional): The configuration model to use for loading the
+                configuration. Defaults to the config_model class attribute.
 
         Returns:
             None
         """
-        cfg = self.pm.get_plugin_config(self.__class__.__name__)
-        self.config = config_model(**cfg)
+        config_model = config_model or self.config_model
+        config = self.pm.get_compiled_config(self.__class__.__name__)
+        if config is None or not isinstance(config, config_model):
+            cfg = self.pm.get_plugin_config(self.__class__.__name__)
+            config = config_model(**cfg)
+        self.config = config
 
     def get_plugin_by_name(self, name: str, plugins: list[PluginModel]) -> PluginModel:
         """
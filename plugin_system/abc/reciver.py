@@ -1,8 +1,10 @@
+import uuid
 from abc import abstractmethod
 
 from models.context import Context
 from models.request import RequestMessageModel
 from plugin_system.abc.plugin import Plugin
+from utilities.logging import log_context
 
 
 class ReciverPlugin(Plugin):
@@ -21,23 +23,48 @@ class ReciverPlugin(Plugin):
         this should trigger a workflow use the self.call_workflow function which creates a context and so on.
         """
 
-    async def call_workflow(self, request: RequestMessageModel, user_id: str | None = None) -> None:
+    def notify_ready(self) -> None:
+        """
+        Call this once the receiver is connected and can receive messages, the engine uses it to know when it is ready
+        (e.g. for the startup profile).
+        """
+        self.pm.receiver_ready(self)
+
+    async def call_workflow(
+        self,
+        request: RequestMessageModel,
+        user_id: str | None = None,
+        request_id: str | None = None,
+    ) -> None:
         """
         Calls the first workflow (aka default workflow) with the given request and user. Builds a context that is
-        exists for the lifetime of the request.
+        exists for the lifetime of the request. If the engine records traffic, the request and the response are
+        recorded once the workflow is done.
 
         Args:
             request (RequestModel): The request object.
             user (Optional): The user object/id/whatever. Defaults to None.
+            request_id (str | None, optional): The id of the request, it stays the same in every context of the
+                workflow (plugins can replace ctx.request). Defaults to a new random id.
 
         Returns:
             None
         """
-        ctx = Context(
+        # The request was validated when the channel built it, there is nothing left to validate
+        ctx = Context.model_construct(
             request=request,
             listener=self.__class__.__name__,
             emitter=self.__class__.__name__,  # By default we should set the emitter to the same as listener
+            user_id=user_id,
+            request_id=request_id or uuid.uuid4().hex,
         )
-        ctx.user_id = user_id
 
-        await self.pm.call("start_workflow", ctx=ctx).first()
+        recorder = self.pm.recorder
+        arrived = recorder.clock() if recorder is not None else 0.0
+        workflow_ctx = None
+        try:
+            with log_context(request_id=ctx.request_id, user_id=user_id):
+                workflow_ctx = await self.pm.call("start_workflow", ctx=ctx).first()
+        finally:
+            if recorder is not None:
+                await recorder.record(self.__class__.__name__, ctx, workflow_ctx, arrived)
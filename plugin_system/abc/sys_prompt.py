@@ -1,18 +1,59 @@
+import enum
 from abc import abstractmethod
+from collections.abc import Hashable
 
 from models.context import Context
 from models.system_prompt import SystemPrompt
 from plugin_system.abc.plugin import Plugin
 
 
+class PromptCacheScope(enum.StrEnum):
+    """
+    Declares for how long the system prompts of a SystemPromptPlugin stay the same, the workflow reuses them and only
+    calls the plugins whose prompts can have changed.
+
+    Attributes:
+        STATIC: The same for every request, until cache_ttl passed or cache_key changes.
+        USER: The same for every request of a user, until cache_ttl passed or cache_key changes.
+        TIME_BUCKET: The same within a time bucket of cache_ttl seconds, the buckets are aligned to the clock (e.g. a
+            cache_ttl of 60 changes at every full minute).
+        REQUEST: Generated for every request, nothing is cached.
+    """
+
+    STATIC = "static"
+    USER = "user"
+    TIME_BUCKET = "time_bucket"
+    REQUEST = "request"
+
+
 class SystemPromptPlugin(Plugin):
     """
     This plugin allows to implement system prompt stuff the system prompt is build right at the beginning.
+
+    Set cache_scope (and cache_ttl) if the prompts don't depend on every request, see PromptCacheScope. Cached prompts
+    are shared between requests, so nobody may change them after they were generated.
     """
 
+    cache_scope: PromptCacheScope = PromptCacheScope.REQUEST
+    cache_ttl: float | None = None  # seconds, None keeps STATIC and USER prompts until cache_key changes
+
+    def __init_subclass__(cls, **kwargs: object) -> None:
+        super().__init_subclass__(**kwargs)
+        # Rejected when the plugin is loaded, otherwise its prompts would be cached forever
+        if cls.cache_scope is PromptCacheScope.TIME_BUCKET and not cls.cache_ttl:
+            msg = f"{cls.__name__} uses the TIME_BUCKET cache scope, it needs a cache_ttl (the size of the buckets)"
+            raise TypeError(msg)
+
     @abstractmethod
     async def generate_system_prompts(self, ctx: Context) -> list[SystemPrompt]:
         """
         This function should generate a list of SystemPromptModules that then gets merged into the system prompt by the
         LLM in the best way to handle it. SO dont do any LLM specific formating etc.
         """
+
+    def cache_key(self, ctx: Context) -> Hashable:  # noqa: ARG002
+        """
+        Part of the key the cached prompts are stored under, return something else to invalidate them (e.g. a version
+        that changes whenever the source of the prompts changes).
+        """
+        return None
@@ -1,7 +1,13 @@
+import time
 from abc import abstractmethod
+from collections.abc import Hashable
 
 from models.context import Context
+from models.system_prompt import SystemPrompt
 from plugin_system.abc.plugin import Plugin
+from plugin_system.abc.sys_prompt import PromptCacheScope, SystemPromptPlugin
+from plugin_system.plugin_manager import PluginManager
+from utilities.cache import TtlCache
 
 
 class WorkflowPlugin(Plugin):
@@ -11,12 +17,18 @@ class WorkflowPlugin(Plugin):
     """
 
     name = "default"
+    system_prompt_cache_size = 1024  # max number of cached system prompt lists (one per plugin, user and time bucket)
+
+    def __init__(self, pm: PluginManager) -> None:
+        super().__init__(pm)
+        self.system_prompt_cache: TtlCache[Hashable, list[SystemPrompt]] = TtlCache(self.system_prompt_cache_size)
 
     @abstractmethod
-    async def start_workflow(self, ctx: Context) -> None:
+    async def start_workflow(self, ctx: Context) -> Context | None:
         """
         The workflow is called via the plugin manager, it should check it ctx.workflow if it should run or not by
-        comparing the workflow_name. This function should be called by ChannelReciver Plugins
+        comparing the workflow_name. This function should be called by ChannelReciver Plugins. Returns the context the
+        workflow worked on (with the response), e.g. for the recorder.
         """
 
     async def get_shortterm_memory(self, ctx: Context) -> None:
@@ -25,9 +37,40 @@ class WorkflowPlugin(Plugin):
 
     async def gather_system_prompts(self, ctx: Context) -> None:
         self.logger.info("Gather system prompts")
-        ctx.system_prompts.extend(
-            item for sublist in await self.pm.call("generate_system_prompts", ctx=ctx).all() for item in sublist
-        )
+        for plugin in self.pm.call("generate_system_prompts", ctx=ctx).plugin_list:
+            ctx.system_prompts.extend(await self.generate_system_prompts_of(plugin, ctx))
+
+    async def generate_system_prompts_of(self, plugin: SystemPromptPlugin, ctx: Context) -> list[SystemPrompt]:
+        """
+        Returns the system prompts of a plugin, from the cache if the cache scope of the plugin allows it.
+
+        Args:
+            plugin (SystemPromptPlugin): The plugin.
+            ctx (Context): The context of the request.
+
+        Returns:
+            list[SystemPrompt]: The system prompts of the plugin.
+        """
+        scope = plugin.cache_scope
+        ttl = plugin.cache_ttl
+        if scope is PromptCacheScope.REQUEST or (scope is PromptCacheScope.TIME_BUCKET and not ttl):
+            # A time bucket without a size (e.g. a cache_ttl changed at runtime) can't be cached safely
+            return await plugin.generate_system_prompts(ctx=ctx)
+
+        key = (id(plugin), scope, plugin.cache_key(ctx))
+        if scope is PromptCacheScope.USER:
+            key += (ctx.user_id,)
+        elif scope is PromptCacheScope.TIME_BUCKET:
+            now = time.time()
+            bucket = int(now // ttl)
+            key += (bucket,)
+            ttl = (bucket + 1) * ttl - now
+
+        prompts = self.system_prompt_cache.get(key)
+        if prompts is None:
+            prompts = await plugin.generate_system_prompts(ctx=ctx)
+            self.system_prompt_cache.put(key, prompts, ttl)
+        return prompts
 
     async def gather_llm_functions(self, ctx: Context) -> None:
         self.logger.info("Gather LLM functions")
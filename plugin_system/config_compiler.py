@@ -0,0 +1,82 @@
+"""
+Validates the settings of all activated plugins once, before any plugin is set up, so every config error of a character
+is reported together at startup instead of one by one whenever a plugin happens to run.
+"""
+
+from collections.abc import Iterable
+from typing import TYPE_CHECKING
+
+from pydantic import ValidationError
+from pydantic_settings import BaseSettings
+
+from models.character import CharacterModel
+from utilities.logging import get_logger
+
+if TYPE_CHECKING:
+    from plugin_system.abc.plugin import Plugin
+
+
+class PluginConfigError(Exception):
+    """
+    Raised when the settings of one or more plugins are invalid, the message lists all of them.
+
+    Attributes:
+        errors (dict[str, str]): The error message per plugin name.
+    """
+
+    def __init__(self, errors: dict[str, str]) -> None:
+        self.errors = errors
+        lines = [f"Invalid config of {len(errors)} plugin(s):"]
+        lines.extend(f"{name}: {error}" for name, error in errors.items())
+        super().__init__("\n".join(lines))
+
+
+class ConfigCompiler:
+    """
+    Validates the plugin settings of a character, see the module docstring.
+    """
+
+    def __init__(self) -> None:
+        """
+        Initializes a ConfigCompiler object.
+
+        Returns:
+            None
+        """
+        self.logger = get_logger(__name__)
+
+    def compile(
+        self,
+        character: CharacterModel,
+        plugin_classes: Iterable[type["Plugin"]],
+    ) -> dict[str, BaseSettings]:
+        """
+        Validates the settings of every plugin that declares a config_model.
+
+        Args:
+            character (CharacterModel): The character with the plugin configs.
+            plugin_classes (Iterable[type[Plugin]]): The activated plugin classes.
+
+        Raises:
+            PluginConfigError: If the settings of any plugin are invalid.
+
+        Returns:
+            dict[str, BaseSettings]: The validated settings by plugin name.
+        """
+        configs = {p.name: p.config or {} for p in character.plugins}
+        models = {
+            plugin_class.__name__: plugin_class.config_model
+            for plugin_class in plugin_classes
+            if getattr(plugin_class, "config_model", None) is not None
+        }
+
+        compiled = {}
+        errors = {}
+        for name, config_model in models.items():
+            try:
+                compiled[name] = config_model(**configs.get(name, {}))
+            except ValidationError as e:
+                errors[name] = str(e)
+        if errors:
+            raise PluginConfigError(errors)
+        return compiled
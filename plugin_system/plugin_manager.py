@@ -4,27 +4,66 @@ import inspect
 import subprocess
 import sys
 from abc import ABC
+from collections.abc import Awaitable, Callable
 from importlib.metadata import PackageNotFoundError, version
 from pathlib import Path
 from typing import TYPE_CHECKING
 
+import anyio
+from anyio.abc import TaskGroup
 from packaging.specifiers import SpecifierSet
 from packaging.version import parse as parse_version
+from pydantic_settings import BaseSettings
 
 from models.character import CharacterModel, PluginModel
 from plugin_system.call_builder import CallBuilder
+from plugin_system.config_compiler import ConfigCompiler
 from utilities.logging import get_logger
+from utilities.startup_profiler import startup_profiler
 
 if TYPE_CHECKING:
     from plugin_system.abc.plugin import Plugin
+    from plugin_system.abc.reciver import ReciverPlugin
+    from plugin_system.recorder import TrafficRecorder
+
+
+class PluginSetupError(Exception):
+    """
+    Raised when the plugin_setup of one or more plugins failed, the message lists all of them.
+
+    Attributes:
+        errors (dict[str, Exception]): The exception per plugin name.
+    """
+
+    def __init__(self, errors: dict[str, Exception]) -> None:
+        self.errors = errors
+        lines = [f"Setup of {len(errors)} plugin(s) failed:"]
+        lines.extend(f"{name}: {error!r}" for name, error in errors.items())
+        super().__init__("\n".join(lines))
 
 
 class PluginManager:
     plugin_configs: list[PluginModel]
 
-    def __init__(self, character: CharacterModel) -> None:
+    def __init__(
+        self,
+        character: CharacterModel,
+        task_group: TaskGroup | None = None,
+        plugin_dirs: list[Path] | None = None,
+        recorder: "TrafficRecorder | None" = None,
+    ) -> None:
         self.logger = get_logger(__name__)
+        # Records the requests of all receivers if set, see plugin_system/recorder.py
+        self.recorder = recorder
+        # Additional folders with plugins (e.g. the benchmark plugins), searched before 'plugins' and 'plugins_builtin'
+        self.__plugin_dirs = plugin_dirs or []
         self.__character = character
+        self.__plugin_configs = {p.name: p.config or {} for p in character.plugins}
+        # Validated settings by plugin name, filled by init
+        self.__compiled_configs: dict[str, BaseSettings] = {}
+        self.__config_compiler = ConfigCompiler()
+        # The task group lives as long as the engine runs, plugins can use it to run background tasks
+        self.__task_group = task_group
 
         # registered plugins are the base abstract classes of the plugins, they are used to check if a plugin is
         # properly implemented
@@ -38,7 +77,8 @@ class PluginManager:
         self.__loaded_plugin_function_class_map: dict = {}
         for fn_name in self.__plugin_type_map:
             self.__loaded_plugin_function_class_map[fn_name] = []
-        self.__load_all_plugins()
+        with startup_profiler.phase("plugin discovery"):
+            self.__load_all_plugins()
         self.logger.info("%s Plugins are loaded and available to be activated", len(self.__loaded_plugins))
 
         # activated plugins are instantiated classes, these are later used to do plugin calls.
@@ -48,7 +88,8 @@ class PluginManager:
             self.__activated_plugins_fn_map[fn_name] = []
 
         # Based on the character config we activate the plugins
-        self.__activate_plugins()
+        with startup_profiler.phase("plugin activation"):
+            self.__activate_plugins()
         self.logger.info("%s Plugins have been activated", len(self.__activated_plugins))
 
         # log the names of the activated plugins
@@ -60,10 +101,70 @@ class PluginManager:
     async def init(self) -> "PluginManager":
         # All plugins are activated now, we can call the plugin_setup method of each plugin (this way if a plugin wants
         # to call a plugin method of another plugin it can do so without any problems)
+        # All settings are validated before the first plugin is set up, so every config error is reported at once
+        with startup_profiler.phase("config compilation"):
+            self.__compiled_configs = self.__config_compiler.compile(
+                self.__character,
+                [plugin.__class__ for plugin in self.__activated_plugins],
+            )
         self.logger.info("Initializing plugins to be ready for use")
-        await self.__plugin_setup()
+        # Set by the first receiver that can receive messages
+        self.ready = anyio.Event()
+        with startup_profiler.phase("plugin_setup"):
+            await self.__plugin_setup()
         return self
 
+    def receiver_ready(self, plugin: "ReciverPlugin") -> None:
+        """
+        Called by receivers once they can receive messages, the engine counts as ready with the first one.
+
+        Args:
+            plugin (ReciverPlugin): The receiver that is ready.
+
+        Returns:
+            None
+        """
+        self.logger.info("%s is ready to receive messages", plugin.__class__.__name__)
+        if startup_profiler.mark("first receiver ready"):
+            self.ready.set()
+
+    async def shutdown(self) -> None:
+        """
+        Calls the plugin_teardown method of every activated plugin, so they can flush and close whatever they need to.
+        """
+        self.logger.info("Shutting down plugins")
+        await self.__teardown(self.__activated_plugins)
+
+    async def __teardown(self, plugins: list["Plugin"]) -> None:
+        async def teardown(plugin: "Plugin") -> None:
+            try:
+                await plugin.plugin_teardown()
+            except Exception:
+                self.logger.exception("Error while tearing down %s", plugin.__class__.__name__)
+
+        async with anyio.create_task_group() as tg:
+            for plugin in plugins:
+                tg.start_soon(teardown, plugin)
+
+    def start_background_task(self, fn: Callable[..., Awaitable[None]], *args: any) -> None:
+        """
+        Runs the given function in the background for the lifetime of the engine. Use plugin_teardown to stop it.
+
+        Args:
+            fn (Callable[..., Awaitable[None]]): The async function to run.
+            *args (any): Positional arguments passed to the function.
+
+        Raises:
+            RuntimeError: If the plugin manager was created without a task group.
+
+        Returns:
+            None
+        """
+        if self.__task_group is None:
+            msg = "The plugin manager has no task group, background tasks are not available!"
+            raise RuntimeError(msg)
+        self.__task_group.start_soon(fn, *args)
+
     def __add_to_fn_map(self, plugin: type["Plugin"]) -> None:
         """
         Adds the given plugin to the function map.
@@ -149,7 +250,8 @@ class PluginManager:
         """
         Load all plugins from external and internal plugin folders.
 
-        This method searches for plugin folders in the 'plugins' and 'plugins_builtin' directories.
+        This method searches for plugin folders in the additional plugin_dirs, the 'plugins' and 'plugins_builtin'
+        directories. Plugins of the additional dirs are handled like external plugins.
         It loads the plugins from these folders and adds them to the list of loaded plugin classes.
         The loaded plugin classes are then mapped to their corresponding plugin types.
 
@@ -159,12 +261,10 @@ class PluginManager:
         Returns:
             None
         """
-        external_plugin_folders = [folder for folder in Path("plugins").glob("*") if folder.is_dir()]
-        builtin_plugin_folders = [folder for folder in Path("plugins_builtin").glob("*") if folder.is_dir()]
-
-        external_plugin_classes = self.__load_plugins_from_folder(external_plugin_folders, is_external=True)
-        internal_plugin_classes = self.__load_plugins_from_folder(builtin_plugin_folders, is_external=False)
-        all_plugin_classes = external_plugin_classes + internal_plugin_classes
+        all_plugin_classes = []
+        for plugin_dir in [*self.__plugin_dirs, Path("plugins")]:
+            all_plugin_classes += self.__load_plugins_from_folder(plugin_dir, is_external=True)
+        all_plugin_classes += self.__load_plugins_from_folder(Path("plugins_builtin"), is_external=False)
 
         from plugin_system.abc.plugin import Plugin
 
@@ -178,9 +278,10 @@ class PluginManager:
                         self.__loaded_plugin_function_class_map[k].append(plugin_class)
                 pass
 
-    def __load_plugins_from_folder(self, plugin_folders: list[Path], *, is_external: bool) -> list:
+    def __load_plugins_from_folder(self, plugin_dir: Path, *, is_external: bool) -> list:
+        plugin_folders = [folder for folder in plugin_dir.glob("*") if folder.is_dir()]
         plugin_classes = []
-        with PluginManager.add_to_sys_path(Path("plugins" if is_external else "plugins_builtin")):
+        with PluginManager.add_to_sys_path(plugin_dir):
             for plugin_path in plugin_folders:
                 plugin_class = self.__load_plugin(plugin_path, is_external=is_external)
                 if not plugin_class:
@@ -278,7 +379,8 @@ class PluginManager:
             subprocess.check_call([sys.executable, "-m", "pip", "install", package])  # noqa: S603 plugins always can run abitrary code (they can simply call exactly that so why bother?)
         except subprocess.CalledProcessError:
             self.logger.exception(
-                "Failed to install package %s, maybe you need to install the dependency by hand", package
+                "Failed to install package %s, maybe you need to install the dependency by hand",
+                package,
             )
             return False
         return True
@@ -320,12 +422,19 @@ class PluginManager:
         Returns:
             dict or None: The configuration for the plugin if found, None otherwise.
         """
-        for p in self.__character.plugins:
-            if p.name == plugin_name:
-                if p.config is None:
-                    return {}
-                return p.config
-        return None
+        return self.__plugin_configs.get(plugin_name)
+
+    def get_compiled_config(self, plugin_name: str) -> BaseSettings | None:
+        """
+        Retrieves the validated settings of a plugin, see ConfigCompiler.
+
+        Args:
+            plugin_name (str): The name of the plugin.
+
+        Returns:
+            BaseSettings | None: The settings, None if the plugin declares no config_model.
+        """
+        return self.__compiled_configs.get(plugin_name)
 
     def __convert_caret_to_pip(self, version_specifier: str) -> str:
         """
@@ -345,9 +454,33 @@ class PluginManager:
     async def __plugin_setup(self) -> None:
         """
         Every plugin inplementation should have the plugin_setup method as it could not be called by hooks (because the
-        hookspecs would get into the way) we call it directly in the order the plugins where registered
+        hookspecs would get into the way) we call it directly. The setups run concurrently and each one is timed for the
+        startup profile.
+
+        Raises:
+            PluginSetupError: If the setup of any plugin failed, the plugins that were set up are torn down again.
         """
-        await self.call("plugin_setup").all_async()
+        errors: dict[str, Exception] = {}
+        set_up: list[Plugin] = []
+
+        async def setup(plugin: "Plugin") -> None:
+            with startup_profiler.phase(f"plugin_setup {plugin.__class__.__name__}"):
+                try:
+                    await plugin.plugin_setup()
+                except Exception as e:
+                    self.logger.exception("Error while setting up %s", plugin.__class__.__name__)
+                    errors[plugin.__class__.__name__] = e
+                else:
+                    set_up.append(plugin)
+
+        async with anyio.create_task_group() as tg:
+            for plugin in self.call("plugin_setup").plugin_list:
+                tg.start_soon(setup, plugin)
+
+        if errors:
+            # The other setups still ran to the end, so every failed plugin is reported at once
+            await self.__teardown(set_up)
+            raise PluginSetupError(errors)
 
     def call(self, function_name: str, **kwargs: dict[str, any]) -> CallBuilder:
         """
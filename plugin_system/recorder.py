@@ -0,0 +1,187 @@
+"""
+Records the requests the receivers pass to call_workflow, so real traffic can be replayed offline later (see
+benchmarks/replay.py). A recording is a gzip compressed file with one json object per line: a header, the requests with
+the time they arrived, the user, the content and the response of the workflow, and the attachments. Every attachment is
+stored once by its sha256 hash, before the first request that uses it.
+
+Start the engine with --record FILE to record.
+"""
+
+import base64
+import gzip
+import hashlib
+import json
+import time
+from collections.abc import Iterator
+from datetime import UTC, datetime
+from pathlib import Path
+from typing import NamedTuple
+
+import anyio
+
+from models.context import Context
+from models.message import FileModel, MessageModel
+from models.request import RequestMessageModel
+from models.response import ResponseMessageModel
+from utilities.logging import get_logger
+
+RECORDING_VERSION = 1
+
+
+class RecordedRequest(NamedTuple):
+    arrived: float  # seconds since the recording started
+    receiver: str
+    user_id: str | None
+    request: RequestMessageModel
+    response: ResponseMessageModel | None  # None if the workflow failed or sent nothing
+    duration: float  # seconds the workflow took
+
+
+class TrafficRecorder:
+    """
+    Writes a recording. The encoding and writing happen in a worker thread, one request at a time, so the event loop
+    never hashes or compresses attachments.
+    """
+
+    def __init__(self, path: Path) -> None:
+        """
+        Initializes a TrafficRecorder object and starts the recording file, an existing file is replaced.
+
+        Args:
+            path (Path): The recording file.
+
+        Returns:
+            None
+        """
+        self.logger = get_logger(__name__)
+        self.path = path
+        self.started = time.monotonic()
+        self.lock = anyio.Lock()
+        self.stored_files: set[str] = set()
+        self.records = 0
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self.file = gzip.open(path, "wt", encoding="utf-8")  # Open until close is called
+        header = {"version": RECORDING_VERSION, "started": datetime.now(UTC).isoformat()}
+        self.file.write(json.dumps(header) + "\n")
+
+    def clock(self) -> float:
+        """
+        Seconds since the recording started.
+        """
+        return time.monotonic() - self.started
+
+    async def record(self, receiver: str, ctx: Context, workflow_ctx: Context | None, arrived: float) -> None:
+        """
+        Records a request once its workflow is done. Errors are only logged, recording must not break a request.
+
+        Args:
+            receiver (str): The name of the receiver plugin.
+            ctx (Context): The context call_workflow built.
+            workflow_ctx (Context | None): The context returned by the workflow, it has the response.
+            arrived (float): The clock when the request arrived.
+
+        Returns:
+            None
+        """
+        duration = self.clock() - arrived
+        response = workflow_ctx.response if workflow_ctx is not None else None
+        try:
+            async with self.lock:
+                await anyio.to_thread.run_sync(
+                    self.write_record,
+                    RecordedRequest(arrived, receiver, ctx.user_id, ctx.request, response, duration),
+                )
+        except Exception:
+            self.logger.exception("Could not record the request")
+
+    def write_record(self, record: RecordedRequest) -> None:
+        lines = []
+        request = self.encode_message(record.request, lines)
+        response = self.encode_message(record.response, lines) if record.response is not None else None
+        lines.append(
+            json.dumps(
+                {
+                    "arrived": round(record.arrived, 6),
+                    "receiver": record.receiver,
+                    "user_id": record.user_id,
+                    "request": request,
+                    "response": response,
+                    "duration": round(record.duration, 6),
+                },
+                separators=(",", ":"),
+            ),
+        )
+        self.file.write("\n".join(lines) + "\n")
+        self.records += 1
+
+    def encode_message(self, message: MessageModel, lines: list[str]) -> list[str | dict]:
+        content = []
+        for c in message.content:
+            if isinstance(c, FileModel):
+                file_hash = hashlib.sha256(c.data).hexdigest()
+                if file_hash not in self.stored_files:
+                    self.stored_files.add(file_hash)
+                    data = base64.b64encode(c.data).decode()
+                    lines.append(json.dumps({"file": file_hash, "mimetype": c.mimetype, "data": data}))
+                content.append({"file": file_hash, "mimetype": c.mimetype})
+            else:
+                content.append(c)
+        return content
+
+    async def close(self) -> None:
+        async with self.lock:
+            await anyio.to_thread.run_sync(self.file.close)
+        self.logger.info("Recorded %s requests to %s", self.records, self.path)
+
+
+def iter_recording(path: Path) -> Iterator[RecordedRequest]:
+    """
+    Reads a recording in the order the requests finished. Attachments used by several requests are the same FileModel.
+
+    Args:
+        path (Path): The recording file.
+
+    Raises:
+        ValueError: If the file is no recording or of an unknown version.
+
+    Yields:
+        RecordedRequest: The recorded requests.
+    """
+    files: dict[str, FileModel] = {}
+
+    def decode(content: list[str | dict]) -> list[str | FileModel]:
+        return [files[c["file"]] if isinstance(c, dict) else c for c in content]
+
+    with gzip.open(path, "rt", encoding="utf-8") as f:
+        header = json.loads(f.readline() or "{}")
+        if header.get("version") != RECORDING_VERSION:
+            msg = f"{path} is no recording of version {RECORDING_VERSION}"
+            raise ValueError(msg)
+        for line in f:
+            entry = json.loads(line)
+            if "file" in entry:
+                files[entry["file"]] = FileModel.model_construct(
+                    mimetype=entry["mimetype"],
+                    data=base64.b64decode(entry["data"]),
+                )
+                continue
+            response = entry["response"]
+            yield RecordedRequest(
+                arrived=entry["arrived"],
+                receiver=entry["receiver"],
+                user_id=entry["user_id"],
+                request=RequestMessageModel.model_construct(role="user", content=decode(entry["request"])),
+                response=(
+                    ResponseMessageModel.model_construct(role="llm", content=decode(response))
+                    if response is not None
+                    else None
+                ),
+                duration=entry["duration"],
+            )
+
+
+def read_recording(path: Path) -> list[RecordedRequest]:
+    """
+    Reads a whole recording, sorted by the time the requests arrived.
+    """
+    return sorted(iter_recording(path), key=lambda r: r.arrived)
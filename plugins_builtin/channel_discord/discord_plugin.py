@@ -1,17 +1,32 @@
-import httpx
-from interactions import DM, Client, Intents
-from interactions.api.events import MessageCreate, Startup
+from __future__ import annotations
+
+from typing import TYPE_CHECKING
+
+import anyio
 from pydantic import Field
-from pydantic_settings import BaseSettings
+from pydantic_settings import BaseSettings, SettingsConfigDict
 
 from models.context import Context
 from models.message import FileModel
 from models.request import RequestMessageModel
 from plugin_system.abc.emitter import EmitterPlugin
 from plugin_system.abc.reciver import ReciverPlugin
+from utilities.cache import TtlCache
+from utilities.lazy_import import lazy_import
+
+if TYPE_CHECKING:
+    import httpx
+    import interactions
+    from interactions import DM, Attachment, User
+else:
+    # The SDKs are only loaded once the plugin is set up, plugin discovery imports this module even if it is not used
+    httpx = lazy_import("httpx")
+    interactions = lazy_import("interactions")
 
 
 class DiscordPluginConfig(BaseSettings):
+    model_config = SettingsConfigDict(frozen=True)
+
     api_token: str = Field(None, alias="DISCORD_API_TOKEN")  # Set
     allowed_mimetypes: list[str] = [
         "image/jpeg",
@@ -20,23 +35,50 @@ class DiscordPluginConfig(BaseSettings):
         "image/webp",
     ]  # Good default as anthropic and openai support them out of the box
     allowed_size: int = 3  # in MB
+    max_parallel_downloads: int = 4  # attachments of one message downloaded at the same time
+    max_connections: int = 10  # pooled connections to the Discord CDN
+    download_timeout: float = 30  # seconds
+    user_cache_size: int = 1000  # users and DM channels kept, so replies don't have to look them up again
+    user_cache_ttl: float = 3600  # seconds
 
 
 class DiscordPlugin(ReciverPlugin, EmitterPlugin):
     config: DiscordPluginConfig
+    config_model = DiscordPluginConfig
 
     async def plugin_setup(self) -> None:
-        self.load_config(DiscordPluginConfig)
-        self.client = Client(intents=Intents.MESSAGES | Intents.GUILDS)
+        self.load_config()
+        self.client = interactions.Client(intents=interactions.Intents.MESSAGES | interactions.Intents.GUILDS)
+        # One pooled client for all downloads, so the connections to the CDN are reused between messages
+        self.http_client = httpx.AsyncClient(
+            limits=httpx.Limits(max_connections=self.config.max_connections),
+            timeout=self.config.download_timeout,
+            follow_redirects=True,
+        )
+
+        self.users: TtlCache[str, User] = TtlCache(self.config.user_cache_size, self.config.user_cache_ttl)
+        self.dm_channels: TtlCache[str, DM] = TtlCache(self.config.user_cache_size, self.config.user_cache_ttl)
+
+    async def plugin_teardown(self) -> None:
+        await self.http_client.aclose()
 
     async def emit(self, ctx: Context) -> None:
         if ctx.emitter != self.__class__.__name__:
             return
         self.logger.info("Sending response")
-        user = await self.client.fetch_user(ctx.user_id)
         if ctx.response and (len(ctx.response.content) > 0):
             message, files = await self.form_response_from_content(ctx.response.content)
-            await user.send(message, files=files)
+            dm_channel = await self.get_dm_channel(ctx.user_id)
+            try:
+                await dm_channel.send(message, files=files)
+            except interactions.client.errors.NotFound:
+                # The cached channel is gone, look it up again and retry once
+                self.invalidate_user(ctx.user_id)
+                dm_channel = await self.get_dm_channel(ctx.user_id, force=True)
+                await dm_channel.send(message, files=files)
+            except interactions.client.errors.HTTPException:
+                self.invalidate_user(ctx.user_id)
+                raise
 
     async def form_response_from_content(self, content: list[str | FileModel]) -> None:
         message = ""
@@ -49,56 +91,139 @@ class DiscordPlugin(ReciverPlugin, EmitterPlugin):
         return message, files
 
     async def listen(self) -> None:
-        @self.client.listen(Startup)
+        @self.client.listen(interactions.api.events.Startup)
         async def start() -> None:
             self.logger.info("Listening for Discord events as %s", self.client.user.display_name)
+            self.notify_ready()
 
-        @self.client.listen(MessageCreate)
-        async def on_message_create(event: MessageCreate) -> None:
+        @self.client.listen(interactions.api.events.MessageCreate)
+        async def on_message_create(event: interactions.api.events.MessageCreate) -> None:
             if event.message.author.id == self.client.user.id:
                 return
-            if not isinstance(event.message.channel, DM):
+            if not isinstance(event.message.channel, interactions.DM):
                 return
             self.logger.info(
                 "Reviced a new request from %s",
                 event.message.author.username,
             )
+            # Remember where the user wrote from, the reply goes there without asking Discord again
+            user_id = str(event.message.author.id)
+            self.users.put(user_id, event.message.author)
+            self.dm_channels.put(user_id, event.message.channel)
 
             self.logger.info("Create Context")
 
-            content = []
-            async with httpx.AsyncClient() as client:
-                for a in event.message.attachments:
-                    if a.content_type not in self.config.allowed_mimetypes:
-                        continue
-                    if a.size > self.config.allowed_size * 2**20:
-                        continue
-                        # we should download the file now
-                    try:
-                        r = await client.get(a.url)
-                        r.raise_for_status()
-
-                        content.append(
-                            FileModel(
-                                mimetype=a.content_type,
-                                data=r.content,
-                            ),
-                        )
-                    except httpx.HTTPStatusError as exc:
-                        self.logger.error(  # noqa: TRY400 We don't care why it failed, the status code is enough
-                            f"Recived a {exc.response.status_code} error when trying to download the url: {a.url}. \
-                            Ignoring this now.",
-                        )
-                        continue
+            content: list[str | FileModel] = await self.download_attachments(event.message.attachments)
             if event.message.content:
                 content.append(event.message.content)
             message = RequestMessageModel(role="user", content=content)
-            await self.call_workflow(message, user_id=str(event.message.author.id))
+            await self.call_workflow(message, user_id=user_id)
 
         await self.client.astart(self.config.api_token)
 
+    async def download_attachments(self, attachments: list[Attachment]) -> list[FileModel]:
+        """
+        Downloads the allowed attachments of a message concurrently, at most max_parallel_downloads at the same time.
+        Attachments that fail to download are skipped.
+
+        Args:
+            attachments (list[Attachment]): The attachments of the message.
+
+        Returns:
+            list[FileModel]: The downloaded files, in the order of the attachments.
+        """
+        attachments = [a for a in attachments if a.content_type in self.config.allowed_mimetypes]
+        files: list[FileModel | None] = [None] * len(attachments)
+        limiter = anyio.CapacityLimiter(self.config.max_parallel_downloads)
+
+        async def download(i: int, attachment: Attachment) -> None:
+            async with limiter:
+                files[i] = await self.download_attachment(attachment)
+
+        async with anyio.create_task_group() as tg:
+            for i, attachment in enumerate(attachments):
+                tg.start_soon(download, i, attachment)
+        return [file for file in files if file is not None]
+
+    async def download_attachment(self, attachment: Attachment) -> FileModel | None:
+        """
+        Streams an attachment and aborts as soon as it gets bigger than allowed_size, the size Discord reports is only
+        used to skip obviously too big files early.
+
+        Args:
+            attachment (Attachment): The attachment to download.
+
+        Returns:
+            FileModel | None: The file, None if it is too big or the download failed.
+        """
+        max_size = self.config.allowed_size * 2**20
+        if attachment.size > max_size:
+            return None
+        try:
+            async with self.http_client.stream("GET", attachment.url) as r:
+                r.raise_for_status()
+                # The content-length is only a hint for the buffer, the decoded body can be bigger or smaller
+                try:
+                    size = max(int(r.headers.get("content-length", 0)), 0)
+                except ValueError:
+                    size = 0
+                if size <= max_size:
+                    # The chunks are written into one buffer, so the data isn't copied again by joining them
+                    buffer = bytearray(size)
+                    size = 0
+                    async for chunk in r.aiter_bytes():
+                        if size + len(chunk) > max_size:
+                            size += len(chunk)
+                            break
+                        buffer[size : size + len(chunk)] = chunk
+                        size += len(chunk)
+                    del buffer[size:]
+                if size > max_size:
+                    self.logger.warning("Ignoring %s, it is over %s MB", attachment.url, self.config.allowed_size)
+                    return None
+        except httpx.HTTPStatusError as exc:
+            self.logger.error(  # noqa: TRY400 We don't care why it failed, the status code is enough
+                f"Recived a {exc.response.status_code} error when trying to download the url: {attachment.url}. \
+                Ignoring this now.",
+            )
+            return None
+        except httpx.HTTPError as exc:
+            self.logger.warning("Failed to download %s (%r), ignoring it", attachment.url, exc)
+            return None
+        return FileModel.model_construct(mimetype=attachment.content_type, data=memoryview(buffer).toreadonly())
+
     async def update_status(self, ctx: Context) -> None:
-        user = await self.client.fetch_user(ctx.user_id)
-        dm_channel: DM = await user.fetch_dm()
+        if ctx.emitter != self.__class__.__name__:
+            return
+        dm_channel = await self.get_dm_channel(ctx.user_id)
         if dm_channel:
-            await dm_channel.trigger_typing()
+            try:
+                await dm_channel.trigger_typing()
+            except interactions.client.errors.HTTPException:
+                self.invalidate_user(ctx.user_id)
+                raise
+
+    async def get_dm_channel(self, user_id: str, *, force: bool = False) -> DM:
+        """
+        Returns the DM channel of a user, from the cache if possible.
+
+        Args:
+            user_id (str): The id of the user.
+            force (bool, optional): Ask Discord even if the user or channel are cached. Defaults to False.
+
+        Returns:
+            DM: The DM channel.
+        """
+        dm_channel = None if force else self.dm_channels.get(user_id)
+        if dm_channel is None:
+            user = None if force else self.users.get(user_id)
+            if user is None:
+                user = await self.client.fetch_user(user_id, force=force)
+                self.users.put(user_id, user)
+            dm_channel = await user.fetch_dm(force=force)
+            self.dm_channels.put(user_id, dm_channel)
+        return dm_channel
+
+    def invalidate_user(self, user_id: str) -> None:
+        self.users.pop(user_id)
+        self.dm_channels.pop(user_id)
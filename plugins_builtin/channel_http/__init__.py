@@ -0,0 +1,10 @@
+from .http_channel import HttpChannelPlugin
+
+dependencies = []
+
+PluginMainClass = HttpChannelPlugin
+
+PLUGIN_NAME = "HTTP Channel"
+PLUGIN_AUTHOR = "wasurenakusa team"
+PLUGIN_VERSION = "1.0.0"
+PLUGIN_DESCRIPTION = """HTTP and WebSocket API to talk to a character from your own backend"""
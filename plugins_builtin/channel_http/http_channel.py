@@ -0,0 +1,325 @@
+import base64
+import contextlib
+import hmac
+import json
+import math
+import uuid
+from collections.abc import AsyncIterator
+
+import anyio
+from anyio.streams.memory import MemoryObjectReceiveStream, MemoryObjectSendStream
+from pydantic import Base64Bytes, BaseModel, Field, ValidationError
+from pydantic_settings import BaseSettings, SettingsConfigDict
+
+from models.context import Context
+from models.message import FileModel
+from models.request import RequestMessageModel
+from models.response import ResponseMessageModel
+from plugin_system.abc.emitter import EmitterPlugin
+from plugin_system.abc.reciver import ReciverPlugin
+from utilities.http_server import HttpError, HttpRequest, HttpResponse, HttpServer
+from utilities.websocket import WebSocket, WebSocketClosedError, websocket_response
+
+
+class HttpChannelPluginConfig(BaseSettings):
+    model_config = SettingsConfigDict(frozen=True)
+
+    host: str = "127.0.0.1"
+    port: int = 8080
+    api_token: str | None = Field(None, alias="HTTP_CHANNEL_TOKEN")  # Bearer token of the clients, None allows anyone
+    max_in_flight: int = 64  # workflows running at the same time, more messages are answered with 503 and retry-after
+    retry_after: int = 1  # seconds the clients should wait after a 503
+    response_timeout: float = 300  # seconds a request waits for its reply
+    max_batch_size: int = 100  # messages of one batch request
+    max_pipelined: int = 16  # pipelined requests of one connection that are handled at the same time
+    keepalive_timeout: float = 15  # seconds an idle connection is kept open
+    allowed_mimetypes: list[str] = [
+        "image/jpeg",
+        "image/png",
+        "image/gif",
+        "image/webp",
+    ]
+    allowed_size: int = 3  # in MB per file
+    max_body_size: int = 32  # in MB per request or websocket message
+
+
+class FileIn(BaseModel):
+    mimetype: str
+    data: Base64Bytes
+
+
+class MessageIn(BaseModel):
+    user_id: str = Field(min_length=1, max_length=256)
+    content: list[str | FileIn] = Field(min_length=1)
+    stream: bool = False  # answer with newline delimited json events instead of waiting for the reply
+
+
+class BatchIn(BaseModel):
+    messages: list[MessageIn] = Field(min_length=1)
+    stream: bool = False  # stream the events of all messages, tagged with the index of the message
+
+
+class WebSocketMessageIn(MessageIn):
+    id: str | int | None = None  # sent back with every event of the message
+
+
+def encode_content(content: list[str | FileModel]) -> list[str | dict]:
+    return [
+        {"mimetype": c.mimetype, "data": base64.b64encode(c.data).decode()} if isinstance(c, FileModel) else c
+        for c in content
+    ]
+
+
+class PendingReply:
+    """
+    The state of a message whose workflow is running: the responses emitted so far and, for streamed replies, where its
+    events go.
+    """
+
+    def __init__(self, events: MemoryObjectSendStream[dict] | None = None, tag: dict | None = None) -> None:
+        self.events = events
+        self.tag = tag or {}  # added to every event, e.g. the index of a batch message
+        self.request_id = uuid.uuid4().hex
+        self.responses: list[ResponseMessageModel] = []
+        self.error: str | None = None
+        self.done = anyio.Event()
+
+    def publish(self, event: dict) -> None:
+        if self.events is None:
+            return
+        # The client may be gone, the reply still ends up in the memory
+        with contextlib.suppress(anyio.BrokenResourceError, anyio.ClosedResourceError):
+            self.events.send_nowait({**self.tag, **event})
+
+    def finish(self) -> None:
+        if self.error:
+            self.publish({"type": "error", "status": 500, "message": self.error})
+        self.publish({"type": "done", "request_id": self.request_id})
+        if self.events is not None:
+            self.events.close()
+        self.done.set()
+
+    def result(self) -> dict:
+        result = {**self.tag, "request_id": self.request_id}
+        if self.error:
+            result["error"] = self.error
+        result["content"] = [c for response in self.responses for c in encode_content(response.content)]
+        return result
+
+
+class HttpChannelPlugin(ReciverPlugin, EmitterPlugin):
+    """
+    An HTTP and WebSocket API for a character:
+
+    - POST /v1/messages with {"user_id": ..., "content": ["text", {"mimetype": ..., "data": base64}]} answers with the
+      reply once the workflow is done, with "stream": true it sends newline delimited json events (status, response,
+      done) while the workflow runs.
+    - POST /v1/batch with {"messages": [...]} runs all messages at the same time and answers with their replies in the
+      same order (or streams their events tagged with "index").
+    - GET /v1/ws is a websocket, every text message is a message like above with an optional "id", the events are sent
+      back tagged with it. Any number of messages can be in flight.
+    - GET /health returns the load.
+
+    Connections are kept alive and pipelined requests are handled at the same time. If max_in_flight workflows are
+    running, new messages are answered with 503 and a retry-after header (a websocket gets an error event).
+    """
+
+    config: HttpChannelPluginConfig
+    config_model = HttpChannelPluginConfig
+    channel_name = "http"
+
+    async def plugin_setup(self) -> None:
+        self.load_config()
+        self.in_flight = 0
+        # The reply of every running workflow by its request id, plugins can replace ctx.request but the id stays
+        self.pending: dict[str, PendingReply] = {}
+        self.server = HttpServer(
+            self.handle,
+            self.config.host,
+            self.config.port,
+            max_body_size=self.config.max_body_size * 1024 * 1024,
+            keepalive_timeout=self.config.keepalive_timeout,
+            max_pipelined=self.config.max_pipelined,
+        )
+
+    async def listen(self) -> None:
+        async with anyio.create_task_group() as tg:
+            await tg.start(self.server.serve)
+            self.notify_ready()
+
+    async def emit(self, ctx: Context) -> None:
+        if ctx.emitter != self.__class__.__name__:
+            return
+        reply = self.pending.get(ctx.request_id)
+        if reply is None or ctx.response is None:
+            return
+        reply.responses.append(ctx.response)
+        reply.publish({"type": "response", "content": encode_content(ctx.response.content)})
+
+    async def update_status(self, ctx: Context) -> None:
+        if ctx.emitter != self.__class__.__name__:
+            return
+        reply = self.pending.get(ctx.request_id)
+        if reply is not None:
+            reply.publish({"type": "status", "status": "typing"})
+
+    async def handle(self, request: HttpRequest) -> HttpResponse:
+        if request.path == "/health":
+            return HttpResponse.json({"in_flight": self.in_flight, "max_in_flight": self.config.max_in_flight})
+        self.authorize(request)
+        routes = {
+            "/v1/messages": ("POST", self.handle_message),
+            "/v1/batch": ("POST", self.handle_batch),
+            "/v1/ws": ("GET", self.handle_websocket),
+        }
+        if request.path not in routes:
+            raise HttpError(404)
+        method, handler = routes[request.path]
+        if request.method != method:
+            raise HttpError(405, headers={"allow": method})
+        return await handler(request)
+
+    def authorize(self, request: HttpRequest) -> None:
+        if self.config.api_token is None:
+            return
+        # Browsers can't set headers on websockets, they can send the token as query parameter
+        token = request.headers.get("authorization", "").removeprefix("Bearer ") or request.query.get("token", "")
+        if not hmac.compare_digest(token.encode(), self.config.api_token.encode()):
+            raise HttpError(401, headers={"www-authenticate": "Bearer"})
+
+    async def handle_message(self, request: HttpRequest) -> HttpResponse:
+        message = self.parse(MessageIn, request.body)
+        engine_request = self.build_request(message)
+        self.admit(1)
+        if message.stream:
+            send_events, receive_events = anyio.create_memory_object_stream[dict](math.inf)
+            self.start(engine_request, message.user_id, PendingReply(send_events))
+            return HttpResponse(200, headers={"content-type": "application/x-ndjson"}, stream=ndjson(receive_events))
+
+        reply = PendingReply()
+        self.start(engine_request, message.user_id, reply)
+        await self.wait(reply)
+        return HttpResponse.json(reply.result(), 500 if reply.error else 200)
+
+    async def handle_batch(self, request: HttpRequest) -> HttpResponse:
+        batch = self.parse(BatchIn, request.body)
+        if len(batch.messages) > self.config.max_batch_size:
+            raise HttpError(413, f"Max {self.config.max_batch_size} messages per batch")
+        engine_requests = [self.build_request(message) for message in batch.messages]
+        self.admit(len(engine_requests))
+
+        if batch.stream:
+            send_events, receive_events = anyio.create_memory_object_stream[dict](math.inf)
+            with send_events:
+                for index, (message, engine_request) in enumerate(zip(batch.messages, engine_requests, strict=True)):
+                    self.start(engine_request, message.user_id, PendingReply(send_events.clone(), {"index": index}))
+            return HttpResponse(200, headers={"content-type": "application/x-ndjson"}, stream=ndjson(receive_events))
+
+        replies = []
+        for index, (message, engine_request) in enumerate(zip(batch.messages, engine_requests, strict=True)):
+            reply = PendingReply(tag={"index": index})
+            self.start(engine_request, message.user_id, reply)
+            replies.append(reply)
+        for reply in replies:
+            await self.wait(reply)
+        return HttpResponse.json({"results": [reply.result() for reply in replies]})
+
+    async def handle_websocket(self, request: HttpRequest) -> HttpResponse:
+        return websocket_response(request, self.serve_websocket, self.config.max_body_size * 1024 * 1024)
+
+    async def serve_websocket(self, websocket: WebSocket) -> None:
+        send_events, receive_events = anyio.create_memory_object_stream[dict](math.inf)
+
+        async def forward() -> None:
+            with receive_events:
+                async for event in receive_events:
+                    try:
+                        await websocket.send(json.dumps(event))
+                    except WebSocketClosedError:
+                        return
+
+        async with anyio.create_task_group() as tg:
+            tg.start_soon(forward)
+            with send_events:
+                while True:
+                    try:
+                        data = await websocket.receive()
+                    except WebSocketClosedError:
+                        break
+                    message_id = None
+                    try:
+                        message = self.parse(WebSocketMessageIn, data)
+                        message_id = message.id
+                        engine_request = self.build_request(message)
+                        self.admit(1)
+                    except HttpError as e:
+                        error = {"id": message_id, "type": "error", "status": e.status, "message": e.message}
+                        if "retry-after" in e.headers:
+                            error["retry_after"] = int(e.headers["retry-after"])
+                        with contextlib.suppress(anyio.BrokenResourceError):
+                            send_events.send_nowait(error)
+                        continue
+                    self.start(engine_request, message.user_id, PendingReply(send_events.clone(), {"id": message_id}))
+            # The client is gone, the workflows that are still running finish without it
+            tg.cancel_scope.cancel()
+
+    def parse[T: BaseModel](self, model: type[T], body: bytes | str) -> T:
+        try:
+            return model.model_validate_json(body)
+        except ValidationError as e:
+            raise HttpError(400, f"Invalid message: {e.errors(include_url=False, include_input=False)}") from e
+
+    def build_request(self, message: MessageIn) -> RequestMessageModel:
+        content: list[str | FileModel] = []
+        for c in message.content:
+            if isinstance(c, str):
+                content.append(c)
+                continue
+            if c.mimetype not in self.config.allowed_mimetypes:
+                raise HttpError(415, f"Files of type {c.mimetype} are not allowed")
+            if len(c.data) > self.config.allowed_size * 1024 * 1024:
+                raise HttpError(413, f"Files can be at most {self.config.allowed_size} MB")
+            content.append(FileModel.model_construct(mimetype=c.mimetype, data=c.data))
+        # Everything is validated by now, no need to validate the engine models again
+        return RequestMessageModel.model_construct(role="user", content=content)
+
+    def admit(self, count: int) -> None:
+        """
+        Reserves count workflows or answers with 503 if the engine is saturated.
+        """
+        if self.in_flight + count > self.config.max_in_flight:
+            raise HttpError(
+                503,
+                "Too many messages in flight, retry later",
+                headers={"retry-after": str(self.config.retry_after)},
+            )
+        self.in_flight += count
+
+    def start(self, request: RequestMessageModel, user_id: str, reply: PendingReply) -> None:
+        # The workflow runs in the background of the engine, it finishes (and is saved to the memory) even if the
+        # client disconnects
+        self.pending[reply.request_id] = reply
+        self.pm.start_background_task(self.run_workflow, request, user_id, reply)
+
+    async def run_workflow(self, request: RequestMessageModel, user_id: str, reply: PendingReply) -> None:
+        try:
+            await self.call_workflow(request, user_id, reply.request_id)
+        except Exception:
+            self.logger.exception("Workflow failed")
+            reply.error = "The workflow failed"
+        finally:
+            self.pending.pop(reply.request_id, None)
+            self.in_flight -= 1
+            reply.finish()
+
+    async def wait(self, reply: PendingReply) -> None:
+        with anyio.move_on_after(self.config.response_timeout):
+            await reply.done.wait()
+        if not reply.done.is_set():
+            raise HttpError(504, "The reply took too long, it is still saved to the memory")
+
+
+async def ndjson(events: MemoryObjectReceiveStream[dict]) -> AsyncIterator[bytes]:
+    with events:
+        async for event in events:
+            yield (json.dumps(event) + "\n").encode()
@@ -1,48 +1,187 @@
+from __future__ import annotations
+
 import base64
-import random
-import string
+import hashlib
+import importlib.util
+import json
+import re
+from collections import Counter
+from typing import TYPE_CHECKING, Literal
 from xml.etree import ElementTree
 
-from anthropic import APIConnectionError, APIStatusError, AsyncAnthropic, RateLimitError
-from anthropic import types as anthropic_types
+import anyio
 from pydantic import Field
-from pydantic_settings import BaseSettings
+from pydantic_settings import BaseSettings, SettingsConfigDict
 
-from models.context import Context
+from models.context import Context, Priority
 from models.llm_function import LlmFunction
 from models.message import FileModel, MessageModel
 from models.response import ResponseMessageModel
 from models.system_prompt import SystemPrompt
 from plugin_system.abc.llm import LlmPlugin
+from plugins_builtin.llm_anthropic.image_processor import ImageProcessor
 from plugins_builtin.llm_anthropic.prompts import (
     DEFAULT_CHAIN_OF_THOUGHTS_PROMPT,
 )
+from plugins_builtin.llm_anthropic.tool_executor import ToolExecutor
+from utilities.cache import LruCache
+from utilities.lazy_import import lazy_import
+from utilities.rate_limiter import AdaptiveRateLimiter
+from utilities.retry import RETRYABLE_STATUS_CODES, backoff_delay, parse_retry_after
+from utilities.tokens import estimate_tokens
+
+if TYPE_CHECKING:
+    import anthropic
+    import httpx
+    from anthropic import types as anthropic_types
+else:
+    # The SDKs are only loaded once the plugin is set up, plugin discovery imports this module even if it is not used
+    anthropic = lazy_import("anthropic")
+    httpx = lazy_import("httpx")
 
 
 class AnthropicConfigModel(BaseSettings):
+    model_config = SettingsConfigDict(frozen=True)
+
     api_key: str = Field(None, alias="ANTHROPIC_API_KEY")  # Set
+    base_url: str | None = None  # e.g. the fake API of the benchmarks, defaults to ANTHROPIC_BASE_URL or the real API
     model: str = "claude-3-5-sonnet-20240620"
     max_tokens: int = 1000
     temperature: float | None = 1
     image_inclusion_threshold: int = 2
     cot_prompt: str = DEFAULT_CHAIN_OF_THOUGHTS_PROMPT
     max_tool_calls: int = 10
+    max_parallel_tool_calls: int = 4  # max tools running at the same time for one LLM response
+    tool_timeout: float = 30  # seconds a single tool call may take
+    tool_cache_size: int = 1024  # max number of cached results of llm functions with a cache_ttl
     important_rules_prompt: str | None = None
+    # Prompt caching, each breakpoint caches everything up to it: the static part of the system prompt, the tool
+    # definitions and the conversation history without the current message. An empty list disables prompt caching.
+    cache_breakpoints: list[Literal["system", "tools", "history"]] = ["system", "tools", "history"]
+    # System prompts that change often, they are moved behind the cached part of the system prompt
+    dynamic_system_prompts: list[str] = ["DateTime", "ConversationMemory"]
+    render_cache_size: int = 256  # max number of rendered system prompts kept for reuse
+    message_cache_size: int = 4096  # max number of converted history messages kept for reuse
+    image_cache_size: int = 64  # max number of base64 encoded images kept for reuse
+    # Images of the request are downscaled and re-encoded before they are sent, needs Pillow (the images extra)
+    image_max_dimension: int | None = 1568  # in pixels, None sends the images as they are
+    image_format: Literal["jpeg", "webp"] = "jpeg"
+    image_quality: int = 85
+    image_workers: int = 2  # max images processed at the same time
+    processed_image_cache_size: int = 64
+    # HTTP transport, the connections are pooled and kept alive between requests
+    max_connections: int = 20
+    max_keepalive_connections: int = 10
+    keepalive_expiry: float = 60  # seconds an idle connection is kept open
+    http2: bool = False  # needs the optional h2 package, install the http2 extra
+    connect_timeout: float = 5
+    read_timeout: float = 60
+    prewarm_connections: int = 1  # connections opened on setup so the first request skips DNS and TLS, 0 disables it
+    # Transient errors (connection errors, 408, 409, 429 and 5xx) are retried with jittered exponential backoff, a
+    # retry-after header of the server wins over the backoff
+    max_retries: int = 4
+    retry_base_delay: float = 0.5
+    retry_max_delay: float = 20
+    request_deadline: float = 120  # seconds one LLM request may take including all retries
+    # Client side rate limiting shared by all requests of this plugin. Limits that are None are learned from the rate
+    # limit headers of the API unless learn_rate_limits is off, no limits at all disables the rate limiter
+    learn_rate_limits: bool = True
+    requests_per_minute: int | None = None
+    input_tokens_per_minute: int | None = None
+    output_tokens_per_minute: int | None = None
 
 
 SUPPORTED_FILE_TYPES = ("image/jpeg", "image/png", "image/gif", "image/webp")
+IMAGE_TOKEN_ESTIMATE = 1600  # roughly what a full size image costs
+PROMPT_CACHING_BETA = "prompt-caching-2024-07-31"
+EPHEMERAL_CACHE_CONTROL = {"type": "ephemeral"}
+TOOL_NAME_PATTERN = re.compile(r"^[a-zA-Z0-9_-]{1,64}$")
 
 
 class AnthropicLlm(LlmPlugin):
     config: AnthropicConfigModel
+    config_model = AnthropicConfigModel
 
     async def plugin_setup(self) -> None:
-        self.load_config(AnthropicConfigModel)
+        self.load_config()
         if self.config.api_key is None:
             msg = "No 'ANTHROPIC_API_KEY' provided in the environment variables or plugin config! Can't continue to \
                 initialize the AnthropicLlm plugin!"
             raise ValueError(msg)
-        self.client = AsyncAnthropic(api_key=self.config.api_key)
+        http2 = self.config.http2
+        if http2 and importlib.util.find_spec("h2") is None:
+            self.logger.warning("http2 is enabled but h2 (the http2 extra) is not installed, falling back to HTTP/1.1")
+            http2 = False
+        self.http_client = anthropic.DefaultAsyncHttpxClient(
+            limits=httpx.Limits(
+                max_connections=self.config.max_connections,
+                max_keepalive_connections=self.config.max_keepalive_connections,
+                keepalive_expiry=self.config.keepalive_expiry,
+            ),
+            timeout=self.request_timeout(self.config.read_timeout),
+            http2=http2,
+        )
+        # Retries are done by generate_response, it knows the deadline of the request
+        self.client = anthropic.AsyncAnthropic(
+            api_key=self.config.api_key,
+            base_url=self.config.base_url,
+            http_client=self.http_client,
+            max_retries=0,
+        )
+        self.rate_limiter = AdaptiveRateLimiter(
+            self.config.requests_per_minute,
+            self.config.input_tokens_per_minute,
+            self.config.output_tokens_per_minute,
+            header_prefix="anthropic-ratelimit-" if self.config.learn_rate_limits else None,
+        )
+        self.render_cache: LruCache[tuple, str] = LruCache(self.config.render_cache_size)
+        # Keyed by the identity of the memory message/file, the entry keeps a reference to it so the id can't be reused
+        self.message_cache: LruCache[tuple[int, bool], tuple[MessageModel, anthropic_types.MessageParam]] = LruCache(
+            self.config.message_cache_size,
+        )
+        self.image_cache: LruCache[int, tuple[FileModel, str]] = LruCache(self.config.image_cache_size)
+        self.image_processor = None
+        if self.config.image_max_dimension is not None:
+            self.image_processor = ImageProcessor(
+                self.config.image_max_dimension,
+                self.config.image_format,
+                self.config.image_quality,
+                self.config.image_workers,
+                self.config.processed_image_cache_size,
+            )
+        self.tool_executor = ToolExecutor(
+            self.config.max_parallel_tool_calls,
+            self.config.tool_timeout,
+            self.config.tool_cache_size,
+        )
+        await self.prewarm()
+
+    async def plugin_teardown(self) -> None:
+        await self.http_client.aclose()
+
+    async def prewarm(self) -> None:
+        """
+        Opens prewarm_connections connections to the API, so the first request doesn't have to wait for DNS, TCP and
+        TLS. The responses don't matter, failing to connect is only logged.
+        """
+        url = str(self.client.base_url)
+
+        async def connect() -> None:
+            try:
+                await self.http_client.head(url)
+            except httpx.HTTPError as e:
+                self.logger.warning("Could not pre-warm a connection to %s: %r", url, e)
+
+        with anyio.move_on_after(self.config.connect_timeout):
+            async with anyio.create_task_group() as tg:
+                for _ in range(self.config.prewarm_connections):
+                    tg.start_soon(connect)
+
+    def request_timeout(self, remaining: float) -> httpx.Timeout:
+        return httpx.Timeout(
+            min(self.config.read_timeout, remaining),
+            connect=min(self.config.connect_timeout, remaining),
+        )
 
     async def get_llm_response(self, ctx: Context) -> None:
         """
@@ -54,9 +193,16 @@ class AnthropicLlm(LlmPlugin):
         Returns:
             None
         """
+        if self.image_processor is not None:
+            # The request keeps the processed images, so the memory stores the smaller versions as well. The request
+            # object is shared with the context of the channel, so it is replaced instead of changed
+            content = await self.image_processor.process_content(ctx.request.content)
+            ctx.request = ctx.request.model_copy(update={"content": content})
         system_prompts = self.generate_system_prompt(ctx)
         tools, tool_to_fn_map = self.generate_tool_list_and_map(ctx)
         messages = self.generate_message_params_from_memory(ctx)
+        if "history" in self.config.cache_breakpoints and messages:
+            messages[-1] = self.with_cache_control(messages[-1])
         # Add the current user message to the messages list
         messages.append({"role": "user", "content": self.engine_content_to_anthropic(ctx.request.content)})
 
@@ -68,78 +214,96 @@ class AnthropicLlm(LlmPlugin):
             system=system_prompts,
             messages=messages,
             tools=tools,
+            priority=ctx.priority,
         )
 
-        if response_message.stop_reason == "tool_use":
-            calls = 0
-            while response_message.stop_reason == "tool_use" and calls < self.config.max_tool_calls:
-                tool_name = response_message.content[0].name
-                tool_fn = tool_to_fn_map[tool_name]
-                tool_input = response_message.content[0].input
-                tool_output = await tool_fn(**tool_input)
-
-                tool_result_message: anthropic_types.ToolResultBlockParam = {
-                    "type": "tool_result",
-                    "tool_use_id": response_message.content[0].tool_use_id,
-                    "content": {
-                        "type": "text",
-                        "text": tool_output,
-                    },
-                }
-                messages.append(tool_result_message)
-                tools_to_use = tools
-
-                # if we run out ouf calls we should not call the tool anymore
-                if calls + 1 == self.config.max_tool_calls:
-                    tools_to_use = []
-
-                response_message = await self.generate_response(
-                    model=self.config.model,
-                    max_tokens=self.config.max_tokens,
-                    temperature=self.config.temperature,
-                    system=system_prompts,
-                    messages=messages,
-                    tools=tools_to_use,
-                )
-                calls += 1
-        elif response_message.stop_reason in ("end_turn", "max_tokens", "stop_sequence"):
-            ctx.response = ResponseMessageModel(role="llm", content=[response_message.content[0].text])
+        calls = 0
+        while response_message.stop_reason == "tool_use" and calls < self.config.max_tool_calls:
+            # The LLM can request multiple independent tools at once, they all run in parallel and the results are
+            # sent back with one message
+            tool_uses = [block for block in response_message.content if block.type == "tool_use"]
+            self.logger.info("Running %s tool calls", len(tool_uses))
+            tool_results = await self.tool_executor.run_all(tool_uses, tool_to_fn_map, ctx.user_id)
+            assistant_content = [block.model_dump() for block in response_message.content]
+            messages.append({"role": "assistant", "content": assistant_content})
+            messages.append({"role": "user", "content": tool_results})
+            calls += 1
+
+            # if we run out ouf calls we should not call the tool anymore
+            tools_to_use = tools if calls < self.config.max_tool_calls else []
+            response_message = await self.generate_response(
+                model=self.config.model,
+                max_tokens=self.config.max_tokens,
+                temperature=self.config.temperature,
+                system=system_prompts,
+                messages=messages,
+                tools=tools_to_use,
+                priority=ctx.priority,
+            )
+
+        text = "".join(block.text for block in response_message.content if block.type == "text")
+        if response_message.stop_reason in ("end_turn", "max_tokens", "stop_sequence") and text:
+            ctx.response = ResponseMessageModel.model_construct(role="llm", content=[text])
         else:
-            ctx.response = ResponseMessageModel(role="llm", content=["..."])
+            ctx.response = ResponseMessageModel.model_construct(role="llm", content=["..."])
+
+    def generate_system_prompt(self, ctx: Context) -> list[anthropic_types.TextBlockParam]:
+        """
+        Renders the system prompts into text blocks. The first block only contains prompts that rarely change, so it
+        stays byte identical across requests and can be cached. Prompts listed in dynamic_system_prompts end up in a
+        second block behind it.
+
+        Args:
+            ctx (Context): The context containing the system prompts.
 
-    def generate_system_prompt(self, ctx: Context) -> str:
-        final_system_prompt = ""
+        Returns:
+            list[anthropic_types.TextBlockParam]: The system prompt blocks.
+        """
+        static_prompts = [sp for sp in ctx.system_prompts if sp.name not in self.config.dynamic_system_prompts]
+        dynamic_prompts = [sp for sp in ctx.system_prompts if sp.name in self.config.dynamic_system_prompts]
 
-        for sp in ctx.system_prompts:
-            final_system_prompt += ElementTree.tostring(self.system_prompt_to_xml(sp), encoding="unicode") + "\n"
         if len(ctx.llm_functions) != 0:
             # LLM functions are present, we should add the chain of thoughts instructions to the system prompts
-            sp = SystemPrompt(
-                name="ChainOfThoughts",
-                content=self.config.cot_prompt,
-            )
-            final_system_prompt += (
-                ElementTree.tostring(
-                    self.system_prompt_to_xml(sp),
-                    encoding="unicode",
-                )
-                + "\n"
-            )
-
+            static_prompts.append(SystemPrompt(name="ChainOfThoughts", content=self.config.cot_prompt))
         if self.config.important_rules_prompt:
-            sp = SystemPrompt(
-                name="ImportantRules",
-                content=str(self.config.important_rules_prompt),
-            )
-            final_system_prompt += (
-                ElementTree.tostring(
-                    self.system_prompt_to_xml(sp),
-                    encoding="unicode",
-                )
-                + "\n"
-            )
+            static_prompts.append(SystemPrompt(name="ImportantRules", content=str(self.config.important_rules_prompt)))
+
+        blocks = []
+        static_text = self.render_system_prompts(static_prompts)
+        if static_text:
+            blocks.append({"type": "text", "text": static_text})
+            if "system" in self.config.cache_breakpoints:
+                blocks[-1]["cache_control"] = EPHEMERAL_CACHE_CONTROL
+        dynamic_text = self.render_system_prompts(dynamic_prompts)
+        if dynamic_text:
+            blocks.append({"type": "text", "text": dynamic_text})
+        return blocks
+
+    def render_system_prompts(self, system_prompts: list[SystemPrompt]) -> str:
+        return "".join(self.render_system_prompt(sp) for sp in system_prompts)
+
+    def render_system_prompt(self, system_prompt: SystemPrompt) -> str:
+        """
+        Renders a SystemPrompt to xml. Most system prompts (e.g. the character descriptions) are the same on every
+        request, so the rendered string is cached by the structure of the SystemPrompt.
 
-        return final_system_prompt
+        Args:
+            system_prompt (SystemPrompt): The SystemPrompt to render.
+
+        Returns:
+            str: The rendered xml followed by a newline.
+        """
+        key = self.system_prompt_key(system_prompt)
+        rendered = self.render_cache.get(key)
+        if rendered is None:
+            rendered = ElementTree.tostring(self.system_prompt_to_xml(system_prompt), encoding="unicode") + "\n"
+            self.render_cache.put(key, rendered)
+        return rendered
+
+    def system_prompt_key(self, system_prompt: SystemPrompt) -> tuple:
+        if isinstance(system_prompt.content, list):
+            return (system_prompt.name, tuple(self.system_prompt_key(sp) for sp in system_prompt.content))
+        return (system_prompt.name, system_prompt.content)
 
     def system_prompt_to_xml(self, system_prompt: SystemPrompt) -> ElementTree.Element:
         """
@@ -165,63 +329,204 @@ class AnthropicLlm(LlmPlugin):
         model: str,
         max_tokens: int,
         temperature: float,
-        system: str,
+        system: list[anthropic_types.TextBlockParam],
         messages: list[anthropic_types.MessageParam],
         tools: list[anthropic_types.ToolParam],
+        priority: Priority = Priority.NORMAL,
     ) -> anthropic_types.Message:
         """
         Generates a response using the Anthropic Language Model.
 
         Args:
-            system_prompts (str): The system prompts to provide context for the response.
+            system_prompts (list[anthropic_types.TextBlockParam]): The system prompts to provide context for the
+                                                                   response.
             messages (list[anthropic_types.MessageParam]): The list of messages exchanged between the user
                                                            and the system.
             tools (list[dict]): The list of tools used for generating the response.
+            priority (Priority, optional): Requests with a higher priority get through the rate limiter first.
+                                           Defaults to Priority.NORMAL.
 
         Returns:
             anthropic_types.Message: The generated response message.
 
         Raises:
-            ServerNotReachableError: If there is an API connection error or rate limit reached.
+            ServerNotReachableError: If there is an API connection error or rate limit reached and retrying didn't help.
         """
         r: anthropic_types.Message  # Python type hinting... not needed for the code to work but for my sanity...
-        try:
-            r = await self.client.messages.create(
-                model=model,
-                max_tokens=max_tokens,
-                temperature=temperature,
-                stream=False,  # We dont want to stream the response...
-                system=system,
-                messages=messages,
-                tools=tools,
-            )
-        except APIConnectionError as e:
-            self.logger.exception("API connection error!")
-            raise self.ServerNotReachableError() from e
-        except RateLimitError as e:
-            # We can't do anything about it, so we just raise it like its a server not reachable error (so other LLM
-            # plugins can take over)
-            self.logger.warning("Rate limit reached!")
-            raise self.ServerNotReachableError() from e
-        except APIStatusError as e:
-            self.logger.exception("API status error!")
-            raise self.ServerNotReachableError() from e
+        deadline = anyio.current_time() + self.config.request_deadline
+        input_tokens = self.estimate_input_tokens(system, messages, tools)
+        attempt = 0
+        while True:
+            try:
+                with anyio.fail_after(max(deadline - anyio.current_time(), 0)):
+                    reservation = await self.rate_limiter.acquire(input_tokens, max_tokens, priority)
+            except TimeoutError as e:
+                self.logger.warning("Rate limiter did not let the request through before its deadline!")
+                raise self.ServerNotReachableError() from e
+            used_tokens = (0, 0)
+            try:
+                raw_response = await self.client.messages.with_raw_response.create(
+                    model=model,
+                    max_tokens=max_tokens,
+                    temperature=temperature,
+                    stream=False,  # We dont want to stream the response...
+                    system=system,
+                    messages=messages,
+                    tools=tools,
+                    extra_headers={"anthropic-beta": PROMPT_CACHING_BETA} if self.config.cache_breakpoints else None,
+                    timeout=self.request_timeout(max(deadline - anyio.current_time(), 0)),
+                )
+                r = raw_response.parse()
+                used_tokens = (r.usage.input_tokens, r.usage.output_tokens)
+                break
+            except (anthropic.APIConnectionError, anthropic.APIStatusError) as e:
+                error = e
+            finally:
+                # Settled on every way out, a cancelled or failed request must not keep its tokens until the refill
+                self.rate_limiter.release(reservation, *used_tokens)
+
+            if isinstance(error, anthropic.RateLimitError):
+                self.rate_limiter.on_rate_limited(error.response.headers, parse_retry_after(error.response.headers))
+            delay = self.retry_delay(error, attempt)
+            if delay is None or anyio.current_time() + delay >= deadline:
+                # We can't do anything about it, so we raise it as server not reachable error (so other LLM
+                # plugins can take over)
+                if isinstance(error, anthropic.RateLimitError):
+                    self.logger.warning("Rate limit reached!")
+                else:
+                    self.logger.error("API error after %s attempts!", attempt + 1, exc_info=error)
+                raise self.ServerNotReachableError() from error
+            self.logger.warning("Transient API error (%r), retrying in %.2fs", error, delay)
+            await anyio.sleep(delay)
+            attempt += 1
+        self.rate_limiter.on_success(raw_response.headers)
+        self.log_usage(r.usage)
         return r
 
-    def generate_tool_list_and_map(self, ctx: Context) -> tuple[list[dict], dict]:
+    def estimate_input_tokens(
+        self,
+        system: list[anthropic_types.TextBlockParam],
+        messages: list[anthropic_types.MessageParam],
+        tools: list[anthropic_types.ToolParam],
+    ) -> int:
+        """
+        Estimates the input tokens of a request for the rate limiter, images count with a flat estimate instead of
+        their base64 size.
+        """
+        tokens = sum(estimate_tokens(block["text"]) for block in system)
+        tokens += estimate_tokens(json.dumps(tools))
+        for message in messages:
+            content = message["content"]
+            if isinstance(content, str):
+                tokens += estimate_tokens(content)
+                continue
+            for block in content:
+                if block["type"] == "image":
+                    tokens += IMAGE_TOKEN_ESTIMATE
+                elif block["type"] == "text":
+                    tokens += estimate_tokens(block["text"])
+                else:
+                    tokens += estimate_tokens(json.dumps(block, default=str))
+        return tokens
+
+    def retry_delay(self, error: anthropic.APIConnectionError | anthropic.APIStatusError, attempt: int) -> float | None:
+        """
+        Decides if a failed request should be retried.
+
+        Args:
+            error (anthropic.APIConnectionError | anthropic.APIStatusError): The error of the failed attempt.
+            attempt (int): The number of the failed attempt, starting at 0.
+
+        Returns:
+            float | None: The seconds to wait before retrying, None if the request should not be retried.
+        """
+        if attempt >= self.config.max_retries:
+            return None
+        if isinstance(error, anthropic.APIStatusError):
+            headers = error.response.headers
+            should_retry = headers.get("x-should-retry")
+            if should_retry == "false" or (should_retry != "true" and error.status_code not in RETRYABLE_STATUS_CODES):
+                return None
+            retry_after = parse_retry_after(headers)
+            if retry_after is not None:
+                return retry_after
+        return backoff_delay(attempt, self.config.retry_base_delay, self.config.retry_max_delay)
+
+    def log_usage(self, usage: anthropic_types.Usage) -> None:
+        # The cache fields are not part of the typed usage model of the sdk version we use, they are passed as extras
+        self.logger.info(
+            "Token usage: %s input, %s output, %s read from cache, %s written to cache",
+            usage.input_tokens,
+            usage.output_tokens,
+            getattr(usage, "cache_read_input_tokens", None) or 0,
+            getattr(usage, "cache_creation_input_tokens", None) or 0,
+        )
+
+    def with_cache_control(self, message_param: anthropic_types.MessageParam) -> anthropic_types.MessageParam:
+        """
+        Returns a copy of the message param with a cache breakpoint on its last content block.
+
+        Args:
+            message_param (anthropic_types.MessageParam): The message param, it is not changed.
+
+        Returns:
+            anthropic_types.MessageParam: The message param with the cache breakpoint.
+        """
+        content = message_param["content"]
+        if not content:
+            return message_param
+        return {**message_param, "content": [*content[:-1], {**content[-1], "cache_control": EPHEMERAL_CACHE_CONTROL}]}
+
+    def generate_tool_list_and_map(self, ctx: Context) -> tuple[list[dict], dict[str, LlmFunction]]:
         tool_map = {}
         tools = []
 
-        for llm_fn in ctx.llm_functions:
-            tool, tool_name, tool_fn = self.engine_llm_function_to_anthropic(llm_fn)
-            tool_map[tool_name] = tool_fn
+        converted = [self.engine_llm_function_to_anthropic(llm_fn)[:2] for llm_fn in ctx.llm_functions]
+        name_counts = Counter(name for _, name in converted)
+        for llm_fn, (tool, name) in zip(ctx.llm_functions, converted, strict=True):
+            tool_name = name
+            if name_counts[name] > 1:
+                # Several functions with the same name, every one of them gets a suffix from its definition and owner,
+                # so the names don't depend on the order the plugins returned them in
+                owner = self.tool_owner(llm_fn)
+                tool_name = f"{name[:55]}_{self.tool_hash(llm_fn, owner)}"
+                copy = 1
+                while tool_name in tool_map:
+                    # The same definition from the same place, nothing but the order tells them apart
+                    copy += 1
+                    tool_name = f"{name[:55]}_{self.tool_hash(llm_fn, f'{owner}#{copy}')}"
+                tool["name"] = tool_name
+            tool_map[tool_name] = llm_fn
             tools.append(tool)
+
+        # The llm functions are gathered in parallel, sort them so the tool block stays the same across requests
+        tools.sort(key=lambda tool: tool["name"])
+        if tools and "tools" in self.config.cache_breakpoints:
+            tools[-1] = {**tools[-1], "cache_control": EPHEMERAL_CACHE_CONTROL}
         return tools, tool_map
 
     def generate_message_params_from_memory(self, ctx: Context) -> list[anthropic_types.MessageParam]:
+        """
+        Converts the shortterm memory into message params. Memory messages don't change once they are stored, so
+        every message is only converted once per include/exclude images decision and reused on the next requests.
+        The returned params are shared with the cache, copy them before changing them!
+
+        Args:
+            ctx (Context): The context containing the shortterm memory.
+
+        Returns:
+            list[anthropic_types.MessageParam]: The message params.
+        """
         messages = []
+        memories_cnt = len(ctx.shortterm_memory)
         for i, memory_message in enumerate(ctx.shortterm_memory):
-            messages.append(self.engine_message_to_anthropic(memory_message, len(ctx.shortterm_memory), i))
+            exclude_images = memories_cnt - i > self.config.image_inclusion_threshold
+            key = (id(memory_message), exclude_images)
+            cached = self.message_cache.get(key)
+            if cached is None or cached[0] is not memory_message:
+                cached = (memory_message, self.engine_message_to_anthropic(memory_message, memories_cnt, i))
+                self.message_cache.put(key, cached)
+            messages.append(cached[1])
 
         return messages
 
@@ -276,13 +581,30 @@ class AnthropicLlm(LlmPlugin):
                         "type": "image",
                         "source": {
                             "type": "base64",
-                            "data": base64.b64encode(c.data),
+                            "data": self.encode_image(c),
                             "media_type": c.mimetype,
                         },
                     },
                 )
         return res
 
+    def encode_image(self, file: FileModel) -> str:
+        """
+        Base64 encodes the data of the file. The result is cached, a new image is most likeley sent again with the next
+        requests as part of the history.
+
+        Args:
+            file (FileModel): The file to encode.
+
+        Returns:
+            str: The base64 encoded data.
+        """
+        cached = self.image_cache.get(id(file))
+        if cached is None or cached[0] is not file:
+            cached = (file, base64.b64encode(file.data).decode())
+            self.image_cache.put(id(file), cached)
+        return cached[1]
+
     def engine_llm_function_to_anthropic(self, llm_fn: LlmFunction) -> tuple[anthropic_types.ToolParam, str, callable]:
         """
         Converts an LlmFunction object to a tool dictionary, tool name, and callable function.
@@ -295,8 +617,10 @@ class AnthropicLlm(LlmPlugin):
             tool name, and callable function.
 
         """
-        # we generate a random name for the tool to ensure that it is unique, 8 characters should be enough
-        tool_name = "".join(random.choices(string.ascii_lowercase, k=8))  # noqa: S311 No crypto in this case
+        # The name has to be the same on every request, otherwise the tool definitions could never be cached
+        tool_name = getattr(llm_fn.fn, "__name__", "")
+        if not TOOL_NAME_PATTERN.match(tool_name):
+            tool_name = f"tool_{self.tool_hash(llm_fn)}"
         tool_input_schema = {
             "type": "object",
             "properties": {},
@@ -318,3 +642,25 @@ class AnthropicLlm(LlmPlugin):
             del tool_dict["input_schema"]["required"]
 
         return tool_dict, tool_name, llm_fn.fn
+
+    def tool_hash(self, llm_fn: LlmFunction, disambiguator: str = "") -> str:
+        definition = json.dumps(
+            [llm_fn.description, [param.model_dump() for param in llm_fn.parameters], disambiguator],
+            sort_keys=True,
+        )
+        return hashlib.sha256(definition.encode()).hexdigest()[:8]
+
+    def tool_owner(self, llm_fn: LlmFunction) -> str:
+        """
+        Returns where the function comes from (module, qualified name and the class of the plugin it is bound to), it
+        tells functions with the same name and definition apart.
+        """
+        fn = llm_fn.fn
+        bound_to = getattr(fn, "__self__", None)
+        return ":".join(
+            [
+                getattr(fn, "__module__", None) or "",
+                getattr(fn, "__qualname__", None) or "",
+                type(bound_to).__name__ if bound_to is not None else "",
+            ],
+        )
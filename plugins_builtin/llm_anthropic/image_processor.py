@@ -0,0 +1,145 @@
+import hashlib
+import importlib.util
+import io
+from typing import Literal
+
+import anyio
+
+from models.message import FileModel
+from utilities.cache import LruCache
+from utilities.logging import get_logger
+
+# Animated gifs would lose their frames, they are passed through as they are
+PROCESSABLE_FILE_TYPES = ("image/jpeg", "image/png", "image/webp")
+
+
+class ImageProcessor:
+    """
+    Downscales images to max_dimension and re-encodes them as JPEG or WebP before they are sent to the LLM. Phone
+    photos are a lot bigger than what the LLM looks at, so this saves upload size, latency and image tokens. The work
+    runs in worker threads (at most max_workers at the same time) and the results are cached by the sha256 of the
+    image, so an image that is sent again (e.g. as part of the history) is only processed once.
+
+    Needs the optional Pillow package (the images extra), without it images are passed through unchanged.
+    """
+
+    def __init__(
+        self,
+        max_dimension: int,
+        output_format: Literal["jpeg", "webp"] = "jpeg",
+        quality: int = 85,
+        max_workers: int = 2,
+        cache_size: int = 64,
+    ) -> None:
+        """
+        Initializes an ImageProcessor object.
+
+        Args:
+            max_dimension (int): The max width and height in pixels.
+            output_format (Literal["jpeg", "webp"], optional): The format images are re-encoded to. Defaults to "jpeg".
+            quality (int, optional): The encoder quality from 1 to 100. Defaults to 85.
+            max_workers (int, optional): The max number of images processed at the same time. Defaults to 2.
+            cache_size (int, optional): The max number of processed images kept for reuse. Defaults to 64.
+
+        Returns:
+            None
+        """
+        self.logger = get_logger(__name__)
+        self.max_dimension = max_dimension
+        self.output_format = output_format
+        self.quality = quality
+        self.available = importlib.util.find_spec("PIL") is not None
+        self.limiter = anyio.CapacityLimiter(max_workers)
+        self.cache: LruCache[bytes, FileModel] = LruCache(cache_size)
+        if not self.available:
+            self.logger.warning(
+                "Pillow is not installed (the images extra), images are sent to the LLM without downscaling them",
+            )
+
+    async def process_content(self, content: list[str | FileModel]) -> list[str | FileModel]:
+        """
+        Processes all images of a message content concurrently.
+
+        Args:
+            content (list[str | FileModel]): The message content.
+
+        Returns:
+            list[str | FileModel]: The content with the processed images, everything else is unchanged.
+        """
+        result = list(content)
+
+        async def process(i: int, file: FileModel) -> None:
+            result[i] = await self.process(file)
+
+        async with anyio.create_task_group() as tg:
+            for i, c in enumerate(content):
+                if isinstance(c, FileModel):
+                    tg.start_soon(process, i, c)
+        return result
+
+    async def process(self, file: FileModel) -> FileModel:
+        """
+        Downscales and re-encodes one image. Other files, images that can't be decoded and images that would only get
+        bigger are returned as they are.
+
+        Args:
+            file (FileModel): The image.
+
+        Returns:
+            FileModel: The processed image.
+        """
+        if not self.available or file.mimetype not in PROCESSABLE_FILE_TYPES:
+            return file
+
+        async with self.limiter:
+            key = await anyio.to_thread.run_sync(self.digest, file.data)
+            cached = self.cache.get(key)
+            if cached is not None:
+                return cached
+            try:
+                reencoded = await anyio.to_thread.run_sync(self.reencode, file.data)
+            except Exception as e:  # noqa: BLE001 Pillow raises all kinds of errors for broken images
+                self.logger.warning("Could not process a %s image (%r), sending it as it is", file.mimetype, e)
+                reencoded = None
+
+        processed = file if reencoded is None else FileModel.model_construct(mimetype=reencoded[0], data=reencoded[1])
+        self.cache.put(key, processed)
+        if processed is not file:
+            self.logger.debug("Reduced an image from %s to %s bytes", len(file.data), len(processed.data))
+        return processed
+
+    def digest(self, data: bytes) -> bytes:
+        return hashlib.sha256(data).digest()
+
+    def reencode(self, data: bytes) -> tuple[str, bytes] | None:
+        """
+        Decodes, downscales and encodes the image. This is blocking, run it in a worker thread.
+
+        Args:
+            data (bytes): The encoded image.
+
+        Returns:
+            tuple[str, bytes] | None: The mimetype and data of the new image, None if it would not be smaller.
+        """
+        from PIL import Image, ImageOps  # Optional dependency
+
+        with Image.open(io.BytesIO(data)) as original:
+            # Lets the JPEG decoder skip most of the pixels of big images right away
+            original.draft("RGB", (self.max_dimension, self.max_dimension))
+            # Phone photos are often stored sideways with an orientation tag, which is lost when re-encoding
+            image = ImageOps.exif_transpose(original)
+            resized = max(image.size) > self.max_dimension
+            if resized:
+                image.thumbnail((self.max_dimension, self.max_dimension), Image.Resampling.LANCZOS)
+            if self.output_format == "jpeg" and image.mode not in ("RGB", "L"):
+                # JPEG has no alpha channel, put transparent images on a white background
+                rgba = image.convert("RGBA")
+                image = Image.new("RGB", rgba.size, "white")
+                image.paste(rgba, mask=rgba.getchannel("A"))
+
+            out = io.BytesIO()
+            image.save(out, format=self.output_format.upper(), quality=self.quality, optimize=True)
+
+        if not resized and out.tell() >= len(data):
+            return None
+        return f"image/{self.output_format}", out.getvalue()
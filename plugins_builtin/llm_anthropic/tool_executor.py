@@ -0,0 +1,157 @@
+from __future__ import annotations
+
+import functools
+import inspect
+import json
+from collections.abc import Callable, Hashable
+from typing import TYPE_CHECKING
+
+import anyio
+
+from models.llm_function import LlmFunction
+from utilities.cache import TtlCache
+from utilities.logging import get_logger
+
+if TYPE_CHECKING:
+    from anthropic import types as anthropic_types
+
+
+class PendingCall:
+    """
+    A tool call that is currently running, identical calls wait for it instead of running the tool again.
+    """
+
+    def __init__(self) -> None:
+        self.done = anyio.Event()
+        self.text = "The tool failed"
+        self.is_error = True
+
+
+class ToolExecutor:
+    """
+    Executes the tool calls of a LLM response. All tool calls of one response run concurrently, limited by
+    max_parallel, and every call has its own timeout. Failing tools don't fail the response, the LLM gets an error
+    result instead.
+
+    Results of llm functions with a cache_ttl are reused for calls with the same arguments until they expire, and
+    identical calls that come in while the first one is still running wait for its result. Errors are never cached.
+    """
+
+    def __init__(self, max_parallel: int, timeout: float, cache_size: int = 1024) -> None:
+        """
+        Initializes a ToolExecutor object.
+
+        Args:
+            max_parallel (int): The max number of tools running at the same time for one response.
+            timeout (float): Seconds a single tool call may take.
+            cache_size (int, optional): The max number of cached tool results. Defaults to 1024.
+
+        Returns:
+            None
+        """
+        self.logger = get_logger(__name__)
+        self.max_parallel = max_parallel
+        self.timeout = timeout
+        self.results: TtlCache[Hashable, str] = TtlCache(cache_size)
+        self.pending: dict[Hashable, PendingCall] = {}
+
+    async def run_all(
+        self,
+        tool_uses: list[anthropic_types.ToolUseBlock],
+        tool_to_fn_map: dict[str, LlmFunction],
+        user_id: str | None = None,
+    ) -> list[anthropic_types.ToolResultBlockParam]:
+        """
+        Runs all tool calls concurrently.
+
+        Args:
+            tool_uses (list[anthropic_types.ToolUseBlock]): The tool use blocks of the response.
+            tool_to_fn_map (dict[str, LlmFunction]): Maps the tool names to the llm functions.
+            user_id (str | None, optional): The user the response is for, scopes the cached results. Defaults to None.
+
+        Returns:
+            list[anthropic_types.ToolResultBlockParam]: One result per tool use, in the same order.
+        """
+        results: list[anthropic_types.ToolResultBlockParam | None] = [None] * len(tool_uses)
+        limiter = anyio.CapacityLimiter(self.max_parallel)
+
+        async def run(i: int, tool_use: anthropic_types.ToolUseBlock) -> None:
+            async with limiter:
+                results[i] = await self.run_one(tool_use, tool_to_fn_map.get(tool_use.name), user_id)
+
+        async with anyio.create_task_group() as tg:
+            for i, tool_use in enumerate(tool_uses):
+                tg.start_soon(run, i, tool_use)
+        return results
+
+    async def run_one(
+        self,
+        tool_use: anthropic_types.ToolUseBlock,
+        llm_fn: LlmFunction | None,
+        user_id: str | None = None,
+    ) -> anthropic_types.ToolResultBlockParam:
+        if llm_fn is None:
+            self.logger.warning("The LLM called the unknown tool %s", tool_use.name)
+            return self.tool_result(tool_use, f"There is no tool called {tool_use.name}", is_error=True)
+        if llm_fn.cache_ttl is None:
+            text, is_error = await self.execute(tool_use, llm_fn.fn)
+            return self.tool_result(tool_use, text, is_error=is_error)
+
+        key = self.cache_key(tool_use, llm_fn, user_id)
+        cached = self.results.get(key)
+        if cached is not None:
+            self.logger.debug("Reusing the cached result of tool %s", tool_use.name)
+            return self.tool_result(tool_use, cached)
+        pending = self.pending.get(key)
+        if pending is not None:
+            await pending.done.wait()
+            return self.tool_result(tool_use, pending.text, is_error=pending.is_error)
+
+        pending = self.pending[key] = PendingCall()
+        try:
+            pending.text, pending.is_error = await self.execute(tool_use, llm_fn.fn)
+            if not pending.is_error:
+                self.results.put(key, pending.text, llm_fn.cache_ttl)
+        finally:
+            # Also wake up the waiters if this call got cancelled, they get the default error result then
+            del self.pending[key]
+            pending.done.set()
+        return self.tool_result(tool_use, pending.text, is_error=pending.is_error)
+
+    async def execute(self, tool_use: anthropic_types.ToolUseBlock, fn: Callable) -> tuple[str, bool]:
+        try:
+            with anyio.fail_after(self.timeout):
+                output = await self.call(fn, tool_use.input)
+        except TimeoutError:
+            self.logger.warning("Tool %s timed out after %ss", tool_use.name, self.timeout)
+            return "The tool did not respond in time", True
+        except Exception:
+            self.logger.exception("Tool %s failed", tool_use.name)
+            return "The tool failed", True
+        return str(output), False
+
+    async def call(self, fn: Callable, tool_input: dict) -> str:
+        if inspect.iscoroutinefunction(fn):
+            return await fn(**tool_input)
+        # Sync functions would block the event loop, run them in a worker thread instead
+        return await anyio.to_thread.run_sync(functools.partial(fn, **tool_input), abandon_on_cancel=True)
+
+    def cache_key(self, tool_use: anthropic_types.ToolUseBlock, llm_fn: LlmFunction, user_id: str | None) -> Hashable:
+        scope = user_id if llm_fn.cache_scope == "user" else None
+        return scope, tool_use.name, json.dumps(tool_use.input, sort_keys=True, default=str)
+
+    def tool_result(
+        self,
+        tool_use: anthropic_types.ToolUseBlock,
+        text: str,
+        *,
+        is_error: bool = False,
+    ) -> anthropic_types.ToolResultBlockParam:
+        result: anthropic_types.ToolResultBlockParam = {
+            "type": "tool_result",
+            "tool_use_id": tool_use.id,
+            "content": [{"type": "text", "text": text}],
+        }
+        if is_error:
+            result["is_error"] = True
+        return result
@@ -8,5 +8,5 @@ PLUGIN_NAME = "Simple Memory Plugin"
 PLUGIN_AUTHOR = "wasurenakusa team"
 PLUGIN_VERSION = "1.0.0"
 PLUGIN_DESCRIPTION = """
-    Simple memory plugin that stores data in a json. Any memory management must be done by hand for now.
+    Simple memory plugin that stores data in a json. Old messages get condensed into longterm memories by the LLM.
     """
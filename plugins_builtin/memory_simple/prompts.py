@@ -0,0 +1,6 @@
+DEFAULT_CONDENSATION_PROMPT = """
+You are the memory of a conversation partner. You will get an older part of a conversation between a user and the \
+character. Write a short summary of it from the perspective of the character. Keep everything that could matter in \
+future conversations: facts about the user, their preferences, plans, promises, important events and the mood of \
+the conversation. Leave out greetings and small talk. Answer only with the summary, no introduction.
+"""
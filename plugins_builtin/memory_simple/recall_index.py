@@ -0,0 +1,161 @@
+import heapq
+import math
+import re
+from collections import Counter
+
+from models.system_prompt import SystemPrompt
+from utilities.tokens import estimate_tokens
+
+TOKEN_PATTERN = re.compile(r"\w+")
+
+
+def tokenize(text: str) -> list[str]:
+    return TOKEN_PATTERN.findall(text.lower())
+
+
+def system_prompt_text(system_prompt: SystemPrompt) -> str:
+    """
+    Flattens a (nested) SystemPrompt into plain text.
+
+    Args:
+        system_prompt (SystemPrompt): The SystemPrompt to flatten.
+
+    Returns:
+        str: The names and contents of the SystemPrompt and all its children.
+    """
+    if isinstance(system_prompt.content, list):
+        return " ".join([system_prompt.name, *(system_prompt_text(sp) for sp in system_prompt.content)])
+    return f"{system_prompt.name} {system_prompt.content}"
+
+
+class Bm25Index:
+    """
+    A small inverted index with BM25 ranking. Documents are added one by one, nothing is recomputed at query time
+    except the scores of the documents that actually contain a query term.
+
+    Attributes:
+        postings (dict[str, dict[int, int]]): Maps a term to the documents containing it and the term frequency.
+        doc_lengths (dict[int, int]): The number of terms of every document.
+    """
+
+    def __init__(self, k1: float = 1.5, b: float = 0.75) -> None:
+        self.k1 = k1
+        self.b = b
+        self.postings: dict[str, dict[int, int]] = {}
+        self.doc_lengths: dict[int, int] = {}
+        self.total_length = 0
+
+    def __len__(self) -> int:
+        return len(self.doc_lengths)
+
+    def add(self, doc_id: int, text: str) -> None:
+        """
+        Adds a document to the index, an existing document with the same id is replaced.
+
+        Args:
+            doc_id (int): The id of the document.
+            text (str): The text of the document.
+
+        Returns:
+            None
+        """
+        if doc_id in self.doc_lengths:
+            self.remove(doc_id)
+        terms = tokenize(text)
+        for term, tf in Counter(terms).items():
+            self.postings.setdefault(term, {})[doc_id] = tf
+        self.doc_lengths[doc_id] = len(terms)
+        self.total_length += len(terms)
+
+    def remove(self, doc_id: int) -> None:
+        length = self.doc_lengths.pop(doc_id, None)
+        if length is None:
+            return
+        self.total_length -= length
+        for term in list(self.postings):
+            docs = self.postings[term]
+            if docs.pop(doc_id, None) is not None and not docs:
+                del self.postings[term]
+
+    def search(self, query: str, top_k: int) -> list[tuple[int, float]]:
+        """
+        Returns the best matching documents for the query.
+
+        Args:
+            query (str): The search query.
+            top_k (int): The max number of results.
+
+        Returns:
+            list[tuple[int, float]]: Document ids and their scores, best match first.
+        """
+        if not self.doc_lengths:
+            return []
+        doc_cnt = len(self.doc_lengths)
+        avg_length = self.total_length / doc_cnt or 1
+        scores: dict[int, float] = {}
+        for term in set(tokenize(query)):
+            docs = self.postings.get(term)
+            if not docs:
+                continue
+            idf = math.log((doc_cnt - len(docs) + 0.5) / (len(docs) + 0.5) + 1)
+            for doc_id, tf in docs.items():
+                norm = self.k1 * (1 - self.b + self.b * self.doc_lengths[doc_id] / avg_length)
+                scores[doc_id] = scores.get(doc_id, 0.0) + idf * tf * (self.k1 + 1) / (tf + norm)
+        return heapq.nlargest(top_k, scores.items(), key=lambda item: item[1])
+
+
+class RecallIndex:
+    """
+    Keeps one Bm25Index per user over their longterm memories. The document id of a memory is its position in the
+    users longterm memory list.
+    """
+
+    def __init__(self) -> None:
+        self.indexes: dict[str, Bm25Index] = {}
+
+    def add(self, user_id: str, doc_id: int, memory: SystemPrompt) -> None:
+        self.indexes.setdefault(user_id, Bm25Index()).add(doc_id, system_prompt_text(memory))
+
+    def rebuild(self, user_id: str, memories: list[SystemPrompt]) -> None:
+        self.indexes[user_id] = Bm25Index()
+        for doc_id, memory in enumerate(memories):
+            self.add(user_id, doc_id, memory)
+
+    def recall(
+        self,
+        user_id: str,
+        query: str,
+        memories: list[SystemPrompt],
+        top_k: int,
+        token_budget: int,
+    ) -> list[SystemPrompt]:
+        """
+        Selects the memories that are most relevant for the query and fit into the token budget. If nothing matches
+        the most recent memories are used. The result keeps the original (chronological) order.
+
+        Args:
+            user_id (str): The user the memories belong to.
+            query (str): The text to search for, most likely the current request.
+            memories (list[SystemPrompt]): The longterm memories of the user, the index refers to them by position.
+            top_k (int): The max number of memories to select.
+            token_budget (int): The max estimated tokens of all selected memories together.
+
+        Returns:
+            list[SystemPrompt]: The selected memories.
+        """
+        index = self.indexes.get(user_id)
+        ranked = [doc_id for doc_id, _ in index.search(query, top_k)] if index else []
+        if not ranked:
+            ranked = list(range(len(memories) - 1, max(len(memories) - top_k, 0) - 1, -1))
+
+        selected = []
+        used_tokens = 0
+        for doc_id in ranked:
+            if doc_id >= len(memories):
+                continue
+            tokens = estimate_tokens(system_prompt_text(memories[doc_id]))
+            if used_tokens + tokens > token_budget:
+                continue
+            used_tokens += tokens
+            selected.append(doc_id)
+        return [memories[doc_id] for doc_id in sorted(selected)]
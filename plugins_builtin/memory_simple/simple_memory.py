@@ -1,14 +1,20 @@
-import json
+from pathlib import Path
+from typing import Literal
 
 import anyio
 from pydantic import BaseModel
-from pydantic_settings import BaseSettings
+from pydantic_settings import BaseSettings, SettingsConfigDict
 
-from models.context import Context
-from models.message import MessageModel
+from models.context import Context, Priority
+from models.message import FileModel, MessageModel
+from models.request import RequestMessageModel
 from models.system_prompt import SystemPrompt
 from plugin_system.abc.memory import MemoryPlugin
 from plugin_system.abc.sys_prompt import SystemPromptPlugin
+from plugins_builtin.memory_simple.prompts import DEFAULT_CONDENSATION_PROMPT
+from plugins_builtin.memory_simple.recall_index import RecallIndex
+from plugins_builtin.memory_simple.snapshot import SnapshotReader, SnapshotRecord, write_snapshot
+from utilities.write_behind import Durability, WriteBehindQueue, open_atomic, write_file_atomic
 
 
 class SimpleMemoryModel(BaseModel):
@@ -17,17 +23,59 @@ class SimpleMemoryModel(BaseModel):
 
 
 class SimpleMemoryPluginConfig(BaseSettings):
+    model_config = SettingsConfigDict(frozen=True)
+
     memory_file: str = "tmp/memory.json"
+    memory_format: Literal["json", "binary"] = "json"  # binary snapshots load lazily, see snapshot.py to convert
+    snapshot_compression: bool = False  # zlib compress the records of binary snapshots
+    flush_interval_ms: int = 500  # max time a change waits until it is written to the memory file
+    flush_max_changes: int = 50  # write earlier if this many changes are waiting
+    max_dirty_users: int = 1000  # if more users have unsaved changes, new changes have to wait for the next write
+    durability: Durability = Durability.BATCH  # none, batch (fsync per write) or write (fsync per change)
+    flush_max_retries: int = 5  # failed writes in a row until new changes fail instead of only being kept in memory
+    condense_after: int | None = 60  # condense old messages into longterm memory above this many, None disables it
+    condense_keep: int = 20  # number of the most recent messages that always stay in the shortterm memory
+    condensation_queue_size: int = 100  # max number of users waiting to get their memory condensed
+    condensation_prompt: str = DEFAULT_CONDENSATION_PROMPT
+    recall_top_k: int | None = 5  # max longterm memories in the system prompt, None adds all of them
+    recall_token_budget: int = 1000  # max (estimated) tokens of the recalled longterm memories
 
 
 class SimpleMemoryPlugin(MemoryPlugin, SystemPromptPlugin):
     config: SimpleMemoryPluginConfig
+    config_model = SimpleMemoryPluginConfig
     longterm_memory: dict[str, list[SystemPrompt]]
     shortterm_memory: dict[str, list[MessageModel]]
 
     async def plugin_setup(self) -> None:
-        self.load_config(SimpleMemoryPluginConfig)
+        self.load_config()
+        self.snapshot: SnapshotReader | None = None
         self.memory = await self.load_from_file()
+        self.recall_index = RecallIndex()
+        for user_id, memories in self.memory.longterm_memory.items():
+            self.recall_index.rebuild(user_id, memories)
+        self.persistence = WriteBehindQueue(
+            self.flush_memory,
+            flush_interval=self.config.flush_interval_ms / 1000,
+            flush_max_changes=self.config.flush_max_changes,
+            max_dirty=self.config.max_dirty_users,
+            durability=self.config.durability,
+            max_retries=self.config.flush_max_retries,
+        )
+        self.pm.start_background_task(self.persistence.run)
+
+        # Condensation runs in the background, the reply should never wait for a summary to be written
+        self.condensation_pending: set[str] = set()
+        self.condensation_send, self.condensation_receive = anyio.create_memory_object_stream[str](
+            self.config.condensation_queue_size,
+        )
+        self.pm.start_background_task(self.condensation_worker)
+
+    async def plugin_teardown(self) -> None:
+        self.condensation_send.close()
+        await self.persistence.close()
+        if self.snapshot:
+            self.snapshot.close()
 
     async def load_from_file(self) -> SimpleMemoryModel:
         # First check if the file exists and if not create it use anyio.open_file
@@ -35,6 +83,15 @@ class SimpleMemoryPlugin(MemoryPlugin, SystemPromptPlugin):
 
         await self.ensure_memory_file_exists()
 
+        if self.config.memory_format == "binary":
+            # Only the record headers and the (small) longterm memories are read now, the shortterm memory of a user
+            # is decoded when it is needed for the first time
+            self.snapshot = await anyio.to_thread.run_sync(SnapshotReader, Path(self.config.memory_file))
+            return SimpleMemoryModel.model_construct(
+                longterm_memory={user_id: self.snapshot.longterm_memory(user_id) for user_id in self.snapshot.records},
+                shortterm_memory={},
+            )
+
         async with await anyio.open_file(self.config.memory_file, "r") as f:
             content = await f.read()
             return SimpleMemoryModel.model_validate_json(content)
@@ -44,41 +101,228 @@ class SimpleMemoryPlugin(MemoryPlugin, SystemPromptPlugin):
         if not await config_memory_file.exists():
             await config_memory_file.parent.mkdir(parents=True, exist_ok=True)
             await config_memory_file.touch(exist_ok=True)
+            if self.config.memory_format == "binary":
+                empty_snapshot = await anyio.to_thread.run_sync(self.write_snapshot, [], True)  # noqa: FBT003
+                empty_snapshot.close()  # load_from_file opens it again
+                return
             # Write an empty json object to the file otherwise the json parser will fail on empty files ._.'
             await config_memory_file.write_text("{}")
 
-    async def save_to_file(self) -> None:
-        async with await anyio.open_file(self.config.memory_file, "w") as f:
-            await f.write(self.memory.model_dump_json())
+    async def save_to_file(self, *, fsync: bool = False, changed_users: set[str] | None = None) -> None:
+        """
+        Writes the memory file. Serializing happens on the event loop so no other change can slip in, the disk part is
+        done in a worker thread.
+
+        Args:
+            fsync (bool, optional): Whether to fsync the file. Defaults to False.
+            changed_users (set[str] | None, optional): The users that changed since the last save. Binary snapshots
+                copy the records of all other users as they are. Defaults to None (all users changed).
+
+        Returns:
+            None
+        """
+        if self.config.memory_format == "binary":
+            records = self.snapshot_records(changed_users)
+            new_snapshot = await anyio.to_thread.run_sync(self.write_snapshot, records, fsync)
+            old_snapshot, self.snapshot = self.snapshot, new_snapshot
+            if old_snapshot:
+                old_snapshot.close()
+            return
+
+        content = self.memory.model_dump_json().encode()
+        await anyio.to_thread.run_sync(
+            lambda: write_file_atomic(Path(self.config.memory_file), content, fsync=fsync),
+        )
+
+    def snapshot_records(self, changed_users: set[str] | None) -> list[SnapshotRecord]:
+        snapshot = self.snapshot
+        if snapshot and snapshot.compressed != self.config.snapshot_compression:
+            # The raw records can't be copied, every user has to be encoded again
+            changed_users = None
+
+        user_ids = self.memory.longterm_memory.keys() | self.memory.shortterm_memory.keys()
+        if snapshot:
+            user_ids |= snapshot.records.keys()
+
+        records = []
+        for user_id in user_ids:
+            if snapshot and user_id in snapshot.records and changed_users is not None and user_id not in changed_users:
+                records.append(
+                    SnapshotRecord(
+                        user_id=user_id,
+                        longterm_blob=snapshot.raw_longterm(user_id),
+                        shortterm_blob=snapshot.raw_shortterm(user_id),
+                    ),
+                )
+                continue
+            # Copy the lists, they could change while the worker thread encodes them
+            records.append(
+                SnapshotRecord(
+                    user_id=user_id,
+                    longterm_memory=list(self.memory.longterm_memory.get(user_id, [])),
+                    shortterm_memory=list(self.user_shortterm_memory(user_id)),
+                ),
+            )
+        return records
+
+    def write_snapshot(self, records: list[SnapshotRecord], fsync: bool) -> SnapshotReader:  # noqa: FBT001 Called via to_thread
+        # Opening the new snapshot maps the file and reads every record header, so it happens in the worker thread too
+        path = Path(self.config.memory_file)
+        with open_atomic(path, fsync=fsync) as f:
+            write_snapshot(f, records, compress=self.config.snapshot_compression)
+        return SnapshotReader(path)
+
+    async def flush_memory(self, user_ids: set[str], *, fsync: bool) -> None:
+        # Every batch of changed users ends up in one write
+        self.logger.debug("Writing memory file for %s changed users", len(user_ids))
+        await self.save_to_file(fsync=fsync, changed_users=user_ids)
+
+    def user_shortterm_memory(self, user_id: str) -> list[MessageModel]:
+        """
+        Returns the shortterm memory of the user, it is decoded from the snapshot on first access.
+
+        Args:
+            user_id (str): The user.
+
+        Returns:
+            list[MessageModel]: The shortterm memory of the user, changes to the list are kept.
+        """
+        memory = self.memory.shortterm_memory.get(user_id)
+        if memory is None:
+            memory = []
+            if self.snapshot and user_id in self.snapshot.records:
+                memory = self.snapshot.shortterm_memory(user_id)
+            self.memory.shortterm_memory[user_id] = memory
+        return memory
 
     async def save_to_longterm_memory(self, ctx: Context) -> list[SystemPrompt]:
-        # We dont touch the longterm memory for now. TODO: Touch it!
-        pass
+        """
+        Condenses the oldest shortterm memory messages of the user into a summary with the LLM, adds it to the longterm
+        memory and removes the condensed messages from the shortterm memory.
+
+        Args:
+            ctx (Context): The context, only the user_id is used.
+
+        Returns:
+            list[SystemPrompt]: The newly created longterm memories, empty if there was nothing to condense.
+        """
+        history = self.user_shortterm_memory(ctx.user_id)
+        cnt = self.condensable_count(history)
+        if cnt == 0:
+            return []
+        condensed = history[:cnt]
+
+        llm_ctx = Context.model_construct(
+            request=RequestMessageModel.model_construct(role="user", content=[self.transcript(condensed)]),
+            system_prompts=[SystemPrompt.model_construct(name="Task", content=self.config.condensation_prompt)],
+            user_id=ctx.user_id,
+            priority=Priority.LOW,
+        )
+        await self.pm.call("get_llm_response", ctx=llm_ctx).first()
+        summary = "".join(c for c in llm_ctx.response.content if isinstance(c, str)).strip() if llm_ctx.response else ""
+        if not summary:
+            self.logger.warning("Got no summary from the LLM, keeping the shortterm memory of user %s", ctx.user_id)
+            return []
+
+        # New messages could have been added while we waited for the LLM, only drop what we actually condensed
+        current = self.user_shortterm_memory(ctx.user_id)
+        if len(current) < cnt or any(a is not b for a, b in zip(current, condensed, strict=False)):
+            self.logger.warning("Shortterm memory of user %s changed while condensing, summary dropped", ctx.user_id)
+            return []
+        self.memory.shortterm_memory[ctx.user_id] = current[cnt:]
+
+        memory = SystemPrompt.model_construct(name="ConversationMemory", content=summary)
+        longterm_memory = self.memory.longterm_memory.setdefault(ctx.user_id, [])
+        longterm_memory.append(memory)
+        self.recall_index.add(ctx.user_id, len(longterm_memory) - 1, memory)
+        await self.persistence.mark_dirty(ctx.user_id)
+        self.logger.info("Condensed %s messages of user %s into the longterm memory", cnt, ctx.user_id)
+        return [memory]
+
+    def condensable_count(self, history: list[MessageModel]) -> int:
+        """
+        Returns how many of the oldest messages should be condensed. The remaining history has to start with a user
+        message, so we never split a request from its response.
+
+        Args:
+            history (list[MessageModel]): The shortterm memory of a user.
+
+        Returns:
+            int: The number of messages to condense, 0 if the history is still short enough.
+        """
+        if self.config.condense_after is None or len(history) <= self.config.condense_after:
+            return 0
+        cnt = len(history) - self.config.condense_keep
+        while 0 < cnt < len(history) and history[cnt].role != "user":
+            cnt -= 1
+        return max(cnt, 0)
+
+    def transcript(self, messages: list[MessageModel]) -> str:
+        lines = []
+        for message in messages:
+            speaker = "User" if message.role == "user" else "Character"
+            text = " ".join("[image]" if isinstance(c, FileModel) else c for c in message.content)
+            lines.append(f"{speaker}: {text}")
+        return "\n".join(lines)
+
+    def schedule_condensation(self, user_id: str) -> None:
+        if user_id in self.condensation_pending:
+            return
+        if self.condensable_count(self.user_shortterm_memory(user_id)) == 0:
+            return
+        try:
+            self.condensation_send.send_nowait(user_id)
+        except anyio.WouldBlock:
+            # No problem, the next message of the user will try again
+            self.logger.debug("Condensation queue is full, skipping user %s for now", user_id)
+            return
+        self.condensation_pending.add(user_id)
+
+    async def condensation_worker(self) -> None:
+        # Only one condensation at a time, this is background work and should not compete with the replies
+        async with self.condensation_receive:
+            async for user_id in self.condensation_receive:
+                try:
+                    await self.save_to_longterm_memory(Context.model_construct(user_id=user_id, priority=Priority.LOW))
+                except Exception:
+                    self.logger.exception("Failed to condense the shortterm memory of user %s", user_id)
+                finally:
+                    self.condensation_pending.discard(user_id)
 
     async def add_to_shortterm_memory(self, ctx: Context) -> None:
         self.logger.info(
             "Adding request and response to shortterm memory for user %s",
             ctx.user_id,
         )
-        if ctx.user_id not in self.memory.shortterm_memory:
-            self.memory.shortterm_memory[ctx.user_id] = []
-        self.memory.shortterm_memory[ctx.user_id].append(ctx.request)
-        self.memory.shortterm_memory[ctx.user_id].append(ctx.response)
-        ctx.shortterm_memory = self.memory.shortterm_memory[ctx.user_id]
+        shortterm_memory = self.user_shortterm_memory(ctx.user_id)
+        shortterm_memory.append(ctx.request)
+        shortterm_memory.append(ctx.response)
+        ctx.shortterm_memory = shortterm_memory
 
-        # For now out of simplicity we save the whole memory to the file after each change
-        await self.save_to_file()
+        # The memory file is written in the background, we don't want the reply to wait on the disk
+        await self.persistence.mark_dirty(ctx.user_id)
+        self.schedule_condensation(ctx.user_id)
 
     async def retrive_shortterm_memory(self, ctx: Context) -> list[MessageModel]:
-        if ctx.user_id not in self.memory.shortterm_memory:
-            self.memory.shortterm_memory[ctx.user_id] = []
+        shortterm_memory = self.user_shortterm_memory(ctx.user_id)
 
         self.logger.info(
             "Retrive %s memory entries from shortterm memory for user %s",
-            len(self.memory.shortterm_memory),
+            len(shortterm_memory),
             ctx.user_id,
         )
-        return self.memory.shortterm_memory[ctx.user_id]
+        return shortterm_memory
 
     async def generate_system_prompts(self, ctx: Context) -> list[SystemPrompt]:
-        return self.memory.longterm_memory.get(ctx.user_id, [])
+        memories = self.memory.longterm_memory.get(ctx.user_id, [])
+        if self.config.recall_top_k is None or not memories:
+            return memories
+
+        query = " ".join(c for c in ctx.request.content if isinstance(c, str)) if ctx.request else ""
+        return self.recall_index.recall(
+            ctx.user_id,
+            query,
+            memories,
+            top_k=self.config.recall_top_k,
+            token_budget=self.config.recall_token_budget,
+        )
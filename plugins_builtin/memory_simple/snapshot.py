@@ -0,0 +1,270 @@
+"""
+Binary snapshot format of the simple memory plugin.
+
+A snapshot starts with a header (magic, version, flags) followed by one record per user:
+
+    record header   user id length (u16), longterm blob length (u64), shortterm blob length (u64)
+    user id         utf-8
+    longterm blob   json list of SystemPrompts
+    shortterm blob  binary encoded messages, files are stored as raw bytes
+
+All numbers are little endian. If the compression flag is set every blob is zlib compressed. The record headers can be
+scanned without touching the blobs, so a snapshot is opened through mmap and a users shortterm memory is only decoded
+when it is needed.
+"""
+
+import contextlib
+import mmap
+import struct
+import zlib
+from collections.abc import Iterable
+from pathlib import Path
+from typing import BinaryIO, NamedTuple
+
+from pydantic import TypeAdapter
+
+from models.message import FileModel, MessageModel
+from models.system_prompt import SystemPrompt
+from utilities.lazy_import import lazy_import
+from utilities.write_behind import open_atomic
+
+typer = lazy_import("typer")  # Only needed by the converter CLI
+
+MAGIC = b"WSMS"
+VERSION = 1
+FLAG_COMPRESSED = 0x01
+
+FILE_HEADER = struct.Struct("<4sBB")
+RECORD_HEADER = struct.Struct("<HQQ")
+U8 = struct.Struct("<B")
+U16 = struct.Struct("<H")
+U32 = struct.Struct("<I")
+U64 = struct.Struct("<Q")
+
+CONTENT_TEXT = 0
+CONTENT_FILE = 1
+ROLES = ("user", "llm")
+
+longterm_adapter = TypeAdapter(list[SystemPrompt])
+
+
+class SnapshotFormatError(Exception):
+    pass
+
+
+class RecordLocation(NamedTuple):
+    longterm_offset: int
+    longterm_length: int
+    shortterm_offset: int
+    shortterm_length: int
+
+
+class SnapshotRecord(NamedTuple):
+    """
+    One user record to write. The blobs are either already encoded (e.g. copied from an older snapshot) or None and
+    get encoded from the given memories.
+    """
+
+    user_id: str
+    longterm_memory: list[SystemPrompt] | None = None
+    shortterm_memory: list[MessageModel] | None = None
+    longterm_blob: bytes | memoryview | None = None
+    shortterm_blob: bytes | memoryview | None = None
+
+
+def encode_messages(messages: list[MessageModel]) -> bytes:
+    parts = [U32.pack(len(messages))]
+    for message in messages:
+        parts.append(U8.pack(ROLES.index(message.role)))
+        parts.append(U32.pack(len(message.content)))
+        for content in message.content:
+            if isinstance(content, FileModel):
+                mimetype = content.mimetype.encode()
+                parts.extend((U8.pack(CONTENT_FILE), U16.pack(len(mimetype)), mimetype, U64.pack(len(content.data))))
+                parts.append(content.data)
+            else:
+                text = content.encode()
+                parts.extend((U8.pack(CONTENT_TEXT), U32.pack(len(text)), text))
+    return b"".join(parts)
+
+
+def decode_messages(data: bytes | memoryview) -> list[MessageModel]:
+    """
+    Decodes the shortterm blob of a record. The data was validated when it was written, so the models are constructed
+    without validating them again.
+
+    Args:
+        data (bytes | memoryview): The (uncompressed) shortterm blob.
+
+    Returns:
+        list[MessageModel]: The decoded messages.
+    """
+    pos = 0
+
+    def read(fmt: struct.Struct) -> int:
+        nonlocal pos
+        (value,) = fmt.unpack_from(data, pos)
+        pos += fmt.size
+        return value
+
+    def read_bytes(length: int) -> bytes:
+        nonlocal pos
+        value = bytes(data[pos : pos + length])
+        pos += length
+        return value
+
+    messages = []
+    for _ in range(read(U32)):
+        role = ROLES[read(U8)]
+        content = []
+        for _ in range(read(U32)):
+            if read(U8) == CONTENT_FILE:
+                mimetype = read_bytes(read(U16)).decode()
+                content.append(FileModel.model_construct(mimetype=mimetype, data=read_bytes(read(U64))))
+            else:
+                content.append(read_bytes(read(U32)).decode())
+        messages.append(MessageModel.model_construct(role=role, content=content))
+    return messages
+
+
+class SnapshotReader:
+    """
+    Opens a snapshot through mmap and indexes the records by user id, the blobs are only decoded on request.
+    """
+
+    def __init__(self, path: Path) -> None:
+        self.path = path
+        self.records: dict[str, RecordLocation] = {}
+        self.compressed = False
+        self._mmap: mmap.mmap | None = None
+
+        with path.open("rb") as f:
+            if path.stat().st_size == 0:
+                return
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        self._scan()
+
+    def _scan(self) -> None:
+        data = self._mmap
+        if len(data) < FILE_HEADER.size:
+            msg = f"{self.path} is too short to be a memory snapshot"
+            raise SnapshotFormatError(msg)
+        magic, version, flags = FILE_HEADER.unpack_from(data, 0)
+        if magic != MAGIC or version != VERSION:
+            msg = f"{self.path} is not a memory snapshot (version {VERSION})"
+            raise SnapshotFormatError(msg)
+        self.compressed = bool(flags & FLAG_COMPRESSED)
+
+        pos = FILE_HEADER.size
+        while pos < len(data):
+            user_id_length, longterm_length, shortterm_length = RECORD_HEADER.unpack_from(data, pos)
+            pos += RECORD_HEADER.size
+            user_id = data[pos : pos + user_id_length].decode()
+            pos += user_id_length
+            self.records[user_id] = RecordLocation(pos, longterm_length, pos + longterm_length, shortterm_length)
+            pos += longterm_length + shortterm_length
+            if pos > len(data):
+                msg = f"{self.path} is truncated, record of user {user_id} is incomplete"
+                raise SnapshotFormatError(msg)
+
+    def raw_longterm(self, user_id: str) -> memoryview:
+        location = self.records[user_id]
+        return memoryview(self._mmap)[location.longterm_offset : location.longterm_offset + location.longterm_length]
+
+    def raw_shortterm(self, user_id: str) -> memoryview:
+        location = self.records[user_id]
+        start = location.shortterm_offset
+        return memoryview(self._mmap)[start : start + location.shortterm_length]
+
+    def longterm_memory(self, user_id: str) -> list[SystemPrompt]:
+        return longterm_adapter.validate_json(bytes(self._decompress(self.raw_longterm(user_id))))
+
+    def shortterm_memory(self, user_id: str) -> list[MessageModel]:
+        return decode_messages(self._decompress(self.raw_shortterm(user_id)))
+
+    def close(self) -> None:
+        if self._mmap is None:
+            return
+        # If somebody still holds a view into the snapshot, the mapping goes away with the view
+        with contextlib.suppress(BufferError):
+            self._mmap.close()
+        self._mmap = None
+
+    def _decompress(self, blob: memoryview) -> bytes | memoryview:
+        return zlib.decompress(blob) if self.compressed else blob
+
+
+def write_snapshot(f: BinaryIO, records: Iterable[SnapshotRecord], *, compress: bool) -> None:
+    """
+    Writes a snapshot, records with raw blobs are copied as they are. The raw blobs must have been written with the
+    same compression setting. This is blocking, run it in a worker thread.
+
+    Args:
+        f (BinaryIO): The file to write to.
+        records (Iterable[SnapshotRecord]): The user records.
+        compress (bool): Whether new blobs should be zlib compressed.
+
+    Returns:
+        None
+    """
+    f.write(FILE_HEADER.pack(MAGIC, VERSION, FLAG_COMPRESSED if compress else 0))
+    for record in records:
+        longterm_blob = record.longterm_blob
+        if longterm_blob is None:
+            longterm_blob = longterm_adapter.dump_json(record.longterm_memory or [])
+            longterm_blob = zlib.compress(longterm_blob) if compress else longterm_blob
+        shortterm_blob = record.shortterm_blob
+        if shortterm_blob is None:
+            shortterm_blob = encode_messages(record.shortterm_memory or [])
+            shortterm_blob = zlib.compress(shortterm_blob) if compress else shortterm_blob
+
+        user_id = record.user_id.encode()
+        f.write(RECORD_HEADER.pack(len(user_id), len(longterm_blob), len(shortterm_blob)))
+        f.write(user_id)
+        f.write(longterm_blob)
+        f.write(shortterm_blob)
+
+
+def convert_json_to_snapshot(json_file: Path, snapshot_file: Path, *, compress: bool = False) -> int:
+    """
+    Converts a memory json file of the simple memory plugin into a snapshot.
+
+    Args:
+        json_file (Path): The existing json memory file.
+        snapshot_file (Path): The snapshot file to create.
+        compress (bool, optional): Whether to zlib compress the records. Defaults to False.
+
+    Returns:
+        int: The number of converted users.
+    """
+    # Lazy import, the plugin module imports this one
+    from plugins_builtin.memory_simple.simple_memory import SimpleMemoryModel
+
+    memory = SimpleMemoryModel.model_validate_json(json_file.read_bytes())
+    user_ids = memory.longterm_memory.keys() | memory.shortterm_memory.keys()
+    with open_atomic(snapshot_file, fsync=True) as f:
+        write_snapshot(
+            f,
+            (
+                SnapshotRecord(
+                    user_id=user_id,
+                    longterm_memory=memory.longterm_memory.get(user_id, []),
+                    shortterm_memory=memory.shortterm_memory.get(user_id, []),
+                )
+                for user_id in sorted(user_ids)
+            ),
+            compress=compress,
+        )
+    return len(user_ids)
+
+
+def main(json_file: Path, snapshot_file: Path, *, compress: bool = False) -> None:
+    """
+    Converts a json memory file into a binary memory snapshot.
+    """
+    cnt = convert_json_to_snapshot(json_file, snapshot_file, compress=compress)
+    typer.echo(f"Converted the memory of {cnt} users into {snapshot_file}")
+
+
+if __name__ == "__main__":
+    typer.run(main)
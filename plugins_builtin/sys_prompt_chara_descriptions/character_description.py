@@ -2,19 +2,22 @@ from pydantic_settings import BaseSettings
 
 from models.context import Context
 from models.system_prompt import SystemPrompt
-from plugin_system.abc.sys_prompt import SystemPromptPlugin
+from plugin_system.abc.sys_prompt import PromptCacheScope, SystemPromptPlugin
 
 
 class CharacterDescriptionsPluginConfig(BaseSettings):
     class Config:
         extra = "allow"
+        frozen = True
 
 
 class CharacterDescriptionsPlugin(SystemPromptPlugin):
     config: CharacterDescriptionsPluginConfig
+    config_model = CharacterDescriptionsPluginConfig
+    cache_scope = PromptCacheScope.STATIC  # The descriptions only change with the config
 
     async def plugin_setup(self) -> None:
-        self.load_config(CharacterDescriptionsPluginConfig)
+        self.load_config()
 
     async def generate_system_prompts(self, ctx: Context) -> list[SystemPrompt]:  # noqa: ARG002
         prompts = []
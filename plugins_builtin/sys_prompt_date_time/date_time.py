@@ -1,12 +1,21 @@
+from __future__ import annotations
+
 import enum
 import locale
+from typing import TYPE_CHECKING
 
-import pendulum
-from pydantic_settings import BaseSettings
+from pydantic_settings import BaseSettings, SettingsConfigDict
 
 from models.context import Context
 from models.system_prompt import SystemPrompt
-from plugin_system.abc.sys_prompt import SystemPromptPlugin
+from plugin_system.abc.sys_prompt import PromptCacheScope, SystemPromptPlugin
+from utilities.lazy_import import lazy_import
+
+if TYPE_CHECKING:
+    import pendulum
+else:
+    # Only loaded once the plugin is set up, plugin discovery imports this module even if it is not used
+    pendulum = lazy_import("pendulum")
 
 
 class PartOfDay(enum.Enum):
@@ -17,6 +26,10 @@ class PartOfDay(enum.Enum):
     NIGHT = 5
 
 
+# The hours the parts of the day start at, see is_morning and the others
+PART_OF_DAY_START_HOURS = (5, 11, 13, 18, 22)
+
+
 class PartOfDayDeVal(enum.StrEnum):
     MORNING = "Morgend"
     NOON = "Mittag"
@@ -40,12 +53,14 @@ class SeasonDeVal(enum.StrEnum):
 
 
 class DateTimeConfigModel(BaseSettings):
+    model_config = SettingsConfigDict(frozen=True)
+
     locale: str | None = None  # locale code, if not set system locale is used
     # country: str = "de"
     timezone: str | None = None  # timezone string, if not set, system timezone is applied
     show_time: bool = True  # locale aware time
     show_date: bool = True  # locale aware date
-    show_year_only: bool = False  #
+    show_year_only: bool = False  # only the year instead of the whole date
     show_weekday: bool = True  # monday and so on
     show_seasson: bool = True  # spring,summer,autumn,winter
     show_part_of_the_week: bool = True  # weekend/weekday
@@ -53,33 +68,89 @@ class DateTimeConfigModel(BaseSettings):
 
 
 class DateTimePlugin(SystemPromptPlugin):
+    """
+    Tells the LLM the current date and time. The prompt is built once and reused until the next moment its content can
+    change (the next minute if the time is shown, otherwise the next part of the day, day, season, ...), so most
+    requests don't format anything and the prompt stays byte for byte the same between requests.
+    """
+
     config: DateTimeConfigModel
+    config_model = DateTimeConfigModel
+    # Nothing in the prompt is more precise than a minute, every timezone offset is a multiple of it
+    cache_scope = PromptCacheScope.TIME_BUCKET
+    cache_ttl = 60
 
     async def plugin_setup(self) -> None:
-        self.load_config(DateTimeConfigModel)
-        if not self.config.locale:
-            self.config.locale = self.get_system_locale()
-        pendulum.set_locale(self.config.locale)
+        self.load_config()
+        self.locale = self.config.locale or self.get_system_locale()
+        self.timezone = pendulum.timezone(self.config.timezone) if self.config.timezone else pendulum.local_timezone()
+        self.prompt: str | None = None
+        self.valid_until: pendulum.DateTime | None = None
 
     async def generate_system_prompts(self, ctx: Context) -> list[SystemPrompt]:  # noqa: ARG002
-        now = pendulum.now()
+        now = pendulum.now(self.timezone)
         # TODO: in the future we should check if its a holiday too but that needs some kind of api to get all the
         #       holidays in the world and a way to determin where we are.
-        # TODO: find a better solution then this if else nightmare...
+        if self.prompt is None or (self.valid_until is not None and now >= self.valid_until):
+            self.prompt = self.result_de(now) if self.locale == "de" else self.result_en(now)
+            self.valid_until = self.next_change(now)
+        return [SystemPrompt.model_construct(name="DateTime", content=self.prompt)]
+
+    def next_change(self, now: pendulum.DateTime) -> pendulum.DateTime | None:
+        """
+        Finds the next moment the prompt can change with the enabled flags.
 
-        if self.config.locale == "de":
-            return [SystemPrompt(name="DateTime", content=self.result_de(now))]
-        return [SystemPrompt(name="DateTime", content=self.result_en(now))]
+        Args:
+            now (pendulum.DateTime): The time the prompt was built for.
+
+        Returns:
+            pendulum.DateTime | None: The moment, None if the prompt never changes (everything disabled).
+        """
+        today = now.start_of("day")
+        changes = []
+        if self.config.show_time:
+            changes.append(now.start_of("minute").add(minutes=1))
+        if self.config.show_part_of_the_day:
+            starts = (today.set(hour=hour) for hour in PART_OF_DAY_START_HOURS)
+            changes.append(next((start for start in starts if start > now), today.add(days=1, hours=5)))
+        if self.config.show_weekday or (self.config.show_date and not self.config.show_year_only):
+            changes.append(today.add(days=1))
+        if self.config.show_date and self.config.show_year_only:
+            changes.append(now.start_of("year").add(years=1))
+        if self.config.show_part_of_the_week:
+            # The weekend starts on saturday (5) and ends on monday
+            days = 7 - now.day_of_week if self.is_weekend(now) else 5 - now.day_of_week
+            changes.append(today.add(days=days))
+        if self.config.show_seasson:
+            # The seasons start on the first of march, june, september and december
+            changes.append(now.start_of("month").add(months=3 - now.month % 3))
+        return min(changes, default=None)
 
     def result_en(self, now: pendulum.DateTime) -> str:
-        day_type = "weekend" if self.is_weekend(now) else "a weekday"
+        result_list = []
+        if self.config.show_weekday:
+            result_list.append(f"It's {now.format("dddd", locale="en")}.")
+        if self.config.show_part_of_the_week:
+            day_type = "It's weekend." if self.is_weekend(now) else "It's a weekday."
+            result_list.append(day_type)
+        if self.config.show_date:
+            if self.config.show_year_only:
+                result_list.append(f"It's the year {now.format('YYYY')}.")
+            else:
+                result_list.append(f"It's the {now.format('D. of MMMM YYYY', locale="en")}.")
+        if self.config.show_seasson:
+            result_list.append(f"It's {self.get_season(now).name.lower()}.")
+        if self.config.show_time:
+            result_list.append(f"It's {now.format("HH:mm")} o'clock.")
+        if self.config.show_part_of_the_day:
+            result_list.append(f"It's {self.get_part_of_the_day(now).name.lower()}.")
 
-        return f"It's {now.format('dddd, D. of MMMM YYYY')}. It's {now.format("HH:mm:ss")} o'clock. It's {day_type}"
+        return " ".join(result_list)
 
     def result_de(self, now: pendulum.DateTime) -> str:
         result_list = []
         if self.config.show_weekday:
-            result_list.append(f"Heute ist {now.format("dddd")}.")
+            result_list.append(f"Heute ist {now.format("dddd", locale="de")}.")
         if self.config.show_part_of_the_week:
             day_type = "Wir haben Wochenende." if self.is_weekend(now) else "Heute ist ein Wochentag."
             result_list.append(day_type)
@@ -87,7 +158,7 @@ class DateTimePlugin(SystemPromptPlugin):
             if self.config.show_year_only:
                 result_list.append(f"Es ist das Jahr {now.format('YYYY')}.")
             else:
-                result_list.append(f"Es ist der {now.format('D. MMMM YYYY')}.")
+                result_list.append(f"Es ist der {now.format('D. MMMM YYYY', locale="de")}.")
         if self.config.show_seasson:
             season = self.get_season(now)
             result_list.append(f"Zurzeit ist es {SeasonDeVal[season.name].value}.")
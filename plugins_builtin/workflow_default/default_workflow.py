@@ -1,23 +1,22 @@
-from copy import deepcopy
-
-from pydantic_settings import BaseSettings
+from pydantic_settings import BaseSettings, SettingsConfigDict
 
 from models.context import Context
 from plugin_system.abc.workflow import WorkflowPlugin
 
 
 class DefaultWorkflowPluginConfig(BaseSettings):
-    pass
+    model_config = SettingsConfigDict(frozen=True)
 
 
 class DefaultWorkflowPlugin(WorkflowPlugin):
     config: DefaultWorkflowPluginConfig
+    config_model = DefaultWorkflowPluginConfig
 
     async def plugin_setup(self) -> None:
-        self.load_config(DefaultWorkflowPluginConfig)
+        self.load_config()
 
-    async def start_workflow(self, ctx: Context) -> None:
-        workflow_ctx: Context = deepcopy(ctx)
+    async def start_workflow(self, ctx: Context) -> Context:
+        workflow_ctx = ctx.fork()
 
         self.logger.info("Starting default workflow")
 
@@ -34,3 +33,5 @@ class DefaultWorkflowPlugin(WorkflowPlugin):
         await self.reply(workflow_ctx)
 
         await self.add_to_shortterm_memory(workflow_ctx)
+
+        return workflow_ctx
@@ -0,0 +1,7 @@
+import pytest
+
+
+@pytest.fixture()
+def anyio_backend() -> str:
+    # Only asyncio is installed (see poetry.lock), the engine runs on it too
+    return "asyncio"
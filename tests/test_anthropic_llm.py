@@ -0,0 +1,221 @@
+# ruff: noqa: ANN201,S101,PLR2004
+from unittest.mock import AsyncMock, MagicMock
+
+import anthropic
+import anyio
+import httpx
+import pytest
+
+from models.context import Context
+from models.llm_function import LlmFnParameter, LlmFunction
+from models.message import FileModel
+from models.request import RequestMessageModel
+from plugins_builtin.llm_anthropic.anthropic_llm import AnthropicConfigModel, AnthropicLlm
+from utilities.cache import LruCache
+from utilities.rate_limiter import AdaptiveRateLimiter
+
+
+def make_llm(**config: object) -> AnthropicLlm:
+    llm = AnthropicLlm(MagicMock())
+    llm.config = AnthropicConfigModel(ANTHROPIC_API_KEY="test", **config)
+    return llm
+
+
+class WeatherPlugin:
+    def search(self, query: str) -> str:
+        return f"sunny in {query}"
+
+
+class NewsPlugin:
+    def search(self, query: str) -> str:
+        return f"nothing new in {query}"
+
+
+def search_function(plugin: object) -> LlmFunction:
+    # Same name, description and parameters, only the plugin differs
+    return LlmFunction(
+        description="Searches for something",
+        parameters=[LlmFnParameter(name="query", parameter_type="string", description="The query", required=True)],
+        fn=plugin.search,
+    )
+
+
+def test_duplicate_tool_names_do_not_depend_on_the_order():
+    weather, news = search_function(WeatherPlugin()), search_function(NewsPlugin())
+    llm = make_llm()
+
+    tools, tool_map = llm.generate_tool_list_and_map(Context(llm_functions=[weather, news]))
+    reversed_tools, reversed_map = llm.generate_tool_list_and_map(Context(llm_functions=[news, weather]))
+
+    names = [tool["name"] for tool in tools]
+    assert len(set(names)) == len(names) == len(tool_map)
+    assert all(name.startswith("search_") for name in names)
+    assert tools == reversed_tools
+    assert {name: fn.fn.__self__.__class__ for name, fn in tool_map.items()} == {
+        name: fn.fn.__self__.__class__ for name, fn in reversed_map.items()
+    }
+
+
+def test_unique_tool_names_are_kept():
+    llm = make_llm()
+    tools, tool_map = llm.generate_tool_list_and_map(Context(llm_functions=[search_function(WeatherPlugin())]))
+
+    assert [tool["name"] for tool in tools] == ["search"]
+    assert list(tool_map) == ["search"]
+
+
+def test_identical_tools_still_get_unique_names():
+    plugin = WeatherPlugin()
+    tools, tool_map = make_llm().generate_tool_list_and_map(
+        Context(llm_functions=[search_function(plugin), search_function(plugin)]),
+    )
+
+    assert len({tool["name"] for tool in tools}) == len(tool_map) == len(tools)
+
+
+def make_limited_llm(create: AsyncMock) -> AnthropicLlm:
+    llm = make_llm()
+    llm.rate_limiter = AdaptiveRateLimiter(None, 100_000, 100_000, header_prefix=None)
+    llm.client = MagicMock()
+    llm.client.messages.with_raw_response.create = create
+    return llm
+
+
+def assert_tokens_given_back(llm: AnthropicLlm) -> None:
+    assert llm.rate_limiter.buckets["input-tokens"].tokens == pytest.approx(100_000)
+    assert llm.rate_limiter.buckets["output-tokens"].tokens == pytest.approx(100_000)
+
+
+@pytest.mark.anyio()
+async def test_failed_request_gives_its_tokens_back():
+    llm = make_limited_llm(AsyncMock(side_effect=RuntimeError))
+
+    with pytest.raises(RuntimeError):
+        await llm.generate_response("model", 50_000, 0, [], [{"role": "user", "content": "Hi"}], [])
+
+    assert_tokens_given_back(llm)
+
+
+@pytest.mark.anyio()
+async def test_cancelled_request_gives_its_tokens_back():
+    async def hanging_request(**_: object) -> None:
+        await anyio.sleep_forever()
+
+    llm = make_limited_llm(AsyncMock(side_effect=hanging_request))
+
+    with anyio.move_on_after(0.01) as scope:
+        await llm.generate_response("model", 50_000, 0, [], [{"role": "user", "content": "Hi"}], [])
+
+    assert scope.cancelled_caught
+    assert_tokens_given_back(llm)
+
+
+MESSAGE = {
+    "id": "msg_1",
+    "type": "message",
+    "role": "assistant",
+    "model": "model",
+    "content": [{"type": "text", "text": "Hi"}],
+    "stop_reason": "end_turn",
+    "stop_sequence": None,
+    "usage": {"input_tokens": 10, "output_tokens": 2},
+}
+
+
+def make_retrying_llm(responses: list[httpx.Response], **config: object) -> tuple[AnthropicLlm, list[float]]:
+    """
+    An llm whose API answers with the given responses in order, also returns when the requests arrived.
+    """
+    arrived = []
+
+    def handler(request: httpx.Request) -> httpx.Response:  # noqa: ARG001
+        arrived.append(anyio.current_time())
+        return responses[len(arrived) - 1]
+
+    llm = make_llm(retry_base_delay=0, **config)
+    llm.rate_limiter = AdaptiveRateLimiter(None, None, None, header_prefix=None)
+    llm.client = anthropic.AsyncAnthropic(
+        api_key="test",
+        http_client=httpx.AsyncClient(transport=httpx.MockTransport(handler)),
+        max_retries=0,
+    )
+    return llm, arrived
+
+
+def api_error(status: int, headers: dict[str, str] | None = None) -> httpx.Response:
+    return httpx.Response(status, headers=headers, json={"type": "error", "error": {"type": "error", "message": "no"}})
+
+
+async def generate(llm: AnthropicLlm) -> anthropic.types.Message:
+    return await llm.generate_response("model", 100, 0, [], [{"role": "user", "content": "Hi"}], [])
+
+
+@pytest.mark.anyio()
+async def test_transient_errors_are_retried_after_retry_after():
+    llm, arrived = make_retrying_llm(
+        [api_error(429, {"retry-after-ms": "100"}), api_error(529), httpx.Response(200, json=MESSAGE)],
+    )
+
+    message = await generate(llm)
+
+    assert message.content[0].text == "Hi"
+    assert len(arrived) == 3
+    # The rate limit response said how long to wait, the backoff of the overloaded error is 0 in this test
+    assert arrived[1] - arrived[0] >= 0.1
+    assert arrived[2] - arrived[1] < 0.1
+
+
+@pytest.mark.anyio()
+@pytest.mark.parametrize("status", [400, 401, 404])
+async def test_client_errors_are_not_retried(status: int):
+    llm, arrived = make_retrying_llm([api_error(status), httpx.Response(200, json=MESSAGE)])
+
+    with pytest.raises(llm.ServerNotReachableError):
+        await generate(llm)
+
+    assert len(arrived) == 1
+
+
+@pytest.mark.anyio()
+async def test_retries_stop_after_max_retries():
+    llm, arrived = make_retrying_llm([api_error(500)] * 4, max_retries=2)
+
+    with pytest.raises(llm.ServerNotReachableError):
+        await generate(llm)
+
+    assert len(arrived) == 3
+
+
+@pytest.mark.anyio()
+async def test_retries_stop_at_the_deadline():
+    llm, arrived = make_retrying_llm(
+        [api_error(503, {"retry-after": "5"}), httpx.Response(200, json=MESSAGE)],
+        request_deadline=1,
+    )
+
+    with anyio.fail_after(1), pytest.raises(llm.ServerNotReachableError):
+        await generate(llm)
+
+    # Waiting for the retry-after would end after the deadline, so it gives up right away
+    assert len(arrived) == 1
+
+
+def test_caches_miss_when_an_id_is_reused():
+    llm = make_llm()
+    llm.message_cache = LruCache(16)
+    llm.image_cache = LruCache(16)
+    old_message, new_message = (RequestMessageModel(role="user", content=[text]) for text in ("old", "new"))
+    old_file, new_file = (FileModel(mimetype="image/png", data=data) for data in (b"old", b"new"))
+    # As if the old objects were freed and the new ones got their addresses
+    llm.message_cache.put((id(new_message), False), (old_message, {"role": "user", "content": "old"}))
+    llm.image_cache.put(id(new_file), (old_file, "b2xk"))
+
+    (param,) = llm.generate_message_params_from_memory(Context(shortterm_memory=[new_message]))
+    assert "new" in str(param)
+    assert "old" not in str(param)
+    assert llm.encode_image(new_file) == "bmV3"
+
+    # The replaced entries are hits now
+    assert llm.generate_message_params_from_memory(Context(shortterm_memory=[new_message]))[0] is param
+    assert llm.message_cache.get((id(new_message), False))[0] is new_message
+    assert llm.image_cache.get(id(new_file))[0] is new_file
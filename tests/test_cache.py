@@ -0,0 +1,64 @@
+# ruff: noqa: ANN201,S101
+import anyio
+import pytest
+from anthropic import types as anthropic_types
+
+from models.llm_function import LlmFunction
+from plugins_builtin.llm_anthropic.tool_executor import ToolExecutor
+from utilities.cache import LruCache, TtlCache
+
+
+def test_lru_cache_evicts_least_recently_used():
+    cache = LruCache[str, int](max_size=2)
+    cache.put("a", 1)
+    cache.put("b", 2)
+    assert cache.get("a") == 1
+
+    cache.put("c", 3)
+
+    assert "a" in cache
+    assert "b" not in cache
+    assert len(cache) == cache.max_size
+
+
+def test_lru_cache_counts_hits_and_misses():
+    cache = LruCache[str, int](max_size=2)
+    cache.put("a", 1)
+    cache.get("a")
+    cache.get("b")
+
+    assert (cache.hits, cache.misses) == (1, 1)
+
+
+def test_ttl_cache_expires_entries():
+    cache = TtlCache[str, int](max_size=2, ttl=60)
+    cache.put("a", 1)
+    cache.put("b", 2, ttl=0)
+
+    assert cache.get("a") == 1
+    assert cache.get("b") is None
+    assert len(cache) == 1
+
+
+@pytest.mark.anyio()
+async def test_identical_tool_calls_run_once():
+    calls = []
+
+    async def weather(city: str) -> str:
+        calls.append(city)
+        await anyio.sleep(0.05)
+        return f"Sunny in {city}"
+
+    llm_fn = LlmFunction(description="Weather", parameters=[], fn=weather, cache_ttl=60, cache_scope="global")
+    tool_uses = [
+        anthropic_types.ToolUseBlock(id=str(i), name="weather", input={"city": "Berlin"}, type="tool_use")
+        for i in range(3)
+    ]
+    executor = ToolExecutor(max_parallel=4, timeout=1)
+
+    results = await executor.run_all(tool_uses, {"weather": llm_fn}, "user")
+    results += await executor.run_all(tool_uses[:1], {"weather": llm_fn}, "other user")
+
+    assert calls == ["Berlin"]
+    assert [result["tool_use_id"] for result in results] == ["0", "1", "2", "0"]
+    assert all(result["content"][0]["text"] == "Sunny in Berlin" for result in results)
@@ -0,0 +1,53 @@
+# ruff: noqa: ANN201,S101,PLR2004
+import pytest
+from pydantic import Field
+from pydantic_settings import BaseSettings, SettingsConfigDict
+
+from models.character import CharacterModel, PluginModel
+from plugin_system.config_compiler import ConfigCompiler, PluginConfigError
+
+
+class FirstConfig(BaseSettings):
+    model_config = SettingsConfigDict(frozen=True)
+
+    count: int = 1
+
+
+class SecondConfig(BaseSettings):
+    model_config = SettingsConfigDict(env_prefix="SECOND_")
+
+    enabled: bool = True
+    user: str | None = Field(None, alias="SECOND_PLUGIN_USER")
+
+
+class FirstPlugin:
+    config_model = FirstConfig
+
+
+class SecondPlugin:
+    config_model = SecondConfig
+
+
+class NoConfigPlugin:
+    pass
+
+
+def character(first: dict | None, second: dict | None) -> CharacterModel:
+    return CharacterModel(
+        name="Test",
+        author="Test",
+        plugins=[PluginModel(name="FirstPlugin", config=first), PluginModel(name="SecondPlugin", config=second)],
+    )
+
+
+def test_compile():
+    compiled = ConfigCompiler().compile(character({"count": 3}, None), [FirstPlugin, SecondPlugin, NoConfigPlugin])
+    assert compiled["FirstPlugin"].count == 3
+    assert compiled["SecondPlugin"].enabled is True
+    assert "NoConfigPlugin" not in compiled
+
+
+def test_compile_reports_all_errors():
+    with pytest.raises(PluginConfigError) as e:
+        ConfigCompiler().compile(character({"count": "many"}, {"enabled": "maybe"}), [FirstPlugin, SecondPlugin])
+    assert set(e.value.errors) == {"FirstPlugin", "SecondPlugin"}
@@ -0,0 +1,119 @@
+# ruff: noqa: ANN201,S101
+from unittest.mock import MagicMock
+
+import pendulum
+import pytest
+
+from models.context import Context
+from plugins_builtin.sys_prompt_date_time.date_time import DateTimeConfigModel, DateTimePlugin
+
+BERLIN = "Europe/Berlin"
+NOTHING = {
+    "show_time": False,
+    "show_date": False,
+    "show_weekday": False,
+    "show_seasson": False,
+    "show_part_of_the_week": False,
+    "show_part_of_the_day": False,
+}
+
+
+class FrozenClock:
+    """
+    Replaces pendulum.now, the plugin asks for the time in its own timezone.
+    """
+
+    def __init__(self, now: pendulum.DateTime) -> None:
+        self.now = now
+
+    def __call__(self, tz: object = None) -> pendulum.DateTime:
+        return self.now.in_timezone(tz) if tz else self.now
+
+
+@pytest.fixture()
+def clock(monkeypatch: pytest.MonkeyPatch) -> FrozenClock:
+    clock = FrozenClock(pendulum.datetime(2024, 5, 15, 10, 41, 30, tz=BERLIN))
+    monkeypatch.setattr(pendulum, "now", clock)
+    return clock
+
+
+async def make_plugin(timezone: str = BERLIN, **flags: bool) -> DateTimePlugin:
+    pm = MagicMock()
+    pm.get_compiled_config.return_value = DateTimeConfigModel(locale="en", timezone=timezone, **(NOTHING | flags))
+    plugin = DateTimePlugin(pm)
+    await plugin.plugin_setup()
+    return plugin
+
+
+async def prompt(plugin: DateTimePlugin) -> str:
+    prompts = await plugin.generate_system_prompts(Context(user_id="user"))
+    return prompts[0].content
+
+
+def berlin(*args: int) -> pendulum.DateTime:
+    return pendulum.datetime(*args, tz=BERLIN)
+
+
+@pytest.mark.parametrize(
+    ("flags", "now", "expected"),
+    [
+        # The minute
+        ({"show_time": True}, berlin(2024, 5, 15, 10, 41, 30), berlin(2024, 5, 15, 10, 42)),
+        # The clocks skip from 02:00 to 03:00
+        ({"show_time": True}, berlin(2024, 3, 31, 1, 59, 30), berlin(2024, 3, 31, 3)),
+        # The parts of the day, the night lasts until the next morning
+        ({"show_part_of_the_day": True}, berlin(2024, 5, 15, 10, 41), berlin(2024, 5, 15, 11)),
+        ({"show_part_of_the_day": True}, berlin(2024, 5, 15, 3), berlin(2024, 5, 15, 5)),
+        ({"show_part_of_the_day": True}, berlin(2024, 5, 15, 23, 10), berlin(2024, 5, 16, 5)),
+        # From a wednesday to the weekend and from a saturday to monday
+        ({"show_part_of_the_week": True}, berlin(2024, 5, 15, 12), berlin(2024, 5, 18)),
+        ({"show_part_of_the_week": True}, berlin(2024, 5, 18, 12), berlin(2024, 5, 20)),
+        # The seasons, winter lasts into the next year
+        ({"show_seasson": True}, berlin(2024, 5, 15), berlin(2024, 6, 1)),
+        ({"show_seasson": True}, berlin(2024, 12, 24), berlin(2025, 3, 1)),
+        ({"show_seasson": True}, berlin(2025, 1, 10), berlin(2025, 3, 1)),
+        # The date and only the year
+        ({"show_date": True}, berlin(2024, 12, 31, 23, 59), berlin(2025, 1, 1)),
+        ({"show_date": True, "show_year_only": True}, berlin(2024, 5, 15), berlin(2025, 1, 1)),
+        # The earliest change wins
+        ({"show_seasson": True, "show_part_of_the_week": True}, berlin(2024, 5, 30), berlin(2024, 6, 1)),
+        # Nothing can change
+        ({}, berlin(2024, 5, 15), None),
+    ],
+)
+@pytest.mark.anyio()
+async def test_next_change(flags: dict[str, bool], now: pendulum.DateTime, expected: pendulum.DateTime | None):
+    plugin = await make_plugin(**flags)
+
+    assert plugin.next_change(now) == expected
+
+
+@pytest.mark.anyio()
+async def test_prompt_is_rebuilt_at_the_next_change(clock: FrozenClock):
+    plugin = await make_plugin(show_seasson=True)
+    clock.now = berlin(2024, 5, 31, 23, 59)
+
+    assert await prompt(plugin) == "It's spring."
+    assert plugin.valid_until == berlin(2024, 6, 1)
+
+    clock.now = plugin.valid_until.subtract(microseconds=1)
+    assert await prompt(plugin) == "It's spring."
+
+    clock.now = berlin(2024, 6, 1)
+    assert await prompt(plugin) == "It's summer."
+    assert plugin.valid_until == berlin(2024, 9, 1)
+
+
+@pytest.mark.anyio()
+async def test_prompt_uses_the_configured_timezone(clock: FrozenClock):
+    plugin = await make_plugin("Asia/Tokyo", show_time=True, show_part_of_the_week=True)
+    # Still friday afternoon in UTC but already saturday in Tokyo
+    clock.now = pendulum.datetime(2024, 5, 17, 15, 30, tz="UTC")
+
+    assert await prompt(plugin) == "It's weekend. It's 00:30 o'clock."
+    assert plugin.valid_until == pendulum.datetime(2024, 5, 17, 15, 31, tz="UTC")
+
+    plugin = await make_plugin("Asia/Tokyo", show_part_of_the_week=True)
+    assert await prompt(plugin) == "It's weekend."
+    # Monday starts on sunday afternoon in UTC
+    assert plugin.valid_until == pendulum.datetime(2024, 5, 19, 15, tz="UTC")
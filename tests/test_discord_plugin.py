@@ -0,0 +1,82 @@
+# ruff: noqa: ANN201,S101,PLR2004
+from types import SimpleNamespace
+from unittest.mock import AsyncMock, MagicMock
+
+import anyio
+import httpx
+import pytest
+
+from plugins_builtin.channel_discord.discord_plugin import DiscordPlugin, DiscordPluginConfig
+from utilities import cache
+from utilities.cache import TtlCache
+
+
+def attachment(name: str, content_type: str = "image/png", size: int = 10) -> SimpleNamespace:
+    return SimpleNamespace(url=f"https://cdn.example/{name}", content_type=content_type, size=size)
+
+
+def make_plugin(handler: object, **config: object) -> DiscordPlugin:
+    plugin = DiscordPlugin(MagicMock())
+    plugin.config = DiscordPluginConfig(DISCORD_API_TOKEN="test", **config)  # noqa: S106 Not a real token
+    plugin.http_client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+    return plugin
+
+
+@pytest.mark.anyio()
+async def test_attachments_are_downloaded_concurrently():
+    running = 0
+    most_running = 0
+
+    async def cdn(request: httpx.Request) -> httpx.Response:
+        nonlocal running, most_running
+        running += 1
+        most_running = max(most_running, running)
+        name = request.url.path.strip("/")
+        # The first attachments take the longest, the files still have to be in order
+        await anyio.sleep(0.05 / int(name[-1]))
+        running -= 1
+        if name == "broken3":
+            return httpx.Response(404)
+        # A malformed content-length only loses the buffer hint
+        return httpx.Response(200, headers={"content-length": "many"}, content=name.encode())
+
+    plugin = make_plugin(cdn, max_parallel_downloads=2)
+    attachments = [
+        attachment("file1"),
+        attachment("text1", content_type="text/plain"),
+        attachment("file2"),
+        attachment("broken3"),
+        attachment("file4"),
+        attachment("huge5", size=10 * 2**20),
+    ]
+
+    files = await plugin.download_attachments(attachments)
+
+    assert [bytes(file.data) for file in files] == [b"file1", b"file2", b"file4"]
+    assert most_running == 2
+
+
+@pytest.mark.anyio()
+async def test_dm_channels_are_cached_until_they_expire_or_are_invalidated(monkeypatch: pytest.MonkeyPatch):
+    now = 0.0
+    monkeypatch.setattr(cache, "time", SimpleNamespace(monotonic=lambda: now))
+    user = MagicMock(fetch_dm=AsyncMock(return_value="dm"))
+    plugin = DiscordPlugin(MagicMock())
+    plugin.client = MagicMock(fetch_user=AsyncMock(return_value=user))
+    plugin.users = TtlCache(10, 60)
+    plugin.dm_channels = TtlCache(10, 60)
+
+    assert await plugin.get_dm_channel("1") == "dm"
+    now = 59.0
+    assert await plugin.get_dm_channel("1") == "dm"
+    assert plugin.client.fetch_user.await_count == 1
+    assert user.fetch_dm.await_count == 1
+
+    now = 60.0
+    await plugin.get_dm_channel("1")
+    assert plugin.client.fetch_user.await_count == 2
+
+    plugin.invalidate_user("1")
+    await plugin.get_dm_channel("1")
+    assert plugin.client.fetch_user.await_count == 3
+    assert user.fetch_dm.await_count == 3
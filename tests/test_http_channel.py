@@ -0,0 +1,71 @@
+# ruff: noqa: ANN201,S101,PLR2004
+import json
+from pathlib import Path
+
+import anyio
+import pytest
+
+from models.character import CharacterModel, PluginModel
+from plugin_system.plugin_manager import PluginManager
+from utilities.http_server import HttpRequest
+
+# Replaces the request like the Anthropic plugin does when it resizes images
+REQUEST_COPYING_LLM = """
+from models.context import Context
+from models.response import ResponseMessageModel
+from plugin_system.abc.llm import LlmPlugin
+
+
+class RequestCopyingLlmPlugin(LlmPlugin):
+    async def plugin_setup(self) -> None:
+        pass
+
+    async def get_llm_response(self, ctx: Context) -> None:
+        ctx.request = ctx.request.model_copy(update={"content": [c.upper() for c in ctx.request.content]})
+        ctx.response = ResponseMessageModel.model_construct(role="llm", content=ctx.request.content)
+
+
+PluginMainClass = RequestCopyingLlmPlugin
+"""
+
+
+@pytest.mark.anyio()
+async def test_replies_are_found_when_the_workflow_replaces_the_request(tmp_path: Path):
+    package = tmp_path / "test_request_copying_llm"
+    package.mkdir()
+    (package / "__init__.py").write_text(REQUEST_COPYING_LLM)
+    character = CharacterModel(
+        name="Test",
+        author="Test",
+        plugins=[
+            PluginModel(name="HttpChannelPlugin", config={"port": 0}),
+            PluginModel(name="RequestCopyingLlmPlugin", config=None),
+            PluginModel(name="DefaultWorkflowPlugin", config=None),
+        ],
+    )
+
+    async with anyio.create_task_group() as tg:
+        pm = await PluginManager(character, task_group=tg, plugin_dirs=[tmp_path]).init()
+        channel = next(p for p in pm.call("listen").plugin_list if p.__class__.__name__ == "HttpChannelPlugin")
+
+        body = json.dumps({"user_id": "user", "content": ["hello"]}).encode()
+        with anyio.fail_after(5):
+            response = await channel.handle(HttpRequest("POST", "/v1/messages", "HTTP/1.1", {}, body))
+        reply = json.loads(response.body)
+
+        streamed = await channel.handle(
+            HttpRequest("POST", "/v1/messages", "HTTP/1.1", {}, body.replace(b"}", b', "stream": true}')),
+        )
+        with anyio.fail_after(5):
+            events = [json.loads(line) async for line in streamed.stream]
+
+        await pm.shutdown()
+        tg.cancel_scope.cancel()
+
+    assert response.status == 200
+    assert reply["content"] == ["HELLO"]
+    assert [event["type"] for event in events] == ["status", "response", "done"]
+    assert events[1]["content"] == ["HELLO"]
+    assert reply["request_id"]
+    assert events[2]["request_id"]
+    assert not channel.pending
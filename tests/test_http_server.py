@@ -0,0 +1,109 @@
+# ruff: noqa: ANN201,S101,PLR2004
+import anyio
+import pytest
+
+from utilities.http_server import HttpRequest, HttpResponse, HttpServer
+
+
+async def echo(request: HttpRequest) -> HttpResponse:
+    return HttpResponse(200, request.method.encode() + b" " + request.path.encode() + b" " + request.body)
+
+
+@pytest.mark.anyio()
+async def test_pipelined_requests_are_answered_in_order():
+    async with anyio.create_task_group() as tg:
+        port = await tg.start(HttpServer(echo).serve)
+        async with await anyio.connect_tcp("127.0.0.1", port) as stream:
+            await stream.send(
+                b"POST /a HTTP/1.1\r\nContent-Length: 3\r\n\r\none"
+                b"POST /b HTTP/1.1\r\nTransfer-Encoding: chunked\r\n\r\n3 ;ext=1\r\ntwo\r\n0\r\n\r\n"
+                b"GET /c HTTP/1.1\r\nConnection: close\r\n\r\n",
+            )
+            data = b""
+            with anyio.fail_after(1):
+                async for chunk in stream:
+                    data += chunk
+        tg.cancel_scope.cancel()
+
+    assert data.count(b"HTTP/1.1 200 OK") == 3
+    assert data.index(b"POST /a one") < data.index(b"POST /b two") < data.index(b"GET /c ")
+    assert data.endswith(b"connection: close\r\ncontent-length: 7\r\n\r\nGET /c ")
+
+
+@pytest.mark.anyio()
+async def test_pipelined_requests_are_handled_concurrently():
+    running = 0
+    most_running = 0
+
+    async def slow(request: HttpRequest) -> HttpResponse:
+        nonlocal running, most_running
+        running += 1
+        most_running = max(most_running, running)
+        # The first request takes the longest, the responses still have to be in order
+        await anyio.sleep(0.1 / int(request.path[1:]))
+        running -= 1
+        return HttpResponse(200, request.path.encode())
+
+    async with anyio.create_task_group() as tg:
+        port = await tg.start(HttpServer(slow, max_pipelined=3).serve)
+        async with await anyio.connect_tcp("127.0.0.1", port) as stream:
+            await stream.send(
+                b"GET /1 HTTP/1.1\r\n\r\nGET /2 HTTP/1.1\r\n\r\nGET /3 HTTP/1.1\r\nConnection: close\r\n\r\n",
+            )
+            data = b""
+            with anyio.fail_after(1):
+                async for chunk in stream:
+                    data += chunk
+        tg.cancel_scope.cancel()
+
+    assert most_running == 3
+    assert data.index(b"\r\n\r\n/1") < data.index(b"\r\n\r\n/2") < data.index(b"\r\n\r\n/3")
+
+
+@pytest.mark.anyio()
+@pytest.mark.parametrize(
+    "head",
+    [
+        b"Content-Length: -5",
+        b"Content-Length: +5",
+        b"Content-Length: 5_0",
+        b"Content-Length: five",
+        b"Transfer-Encoding: chunked\r\nContent-Length: 5",
+        b"Content-Length: 5\r\nTransfer-Encoding: chunked",
+    ],
+)
+async def test_ambiguous_body_length_is_rejected(head: bytes):
+    async with anyio.create_task_group() as tg:
+        port = await tg.start(HttpServer(echo).serve)
+        async with await anyio.connect_tcp("127.0.0.1", port) as stream:
+            # Without the check the rest would be read as a second request
+            await stream.send(b"POST /a HTTP/1.1\r\n" + head + b"\r\n\r\n0\r\n\r\nGET /smuggled HTTP/1.1\r\n\r\n")
+            data = b""
+            with anyio.fail_after(1):
+                async for chunk in stream:
+                    data += chunk
+        tg.cancel_scope.cancel()
+
+    assert data.startswith(b"HTTP/1.1 400 Bad Request")
+    assert data.count(b"HTTP/1.1") == 1
+
+
+@pytest.mark.anyio()
+@pytest.mark.parametrize("chunk_size", [b"+3", b"-3", b"0x3", b" 3", b"3 ", b"0_3", b""])
+async def test_malformed_chunk_size_is_rejected(chunk_size: bytes):
+    async with anyio.create_task_group() as tg:
+        port = await tg.start(HttpServer(echo).serve)
+        async with await anyio.connect_tcp("127.0.0.1", port) as stream:
+            await stream.send(
+                b"POST /a HTTP/1.1\r\nTransfer-Encoding: chunked\r\n\r\n"
+                + chunk_size
+                + b"\r\nabc\r\n0\r\n\r\nGET /smuggled HTTP/1.1\r\n\r\n",
+            )
+            data = b""
+            with anyio.fail_after(1):
+                async for chunk in stream:
+                    data += chunk
+        tg.cancel_scope.cancel()
+
+    assert data.startswith(b"HTTP/1.1 400 Bad Request")
+    assert data.count(b"HTTP/1.1") == 1
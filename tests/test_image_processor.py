@@ -0,0 +1,75 @@
+# ruff: noqa: ANN201,S101,PLR2004
+import io
+
+import pytest
+
+from models.message import FileModel
+from plugins_builtin.llm_anthropic.image_processor import ImageProcessor
+
+Image = pytest.importorskip("PIL.Image")
+
+EXIF_ORIENTATION = 0x0112
+ROTATED_90 = 6  # The camera was turned, the image has to be rotated by 90 degrees to be upright
+
+
+def encode(image: "Image.Image", image_format: str, **params: object) -> bytes:
+    out = io.BytesIO()
+    image.save(out, format=image_format, **params)
+    return out.getvalue()
+
+
+def decode(file: FileModel) -> "Image.Image":
+    return Image.open(io.BytesIO(file.data))
+
+
+@pytest.mark.anyio()
+async def test_big_images_are_downscaled_and_reencoded():
+    processor = ImageProcessor(max_dimension=400)
+    transparent = Image.new("RGBA", (1200, 600), (255, 0, 0, 0))
+    file = FileModel(mimetype="image/png", data=encode(transparent, "PNG"))
+
+    processed = await processor.process(file)
+
+    assert processed.mimetype == "image/jpeg"
+    image = decode(processed)
+    assert (image.format, image.size, image.mode) == ("JPEG", (400, 200), "RGB")
+    # Transparent pixels end up white, not black
+    assert image.getpixel((200, 100)) > (250, 250, 250)
+
+
+@pytest.mark.anyio()
+async def test_orientation_is_applied_before_downscaling():
+    processor = ImageProcessor(max_dimension=400, output_format="webp")
+    sideways = Image.new("RGB", (800, 400), "blue")
+    exif = Image.Exif()
+    exif[EXIF_ORIENTATION] = ROTATED_90
+    file = FileModel(mimetype="image/jpeg", data=encode(sideways, "JPEG", exif=exif))
+
+    processed = await processor.process(file)
+
+    assert processed.mimetype == "image/webp"
+    assert decode(processed).size == (200, 400)
+
+
+@pytest.mark.anyio()
+async def test_images_that_would_grow_are_kept():
+    processor = ImageProcessor(max_dimension=400, quality=100)
+    noise = Image.effect_noise((100, 100), 64).convert("RGB")
+    file = FileModel(mimetype="image/jpeg", data=encode(noise, "JPEG", quality=10))
+
+    assert await processor.process(file) is file
+
+
+@pytest.mark.anyio()
+async def test_other_and_broken_files_are_passed_through_and_results_cached():
+    processor = ImageProcessor(max_dimension=400)
+    gif = FileModel(mimetype="image/gif", data=encode(Image.new("P", (800, 800)), "GIF"))
+    broken = FileModel(mimetype="image/png", data=b"not a png")
+    big = FileModel(mimetype="image/png", data=encode(Image.new("RGB", (800, 800), "white"), "PNG"))
+
+    content = await processor.process_content(["Look", gif, broken, big])
+    again = await processor.process(FileModel(mimetype="image/png", data=bytes(big.data)))
+
+    assert content[:3] == ["Look", gif, broken]
+    assert content[3] is not big
+    assert again is content[3]
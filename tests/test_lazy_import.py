@@ -0,0 +1,43 @@
+# ruff: noqa: ANN201,S101
+import sys
+from collections.abc import Iterator
+from pathlib import Path
+
+import pytest
+
+from utilities.lazy_import import lazy_import
+
+NAME = "test_lazily_imported_package"
+
+
+@pytest.fixture()
+def package(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> Iterator[Path]:
+    # The package leaves a file behind when it is executed
+    (tmp_path / NAME).mkdir()
+    (tmp_path / NAME / "__init__.py").write_text(
+        "from pathlib import Path\n(Path(__file__).parent / 'executed').touch()\nVALUE = 42\n",
+    )
+    monkeypatch.syspath_prepend(str(tmp_path))
+    yield tmp_path / NAME
+    sys.modules.pop(NAME, None)
+
+
+def test_package_is_executed_on_the_first_attribute_access(package: Path):
+    module = lazy_import(NAME)
+
+    assert not (package / "executed").exists()
+    assert module.VALUE == 42  # noqa: PLR2004
+    assert (package / "executed").exists()
+    assert sys.modules[NAME] is module
+
+
+@pytest.mark.usefixtures("package")
+def test_imported_package_is_returned_as_it_is():
+    module = __import__(NAME)
+
+    assert lazy_import(NAME) is module
+
+
+def test_missing_package_raises():
+    with pytest.raises(ModuleNotFoundError):
+        lazy_import("test_package_that_does_not_exist")
@@ -0,0 +1,67 @@
+# ruff: noqa: ANN201,S101
+import json
+import logging
+
+import pytest
+
+from utilities.logging import (
+    BackgroundQueueHandler,
+    ContextFilter,
+    JsonFormatter,
+    LoggingConfig,
+    SamplingFilter,
+    configure_logging,
+    log_context,
+    stop_background_logging,
+)
+
+
+def make_record(name: str = "test", level: int = logging.INFO, msg: str = "hello %s", args: tuple = ("world",)):
+    return logging.LogRecord(name, level, __file__, 1, msg, args, None)
+
+
+def test_json_contains_context():
+    record = make_record()
+    with log_context(request_id="abc", user_id="42"):
+        ContextFilter().filter(record)
+    data = json.loads(JsonFormatter().format(record))
+    assert data["message"] == "hello world"
+    assert data["request_id"] == "abc"
+    assert data["user_id"] == "42"
+
+
+def test_context_is_reset():
+    with log_context(request_id="abc"):
+        pass
+    record = make_record()
+    ContextFilter().filter(record)
+    assert record.request_id is None
+
+
+def test_sampling_keeps_warnings():
+    sampling = SamplingFilter({"chatty": 0.0})
+    assert not sampling.filter(make_record("chatty.child"))
+    assert sampling.filter(make_record("chatty", logging.WARNING))
+    assert sampling.filter(make_record("other"))
+
+
+def test_background_writes_everything(capsys: pytest.CaptureFixture):
+    root = logging.getLogger()
+    handlers, level = root.handlers[:], root.level
+    try:
+        configure_logging(LoggingConfig(format="json", levels={"quiet": "ERROR"}))
+        assert any(isinstance(h, BackgroundQueueHandler) for h in root.handlers)
+        with log_context(request_id="abc"):
+            logging.getLogger("loud").info("message %d", 1)
+            logging.getLogger("quiet").info("dropped")
+        stop_background_logging()
+        logging.getLogger("loud").info("after stop")
+        lines = [json.loads(line) for line in capsys.readouterr().err.splitlines()]
+        assert [(line["message"], line["request_id"]) for line in lines] == [("message 1", "abc"), ("after stop", None)]
+    finally:
+        for h in root.handlers[:]:
+            root.removeHandler(h)
+        for h in handlers:
+            root.addHandler(h)
+        root.setLevel(level)
+        logging.getLogger("quiet").setLevel(logging.NOTSET)
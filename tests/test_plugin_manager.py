@@ -1,9 +1,12 @@
 # ruff: noqa: ANN201,S101
 import sys
-from unittest.mock import MagicMock
+from pathlib import Path
 
-from models.character import CharacterModel
-from plugin_system.plugin_manager import PluginManager
+import anyio
+import pytest
+
+from models.character import CharacterModel, PluginModel
+from plugin_system.plugin_manager import PluginManager, PluginSetupError
 
 
 def test_add_to_sys_path():
@@ -14,3 +17,55 @@ def test_add_to_sys_path():
         assert sys.path[0] == path
 
     assert sys.path == sys_path_before
+
+
+PLUGIN_TEMPLATE = """
+from plugin_system.abc.emitter import EmitterPlugin
+
+teardowns = []
+
+
+class {name}(EmitterPlugin):
+    async def plugin_setup(self) -> None:
+        if {fail}:
+            raise RuntimeError("no connection")
+
+    async def plugin_teardown(self) -> None:
+        teardowns.append(self)
+
+    async def emit(self, ctx) -> None:
+        pass
+
+    async def update_status(self, ctx) -> None:
+        pass
+
+
+PluginMainClass = {name}
+"""
+
+
+def write_plugin(plugin_dir: Path, name: str, *, fail: bool) -> None:
+    package = plugin_dir / f"test_{name.lower()}"
+    package.mkdir()
+    (package / "__init__.py").write_text(PLUGIN_TEMPLATE.format(name=name, fail=fail))
+
+
+@pytest.mark.anyio()
+async def test_failed_plugin_setup_aborts_the_startup(tmp_path: Path):
+    write_plugin(tmp_path, "SetupFailsPlugin", fail=True)
+    write_plugin(tmp_path, "SetupWorksPlugin", fail=False)
+    character = CharacterModel(
+        name="Test",
+        author="Test",
+        plugins=[PluginModel(name="SetupFailsPlugin", config={}), PluginModel(name="SetupWorksPlugin", config={})],
+    )
+
+    async with anyio.create_task_group() as tg:
+        pm = PluginManager(character, task_group=tg, plugin_dirs=[tmp_path])
+        with pytest.raises(PluginSetupError, match="SetupFailsPlugin: RuntimeError") as error:
+            await pm.init()
+
+    assert list(error.value.errors) == ["SetupFailsPlugin"]
+    # Only the plugin that was set up is torn down again
+    assert [p.__class__.__name__ for p in sys.modules["test_setupworksplugin"].teardowns] == ["SetupWorksPlugin"]
+    assert sys.modules["test_setupfailsplugin"].teardowns == []
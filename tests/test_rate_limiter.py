@@ -0,0 +1,35 @@
+# ruff: noqa: ANN201,S101
+import anyio
+import pytest
+
+from utilities.rate_limiter import AdaptiveRateLimiter
+
+
+@pytest.mark.anyio()
+async def test_waiting_requests_are_served_by_priority_then_fifo():
+    limiter = AdaptiveRateLimiter(requests_per_minute=1200)
+    limiter.buckets["requests"].tokens = 0
+    order = []
+
+    async def request(name: str, priority: int) -> None:
+        await limiter.acquire(0, 0, priority)
+        order.append(name)
+
+    async with anyio.create_task_group() as tg:
+        for name, priority in (("first", 1), ("second", 1), ("low", 0), ("high", 2)):
+            tg.start_soon(request, name, priority)
+            await anyio.sleep(0.001)
+
+    assert order == ["high", "first", "second", "low"]
+
+
+def test_rate_limited_halves_the_rate_and_success_recovers():
+    limiter = AdaptiveRateLimiter()
+    headers = {"anthropic-ratelimit-requests-limit": "100", "anthropic-ratelimit-requests-remaining": "0"}
+    limiter.on_rate_limited(headers)
+    bucket = limiter.buckets["requests"]
+    assert (bucket.limit, bucket.rate) == (100, 50)
+
+    limiter.on_success({})
+
+    assert bucket.rate == 55  # noqa: PLR2004
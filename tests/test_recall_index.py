@@ -0,0 +1,47 @@
+# ruff: noqa: ANN201,S101
+from models.system_prompt import SystemPrompt
+from plugins_builtin.memory_simple.recall_index import Bm25Index, RecallIndex
+
+
+def test_bm25_ranks_matching_documents_first():
+    index = Bm25Index()
+    index.add(0, "The user likes apples and wine")
+    index.add(1, "The user has a dog called Rex")
+    index.add(2, "We talked about the weather")
+
+    results = index.search("what is the name of my dog?", top_k=2)
+
+    assert results[0][0] == 1
+    assert index.search("cats", top_k=2) == []
+
+
+def test_bm25_remove_document():
+    index = Bm25Index()
+    index.add(0, "apples")
+    index.add(1, "apples and pears")
+    index.remove(1)
+
+    assert index.search("pears", top_k=5) == []
+    assert len(index) == 1
+
+
+def test_recall_respects_budget_and_keeps_order():
+    memories = [
+        SystemPrompt(name="ConversationMemory", content="The user likes apples. " * 20),
+        SystemPrompt(name="ConversationMemory", content="The user went to Yoitsu with apples."),
+        SystemPrompt(name="ConversationMemory", content="The user bought apples at the market."),
+    ]
+    recall = RecallIndex()
+    recall.rebuild("u", memories)
+
+    selected = recall.recall("u", "apples", memories, top_k=3, token_budget=40)
+
+    assert selected == [memories[1], memories[2]]
+
+
+def test_recall_falls_back_to_recent_memories():
+    memories = [SystemPrompt(name="ConversationMemory", content=f"memory {i}") for i in range(5)]
+    recall = RecallIndex()
+    recall.rebuild("u", memories)
+
+    assert recall.recall("u", "", memories, top_k=2, token_budget=100) == memories[3:]
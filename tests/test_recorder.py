@@ -0,0 +1,47 @@
+# ruff: noqa: ANN201,S101
+import gzip
+
+import pytest
+
+from models.context import Context
+from models.message import FileModel
+from models.request import RequestMessageModel
+from models.response import ResponseMessageModel
+from plugin_system.recorder import TrafficRecorder, read_recording
+
+
+def make_context(text: str, file: FileModel | None = None, user_id: str = "user") -> Context:
+    content = [text, file] if file else [text]
+    return Context(request=RequestMessageModel(role="user", content=content), user_id=user_id)
+
+
+@pytest.mark.anyio()
+async def test_recording_round_trip(tmp_path):  # noqa: ANN001
+    path = tmp_path / "recording.jsonl.gz"
+    image = FileModel(mimetype="image/png", data=memoryview(b"\x89PNG image"))
+    recorder = TrafficRecorder(path)
+
+    first = make_context("Look at this", image)
+    answered = first.fork()
+    answered.response = ResponseMessageModel(role="llm", content=["A picture"])
+    await recorder.record("TestReceiver", first, answered, recorder.clock())
+    await recorder.record("TestReceiver", make_context("Again", image, "other"), None, recorder.clock())
+    await recorder.close()
+
+    records = read_recording(path)
+    assert [r.request.content[0] for r in records] == ["Look at this", "Again"]
+    assert [r.user_id for r in records] == ["user", "other"]
+    assert records[0].response.content == ["A picture"]
+    assert records[1].response is None
+    assert records[0].request.content[1].data == b"\x89PNG image"
+    # The attachment is stored once and shared by both requests
+    assert records[0].request.content[1] is records[1].request.content[1]
+    assert len(recorder.stored_files) == 1
+
+
+def test_not_a_recording(tmp_path):  # noqa: ANN001
+    path = tmp_path / "other.jsonl.gz"
+    with gzip.open(path, "wt") as f:
+        f.write('{"something": "else"}\n')
+    with pytest.raises(ValueError, match="is no recording"):
+        read_recording(path)
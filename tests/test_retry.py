@@ -0,0 +1,19 @@
+# ruff: noqa: ANN201,S101,PLR2004
+from email.utils import formatdate
+
+import pytest
+
+from utilities.retry import backoff_delay, parse_retry_after
+
+
+def test_parse_retry_after():
+    assert parse_retry_after({"retry-after-ms": "250", "retry-after": "3"}) == 0.25
+    assert parse_retry_after({"retry-after": "3"}) == 3
+    assert parse_retry_after({"retry-after": formatdate(0, usegmt=True)}) == 0
+    assert parse_retry_after({"retry-after": "soon"}) is None
+    assert parse_retry_after({}) is None
+
+
+@pytest.mark.parametrize("attempt", range(6))
+def test_backoff_delay_is_capped(attempt: int):
+    assert 0 <= backoff_delay(attempt, base_delay=0.5, max_delay=4) <= min(4, 0.5 * 2**attempt)
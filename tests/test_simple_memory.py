@@ -0,0 +1,145 @@
+# ruff: noqa: ANN201,S101,PLR2004
+from collections.abc import Callable
+from pathlib import Path
+from unittest.mock import AsyncMock, MagicMock
+
+import pytest
+
+from models.context import Context
+from models.message import FileModel, MessageModel
+from models.request import RequestMessageModel
+from models.response import ResponseMessageModel
+from plugins_builtin.memory_simple.recall_index import RecallIndex
+from plugins_builtin.memory_simple.simple_memory import SimpleMemoryModel, SimpleMemoryPlugin, SimpleMemoryPluginConfig
+
+
+class FakeLlmCall:
+    """
+    Stands in for pm.call("get_llm_response", ctx=...).first(), before_answer runs while the "LLM" is working.
+    """
+
+    def __init__(self, summary: str, before_answer: Callable[[], object] | None = None) -> None:
+        self.summary = summary
+        self.before_answer = before_answer
+        self.prompts: list[str] = []
+
+    def __call__(self, fn_name: str, ctx: Context) -> MagicMock:  # noqa: ARG002
+        async def first() -> None:
+            self.prompts.append(ctx.request.content[0])
+            if self.before_answer:
+                self.before_answer()
+            ctx.response = ResponseMessageModel(role="llm", content=[self.summary])
+
+        return MagicMock(first=first)
+
+
+def make_memory(llm: FakeLlmCall | None = None, **config: object) -> SimpleMemoryPlugin:
+    pm = MagicMock()
+    pm.call = llm or FakeLlmCall("summary")
+    plugin = SimpleMemoryPlugin(pm)
+    plugin.config = SimpleMemoryPluginConfig(**config)
+    plugin.snapshot = None
+    plugin.memory = SimpleMemoryModel()
+    plugin.recall_index = RecallIndex()
+    plugin.persistence = MagicMock(mark_dirty=AsyncMock())
+    return plugin
+
+
+def conversation(turns: int) -> list[MessageModel]:
+    history = []
+    for i in range(turns):
+        history.append(RequestMessageModel(role="user", content=[f"question {i}"]))
+        history.append(ResponseMessageModel(role="llm", content=[f"answer {i}"]))
+    return history
+
+
+def test_condensable_count_keeps_request_and_response_together():
+    memory = make_memory(condense_after=6, condense_keep=3)
+    history = conversation(5)
+
+    # Keeping 3 messages would start the rest with an answer, one more message is kept instead
+    assert memory.condensable_count(history) == 6
+    assert history[6].role == "user"
+    assert memory.condensable_count(history[:6]) == 0
+    assert make_memory(condense_after=None).condensable_count(history) == 0
+
+
+@pytest.mark.anyio()
+async def test_condensation_moves_old_messages_to_longterm_memory():
+    llm = FakeLlmCall("They talked about questions.")
+    memory = make_memory(llm, condense_after=6, condense_keep=4)
+    history = conversation(5)
+    memory.memory.shortterm_memory["user"] = list(history)
+
+    created = await memory.save_to_longterm_memory(Context(user_id="user"))
+
+    assert [m.content for m in created] == ["They talked about questions."]
+    assert memory.memory.longterm_memory["user"] == created
+    assert memory.memory.shortterm_memory["user"] == history[6:]
+    assert "User: question 0\nCharacter: answer 0" in llm.prompts[0]
+    assert "question 3" not in llm.prompts[0]
+    memory.persistence.mark_dirty.assert_awaited_once_with("user")
+
+
+@pytest.mark.anyio()
+async def test_messages_added_while_condensing_are_kept():
+    memory = make_memory(condense_after=6, condense_keep=4)
+    history = conversation(5)
+    memory.memory.shortterm_memory["user"] = history
+    new_turn = conversation(1)
+    memory.pm.call.before_answer = lambda: history.extend(new_turn)
+
+    await memory.save_to_longterm_memory(Context(user_id="user"))
+
+    assert memory.memory.shortterm_memory["user"] == history[6:]
+    assert memory.memory.shortterm_memory["user"][-2:] == new_turn
+
+
+@pytest.mark.anyio()
+async def test_summary_is_dropped_if_the_history_changed_while_condensing():
+    memory = make_memory(condense_after=6, condense_keep=4)
+    history = conversation(5)
+    memory.memory.shortterm_memory["user"] = history
+    replaced = conversation(5)
+    memory.pm.call.before_answer = lambda: memory.memory.shortterm_memory.update(user=replaced)
+
+    created = await memory.save_to_longterm_memory(Context(user_id="user"))
+
+    assert created == []
+    assert memory.memory.shortterm_memory["user"] is replaced
+    assert "user" not in memory.memory.longterm_memory
+    memory.persistence.mark_dirty.assert_not_awaited()
+
+
+@pytest.mark.anyio()
+@pytest.mark.parametrize("memory_format", ["json", "binary"])
+async def test_memory_with_an_attachment_is_saved(tmp_path: Path, memory_format: str):
+    memory_file = tmp_path / f"memory.{memory_format}"
+    memory = make_memory(memory_file=str(memory_file), memory_format=memory_format)
+    # Channels pass attachments as read-only views of their download buffer
+    attachment = FileModel(mimetype="text/plain", data=memoryview(bytearray(b"some notes")).toreadonly())
+    memory.memory.shortterm_memory["user"] = [RequestMessageModel(role="user", content=["Look at this", attachment])]
+
+    await memory.save_to_file()
+
+    reloaded = make_memory(memory_file=str(memory_file), memory_format=memory_format)
+    reloaded.memory = await reloaded.load_from_file()
+    text, file = reloaded.user_shortterm_memory("user")[0].content
+    assert text == "Look at this"
+    assert file.mimetype == "text/plain"
+    assert file.data == b"some notes"
+    if reloaded.snapshot:
+        reloaded.snapshot.close()
+    if memory.snapshot:
+        memory.snapshot.close()
+
+
+def test_file_data_is_a_memoryview_in_python_and_bytes_in_json():
+    view = memoryview(bytearray(b"some notes")).toreadonly()
+    attachment = FileModel(mimetype="text/plain", data=view)
+    assert attachment.data is view
+
+    loaded = FileModel.model_validate_json(attachment.model_dump_json())
+    assert type(loaded.data) is bytes
+    assert loaded == FileModel(mimetype="text/plain", data=b"some notes")
+    assert FileModel.model_json_schema()["properties"]["data"]["format"] == "binary"
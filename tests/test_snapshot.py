@@ -0,0 +1,87 @@
+# ruff: noqa: ANN001,ANN201,S101
+import pytest
+
+from models.message import FileModel, MessageModel
+from models.system_prompt import SystemPrompt
+from plugins_builtin.memory_simple.simple_memory import SimpleMemoryModel
+from plugins_builtin.memory_simple.snapshot import (
+    SnapshotFormatError,
+    SnapshotReader,
+    SnapshotRecord,
+    convert_json_to_snapshot,
+    write_snapshot,
+)
+
+MESSAGES = [
+    MessageModel(role="user", content=[FileModel(mimetype="image/png", data=b"\x89PNG\x00\xff"), "Look, äpfel!"]),
+    MessageModel(role="llm", content=["Apples!"]),
+]
+LONGTERM = [SystemPrompt(name="ConversationMemory", content=[SystemPrompt(name="Fact", content="Likes apples")])]
+
+
+@pytest.mark.parametrize("compress", [True, False])
+def test_snapshot_roundtrip(tmp_path, compress):
+    path = tmp_path / "memory.wsm"
+    with path.open("wb") as f:
+        write_snapshot(
+            f,
+            [
+                SnapshotRecord(user_id="1", longterm_memory=LONGTERM, shortterm_memory=MESSAGES),
+                SnapshotRecord(user_id="2"),
+            ],
+            compress=compress,
+        )
+
+    reader = SnapshotReader(path)
+
+    assert reader.compressed == compress
+    assert set(reader.records) == {"1", "2"}
+    assert reader.longterm_memory("1") == LONGTERM
+    assert reader.shortterm_memory("1") == MESSAGES
+    assert reader.shortterm_memory("2") == []
+    reader.close()
+
+
+def test_snapshot_raw_records_are_copied(tmp_path):
+    first = tmp_path / "first.wsm"
+    with first.open("wb") as f:
+        write_snapshot(f, [SnapshotRecord(user_id="1", shortterm_memory=MESSAGES)], compress=False)
+    reader = SnapshotReader(first)
+
+    second = tmp_path / "second.wsm"
+    with second.open("wb") as f:
+        record = SnapshotRecord(
+            user_id="1",
+            longterm_blob=reader.raw_longterm("1"),
+            shortterm_blob=reader.raw_shortterm("1"),
+        )
+        write_snapshot(f, [record], compress=False)
+        del record
+
+    assert second.read_bytes() == first.read_bytes()
+    reader.close()
+
+
+def test_snapshot_rejects_other_files(tmp_path):
+    path = tmp_path / "memory.json"
+    path.write_text('{"longterm_memory": {}}')
+
+    with pytest.raises(SnapshotFormatError):
+        SnapshotReader(path)
+
+
+def test_convert_json_to_snapshot(tmp_path):
+    json_file = tmp_path / "memory.json"
+    # The json format can only hold file data that happens to be valid utf-8
+    messages = [MessageModel(role="user", content=[FileModel(mimetype="text/plain", data=b"apples"), "Look!"])]
+    memory = SimpleMemoryModel(longterm_memory={"1": LONGTERM}, shortterm_memory={"1": messages, "2": MESSAGES[1:]})
+    json_file.write_text(memory.model_dump_json())
+    snapshot_file = tmp_path / "memory.wsm"
+
+    assert convert_json_to_snapshot(json_file, snapshot_file, compress=True) == len(memory.shortterm_memory)
+
+    reader = SnapshotReader(snapshot_file)
+    assert reader.shortterm_memory("1") == messages
+    assert reader.shortterm_memory("2") == MESSAGES[1:]
+    assert reader.longterm_memory("2") == []
+    reader.close()
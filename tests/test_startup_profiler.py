@@ -0,0 +1,47 @@
+# ruff: noqa: ANN201,S101
+import sys
+import time
+from pathlib import Path
+
+import pytest
+
+from utilities.startup_profiler import StartupProfiler
+
+
+def test_phases_and_marks_are_recorded():
+    profiler = StartupProfiler()
+
+    with profiler.phase("config load"):
+        time.sleep(0.01)
+    with pytest.raises(RuntimeError), profiler.phase("plugin setup"):
+        # A phase that fails is recorded too
+        raise RuntimeError
+    assert profiler.mark("first receiver ready")
+    assert not profiler.mark("first receiver ready")
+
+    assert [phase.name for phase in profiler.phases] == ["config load", "plugin setup"]
+    assert profiler.phases[0].duration >= 0.01  # noqa: PLR2004
+    assert profiler.phases[1].start >= profiler.phases[0].start + profiler.phases[0].duration
+    assert list(profiler.marks) == ["first receiver ready"]
+    report = profiler.report()
+    assert "config load" in report
+    assert "plugin setup" in report
+    assert "first receiver ready" in report
+    assert "imports" not in report
+
+
+def test_imports_are_timed(tmp_path: Path, monkeypatch: pytest.MonkeyPatch):
+    (tmp_path / "test_timed_module.py").write_text("import time\ntime.sleep(0.01)\n")
+    monkeypatch.syspath_prepend(str(tmp_path))
+    profiler = StartupProfiler()
+
+    profiler.enable_import_timing()
+    try:
+        import test_timed_module  # noqa: F401
+    finally:
+        profiler.import_timer.uninstall()
+        sys.modules.pop("test_timed_module", None)
+
+    (timed,) = (t for t in profiler.import_timer.times if t.name == "test_timed_module")
+    assert timed.own >= 0.01  # noqa: PLR2004
+    assert "test_timed_module" in profiler.report()
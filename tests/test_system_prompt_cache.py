@@ -0,0 +1,136 @@
+# ruff: noqa: ANN201,S101,PLR2004
+from collections.abc import Hashable
+from unittest.mock import MagicMock
+
+import pytest
+
+from models.context import Context
+from models.system_prompt import SystemPrompt
+from plugin_system.abc import workflow
+from plugin_system.abc.sys_prompt import PromptCacheScope, SystemPromptPlugin
+from plugin_system.abc.workflow import WorkflowPlugin
+
+
+class SimpleWorkflow(WorkflowPlugin):
+    async def plugin_setup(self) -> None:
+        pass
+
+    async def start_workflow(self, ctx: Context) -> None:
+        pass
+
+
+class CountingPlugin(SystemPromptPlugin):
+    version = 1
+
+    def __init__(self) -> None:
+        super().__init__(MagicMock())
+        self.calls = 0
+
+    async def plugin_setup(self) -> None:
+        pass
+
+    async def generate_system_prompts(self, ctx: Context) -> list[SystemPrompt]:  # noqa: ARG002
+        self.calls += 1
+        return [SystemPrompt(name="Count", content=str(self.calls))]
+
+    def cache_key(self, ctx: Context) -> Hashable:  # noqa: ARG002
+        return self.version
+
+
+class StaticPlugin(CountingPlugin):
+    cache_scope = PromptCacheScope.STATIC
+
+
+class UserPlugin(CountingPlugin):
+    cache_scope = PromptCacheScope.USER
+
+
+class MinutePlugin(CountingPlugin):
+    cache_scope = PromptCacheScope.TIME_BUCKET
+    cache_ttl = 60
+
+
+@pytest.fixture()
+def flow():
+    return SimpleWorkflow(MagicMock())
+
+
+@pytest.mark.anyio()
+async def test_request_scope_is_never_cached(flow: SimpleWorkflow):
+    plugin = CountingPlugin()
+    ctx = Context(user_id="user")
+
+    await flow.generate_system_prompts_of(plugin, ctx)
+    await flow.generate_system_prompts_of(plugin, ctx)
+
+    assert plugin.calls == 2
+
+
+@pytest.mark.anyio()
+async def test_static_scope_is_cached_until_the_key_changes(flow: SimpleWorkflow):
+    plugin = StaticPlugin()
+
+    for user_id in ("a", "b"):
+        await flow.generate_system_prompts_of(plugin, Context(user_id=user_id))
+    assert plugin.calls == 1
+
+    plugin.version = 2
+    await flow.generate_system_prompts_of(plugin, Context(user_id="a"))
+    assert plugin.calls == 2
+
+
+@pytest.mark.anyio()
+async def test_user_scope_is_cached_per_user(flow: SimpleWorkflow):
+    plugin = UserPlugin()
+
+    for user_id in ("a", "b", "a"):
+        await flow.generate_system_prompts_of(plugin, Context(user_id=user_id))
+
+    assert plugin.calls == 2
+
+
+@pytest.mark.anyio()
+async def test_time_bucket_scope_changes_with_the_clock(flow: SimpleWorkflow, monkeypatch: pytest.MonkeyPatch):
+    plugin = MinutePlugin()
+    ctx = Context(user_id="user")
+    now = 119.0
+    monkeypatch.setattr(workflow, "time", MagicMock(time=lambda: now))
+    ttls = []
+    put = flow.system_prompt_cache.put
+
+    def recording_put(key: object, value: object, ttl: float) -> None:
+        ttls.append(ttl)
+        put(key, value, ttl)
+
+    monkeypatch.setattr(flow.system_prompt_cache, "put", recording_put)
+
+    await flow.generate_system_prompts_of(plugin, ctx)
+    now = 119.9
+    await flow.generate_system_prompts_of(plugin, ctx)
+    assert plugin.calls == 1
+    # The entry only lives until the end of its bucket
+    assert ttls == [pytest.approx(1.0)]
+
+    now = 120.0
+    await flow.generate_system_prompts_of(plugin, ctx)
+    assert plugin.calls == 2
+    assert ttls[-1] == pytest.approx(60.0)
+
+
+@pytest.mark.anyio()
+async def test_time_bucket_without_ttl_is_not_cached(flow: SimpleWorkflow):
+    plugin = MinutePlugin()
+    plugin.cache_ttl = None
+    ctx = Context(user_id="user")
+
+    await flow.generate_system_prompts_of(plugin, ctx)
+    await flow.generate_system_prompts_of(plugin, ctx)
+
+    assert plugin.calls == 2
+
+
+def test_time_bucket_without_ttl_is_rejected():
+    with pytest.raises(TypeError, match="needs a cache_ttl"):
+
+        class ForeverPlugin(CountingPlugin):
+            cache_scope = PromptCacheScope.TIME_BUCKET
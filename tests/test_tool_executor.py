@@ -0,0 +1,98 @@
+# ruff: noqa: ANN201,S101,PLR2004
+import time
+
+import anyio
+import pytest
+from anthropic.types import ToolUseBlock
+
+from models.llm_function import LlmFunction
+from plugins_builtin.llm_anthropic.tool_executor import ToolExecutor
+
+
+def tool_use(name: str, tool_id: str, **tool_input: object) -> ToolUseBlock:
+    return ToolUseBlock(id=tool_id, name=name, input=tool_input, type="tool_use")
+
+
+def llm_function(fn: object, cache_ttl: float | None = None) -> LlmFunction:
+    return LlmFunction(description="A tool", parameters=[], fn=fn, cache_ttl=cache_ttl)
+
+
+def text(result: dict) -> str:
+    return result["content"][0]["text"]
+
+
+@pytest.mark.anyio()
+async def test_tools_run_concurrently():
+    async def slow(seconds: float) -> str:
+        await anyio.sleep(seconds)
+        return f"slept {seconds}"
+
+    executor = ToolExecutor(max_parallel=4, timeout=5)
+    started = time.perf_counter()
+    results = await executor.run_all(
+        [tool_use("slow", "1", seconds=0.3), tool_use("slow", "2", seconds=0.2)],
+        {"slow": llm_function(slow)},
+    )
+    elapsed = time.perf_counter() - started
+
+    # About the slowest tool, not the sum of both
+    assert elapsed < 0.45
+    assert [result["tool_use_id"] for result in results] == ["1", "2"]
+    assert [text(result) for result in results] == ["slept 0.3", "slept 0.2"]
+
+
+@pytest.mark.anyio()
+async def test_timeouts_and_failures_become_error_results():
+    async def hanging() -> str:
+        await anyio.sleep_forever()
+
+    def broken() -> str:
+        msg = "boom"
+        raise RuntimeError(msg)
+
+    async def working() -> str:
+        return "fine"
+
+    executor = ToolExecutor(max_parallel=4, timeout=0.05)
+    with anyio.fail_after(1):
+        results = await executor.run_all(
+            [tool_use("hanging", "1"), tool_use("broken", "2"), tool_use("working", "3"), tool_use("missing", "4")],
+            {"hanging": llm_function(hanging), "broken": llm_function(broken), "working": llm_function(working)},
+        )
+
+    assert [result.get("is_error", False) for result in results] == [True, True, False, True]
+    assert text(results[0]) == "The tool did not respond in time"
+    assert text(results[1]) == "The tool failed"
+    assert text(results[2]) == "fine"
+    assert text(results[3]) == "There is no tool called missing"
+
+
+@pytest.mark.anyio()
+async def test_identical_calls_run_once():
+    calls = 0
+
+    async def weather(city: str) -> str:
+        nonlocal calls
+        calls += 1
+        await anyio.sleep(0.05)
+        return f"sunny in {city}"
+
+    executor = ToolExecutor(max_parallel=4, timeout=5)
+    tools = {"weather": llm_function(weather, cache_ttl=60)}
+    # The second call comes in while the first one is running, the third one is a different call
+    results = await executor.run_all(
+        [
+            tool_use("weather", "1", city="Rome"),
+            tool_use("weather", "2", city="Rome"),
+            tool_use("weather", "3", city="Oslo"),
+        ],
+        tools,
+    )
+    assert calls == 2
+    assert [text(result) for result in results] == ["sunny in Rome", "sunny in Rome", "sunny in Oslo"]
+
+    # Finished calls are reused from the cache
+    (cached,) = await executor.run_all([tool_use("weather", "4", city="Rome")], tools)
+    assert calls == 2
+    assert text(cached) == "sunny in Rome"
+    assert not executor.pending
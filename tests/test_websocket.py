@@ -0,0 +1,49 @@
+# ruff: noqa: ANN201,S101
+import os
+import struct
+
+import anyio
+import pytest
+from anyio.streams.buffered import BufferedByteReceiveStream
+
+from utilities.http_server import HttpRequest, HttpResponse, HttpServer
+from utilities.websocket import OPCODE_CLOSE, OPCODE_TEXT, WebSocket, unmask, websocket_response
+
+
+async def echo(websocket: WebSocket) -> None:
+    while True:
+        await websocket.send(await websocket.receive())
+
+
+async def handler(request: HttpRequest) -> HttpResponse:
+    return websocket_response(request, echo)
+
+
+def client_frame(opcode: int, payload: bytes) -> bytes:
+    mask = os.urandom(4)
+    return struct.pack("!BB", 0x80 | opcode, 0x80 | len(payload)) + mask + unmask(payload, mask)
+
+
+@pytest.mark.anyio()
+async def test_websocket_echo():
+    async with anyio.create_task_group() as tg:
+        port = await tg.start(HttpServer(handler).serve)
+        async with await anyio.connect_tcp("127.0.0.1", port) as stream:
+            receiver = BufferedByteReceiveStream(stream)
+            await stream.send(
+                b"GET /ws HTTP/1.1\r\nUpgrade: websocket\r\nConnection: Upgrade\r\n"
+                b"Sec-WebSocket-Key: dGhlIHNhbXBsZSBub25jZQ==\r\nSec-WebSocket-Version: 13\r\n\r\n",
+            )
+            with anyio.fail_after(1):
+                headers = await receiver.receive_until(b"\r\n\r\n", 4096)
+                await stream.send(client_frame(OPCODE_TEXT, "Hallo Welt ✓".encode()))
+                echoed = await receiver.receive_exactly(2 + len("Hallo Welt ✓".encode()))
+                await stream.send(client_frame(OPCODE_CLOSE, struct.pack("!H", 1000)))
+                closed = await receiver.receive_exactly(4)
+        tg.cancel_scope.cancel()
+
+    assert headers.startswith(b"HTTP/1.1 101 Switching Protocols")
+    # The accept key of the example in RFC 6455
+    assert b"sec-websocket-accept: s3pPLMBiTxaQ9kYGzzhZRbK+xOo=" in headers
+    assert echoed == bytes([0x80 | OPCODE_TEXT, len("Hallo Welt ✓".encode())]) + "Hallo Welt ✓".encode()
+    assert closed == bytes([0x80 | OPCODE_CLOSE, 2]) + struct.pack("!H", 1000)
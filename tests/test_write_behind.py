@@ -0,0 +1,101 @@
+# ruff: noqa: ANN201,S101,PLR2004
+import anyio
+import pytest
+
+from utilities.write_behind import Durability, WriteBehindError, WriteBehindQueue, write_file_atomic
+
+
+class FlushRecorder:
+    def __init__(self) -> None:
+        self.batches: list[tuple[set[str], bool]] = []
+
+    async def __call__(self, keys: set[str], *, fsync: bool) -> None:
+        self.batches.append((keys, fsync))
+
+
+@pytest.mark.anyio()
+async def test_changes_are_grouped_into_one_flush():
+    recorder = FlushRecorder()
+    queue = WriteBehindQueue(recorder, flush_interval=0.05, flush_max_changes=100)
+    async with anyio.create_task_group() as tg:
+        tg.start_soon(queue.run)
+        for user in ("a", "b", "a", "c"):
+            await queue.mark_dirty(user)
+        assert recorder.batches == []
+        await anyio.sleep(0.1)
+        await queue.close()
+
+    assert recorder.batches == [({"a", "b", "c"}, True)]
+
+
+@pytest.mark.anyio()
+async def test_max_changes_triggers_early_flush():
+    recorder = FlushRecorder()
+    queue = WriteBehindQueue(recorder, flush_interval=10, flush_max_changes=2, durability=Durability.NONE)
+    async with anyio.create_task_group() as tg:
+        tg.start_soon(queue.run)
+        await queue.mark_dirty("a")
+        await queue.mark_dirty("b")
+        with anyio.fail_after(1):
+            while not recorder.batches:
+                await anyio.sleep(0.01)
+        await queue.close()
+
+    assert recorder.batches == [({"a", "b"}, False)]
+
+
+@pytest.mark.anyio()
+async def test_write_durability_flushes_every_change():
+    recorder = FlushRecorder()
+    queue = WriteBehindQueue(recorder, durability=Durability.WRITE)
+    await queue.mark_dirty("a")
+    await queue.mark_dirty("b")
+
+    assert recorder.batches == [({"a"}, True), ({"b"}, True)]
+
+
+@pytest.mark.anyio()
+async def test_failed_flush_keeps_keys_dirty():
+    async def failing_flush(keys: set[str], *, fsync: bool) -> None:  # noqa: ARG001
+        raise OSError
+
+    queue = WriteBehindQueue(failing_flush)
+    await queue.mark_dirty("a")
+    with pytest.raises(OSError):  # noqa: PT011
+        await queue.flush()
+
+    assert queue.pending == 1
+
+
+def test_write_file_atomic(tmp_path):  # noqa: ANN001
+    path = tmp_path / "memory.json"
+    write_file_atomic(path, b"{}", fsync=True)
+    write_file_atomic(path, b'{"a": 1}', fsync=False)
+
+    assert path.read_bytes() == b'{"a": 1}'
+    assert list(tmp_path.iterdir()) == [path]
+
+
+@pytest.mark.anyio()
+async def test_queue_gives_up_after_max_retries():
+    attempts = 0
+
+    async def failing_flush(keys: set[str], *, fsync: bool) -> None:  # noqa: ARG001
+        nonlocal attempts
+        attempts += 1
+        raise OSError
+
+    queue = WriteBehindQueue(failing_flush, flush_interval=0.001, max_retries=2)
+    async with anyio.create_task_group() as tg:
+        tg.start_soon(queue.run)
+        await queue.mark_dirty("a")
+        with anyio.fail_after(1):
+            while queue.error is None:
+                await anyio.sleep(0.01)
+
+    assert attempts == 3
+    with pytest.raises(WriteBehindError):
+        await queue.mark_dirty("b")
+    with pytest.raises(WriteBehindError):
+        await queue.close()
+    assert queue.pending == 2
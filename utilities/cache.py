@@ -0,0 +1,97 @@
+import math
+import time
+from collections import OrderedDict
+from collections.abc import Hashable
+
+
+class LruCache[K: Hashable, V]:
+    """
+    A small bounded mapping that evicts the least recently used entry once it is full.
+
+    Attributes:
+        max_size (int): The max number of entries.
+        hits (int): Number of get calls that found an entry.
+        misses (int): Number of get calls that found nothing.
+    """
+
+    def __init__(self, max_size: int) -> None:
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        self._entries: OrderedDict[K, V] = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __contains__(self, key: K) -> bool:
+        return key in self._entries
+
+    def get(self, key: K, default: V | None = None) -> V | None:
+        try:
+            value = self._entries[key]
+        except KeyError:
+            self.misses += 1
+            return default
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def put(self, key: K, value: V) -> None:
+        self._entries[key] = value
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+    def pop(self, key: K, default: V | None = None) -> V | None:
+        return self._entries.pop(key, default)
+
+    def clear(self) -> None:
+        self._entries.clear()
+
+
+class TtlCache[K: Hashable, V]:
+    """
+    A bounded LRU mapping whose entries expire after a time to live.
+
+    Attributes:
+        ttl (float | None): The default time to live in seconds, None keeps entries until they get evicted.
+    """
+
+    def __init__(self, max_size: int, ttl: float | None = None) -> None:
+        self.ttl = ttl
+        self._entries: LruCache[K, tuple[float, V]] = LruCache(max_size)
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, key: K, default: V | None = None) -> V | None:
+        entry = self._entries.get(key)
+        if entry is None:
+            return default
+        expires_at, value = entry
+        if expires_at <= time.monotonic():
+            self._entries.pop(key)
+            return default
+        return value
+
+    def put(self, key: K, value: V, ttl: float | None = None) -> None:
+        """
+        Adds or replaces an entry.
+
+        Args:
+            key (K): The key.
+            value (V): The value.
+            ttl (float | None, optional): Time to live of this entry in seconds. Defaults to the ttl of the cache.
+
+        Returns:
+            None
+        """
+        ttl = self.ttl if ttl is None else ttl
+        self._entries.put(key, (math.inf if ttl is None else time.monotonic() + ttl, value))
+
+    def pop(self, key: K, default: V | None = None) -> V | None:
+        entry = self._entries.pop(key)
+        return default if entry is None else entry[1]
+
+    def clear(self) -> None:
+        self._entries.clear()
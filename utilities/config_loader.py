@@ -4,8 +4,11 @@ import yaml
 
 from models.character import CharacterModel
 
+# The C implementation of libyaml is a lot faster, PyYAML is not always built with it
+SafeLoader = getattr(yaml, "CSafeLoader", yaml.SafeLoader)
+
 
 def load_character_config(path: Path) -> CharacterModel:
     with path.open("r") as f:
-        config = yaml.safe_load(f)
+        config = yaml.load(f, Loader=SafeLoader)  # noqa: S506 It is a safe loader
         return CharacterModel(**config)
@@ -0,0 +1,401 @@
+"""
+A small HTTP/1.1 server on top of anyio, good enough for local tools (e.g. the fake Anthropic API of the benchmarks)
+and simple channels. It supports keep-alive, pipelined requests (optionally handled concurrently), chunked request
+bodies, streamed (chunked) responses and connection upgrades (see utilities/websocket.py). There is no TLS, put a
+reverse proxy in front of it if it has to be reachable from the internet.
+"""
+
+import json
+import string
+from collections.abc import AsyncIterable, Awaitable, Callable
+from http import HTTPStatus
+from typing import Any
+from urllib.parse import parse_qsl, unquote
+
+import anyio
+from anyio.abc import SocketAttribute, SocketStream, TaskGroup, TaskStatus
+from anyio.streams.buffered import BufferedByteReceiveStream
+
+from utilities.logging import get_logger
+
+# The only characters of a chunk size
+HEX_DIGITS = frozenset(string.hexdigits.encode())
+
+
+def reason_phrase(status: int) -> str:
+    try:
+        return HTTPStatus(status).phrase
+    except ValueError:
+        # Non standard codes like the 529 of some APIs
+        return "Unknown"
+
+
+class HttpError(Exception):
+    """
+    Raise it in a handler to answer with an error status.
+    """
+
+    def __init__(self, status: int, message: str | None = None, headers: dict[str, str] | None = None) -> None:
+        self.status = status
+        self.message = message or reason_phrase(status)
+        self.headers = headers or {}
+        super().__init__(self.message)
+
+
+class HttpRequest:
+    """
+    A parsed request, the header names are lower case.
+    """
+
+    def __init__(self, method: str, target: str, version: str, headers: dict[str, str], body: bytes) -> None:
+        self.method = method
+        self.target = target
+        self.version = version
+        self.headers = headers
+        self.body = body
+        path, _, query = target.partition("?")
+        self.path = unquote(path)
+        self.query = dict(parse_qsl(query))
+
+    @property
+    def keep_alive(self) -> bool:
+        connection = self.headers.get("connection", "").lower()
+        if self.version == "HTTP/1.0":
+            return connection == "keep-alive"
+        return connection != "close"
+
+    def json(self) -> Any:  # noqa: ANN401
+        try:
+            return json.loads(self.body)
+        except ValueError as e:
+            raise HttpError(400, "The body is not valid json") from e
+
+
+# Takes over the connection after a 101 response, it gets the stream and the buffered receive side of it
+Upgrade = Callable[[SocketStream, BufferedByteReceiveStream], Awaitable[None]]
+
+
+class HttpResponse:
+    """
+    A response, either with a body or with a stream of body chunks that are sent with chunked transfer encoding. A
+    response with upgrade is sent as is (status 101) and the connection is handed to upgrade.
+    """
+
+    def __init__(
+        self,
+        status: int = 200,
+        body: bytes = b"",
+        headers: dict[str, str] | None = None,
+        *,
+        stream: AsyncIterable[bytes] | None = None,
+        upgrade: Upgrade | None = None,
+    ) -> None:
+        self.status = status
+        self.body = body
+        self.headers = {name.lower(): value for name, value in (headers or {}).items()}
+        self.stream = stream
+        self.upgrade = upgrade
+
+    @classmethod
+    def json(
+        cls: type["HttpResponse"],
+        data: Any,  # noqa: ANN401
+        status: int = 200,
+        headers: dict[str, str] | None = None,
+    ) -> "HttpResponse":
+        return cls(status, json.dumps(data).encode(), {"content-type": "application/json", **(headers or {})})
+
+
+Handler = Callable[[HttpRequest], Awaitable[HttpResponse]]
+
+
+class PendingResponse:
+    """
+    A pipelined request whose handler is running, see HttpServer.handle_pipelined.
+    """
+
+    def __init__(self, request: HttpRequest | None, response: HttpResponse | None = None) -> None:
+        self.request = request  # None if the request could not be parsed, the response is the error
+        self.response = response
+        self.done = anyio.Event()
+        if response is not None:
+            self.done.set()
+
+    async def run(self, handler: Handler) -> None:
+        try:
+            self.response = await handler(self.request)
+        finally:
+            self.done.set()
+
+
+class HttpServer:
+    """
+    Serves every connection in its own task. By default the requests of one connection are handled one after another,
+    with max_pipelined > 1 up to that many pipelined requests of a connection are handled at the same time. Responses
+    are always sent in the order of the requests.
+    """
+
+    def __init__(  # noqa: PLR0913
+        self,
+        handler: Handler,
+        host: str = "127.0.0.1",
+        port: int = 0,
+        *,
+        max_header_size: int = 64 * 2**10,
+        max_body_size: int = 10 * 2**20,
+        keepalive_timeout: float = 15,
+        max_pipelined: int = 1,
+    ) -> None:
+        """
+        Initializes a HttpServer object.
+
+        Args:
+            handler (Handler): Called with every request, returns the response.
+            host (str, optional): The address to listen on. Defaults to "127.0.0.1".
+            port (int, optional): The port to listen on, 0 picks a free one. Defaults to 0.
+            max_header_size (int, optional): Max size of the request line and headers. Defaults to 64 KiB.
+            max_body_size (int, optional): Max size of a request body. Defaults to 10 MiB.
+            keepalive_timeout (float, optional): Seconds an idle connection is kept open, also the time a client has
+                to send a whole request. Defaults to 15.
+            max_pipelined (int, optional): Max requests of one connection that are handled at the same time. Defaults
+                to 1.
+
+        Returns:
+            None
+        """
+        self.logger = get_logger(__name__)
+        self.handler = handler
+        self.host = host
+        self.port = port
+        self.max_header_size = max_header_size
+        self.max_body_size = max_body_size
+        self.keepalive_timeout = keepalive_timeout
+        self.max_pipelined = max_pipelined
+
+    async def serve(self, *, task_status: TaskStatus[int] = anyio.TASK_STATUS_IGNORED) -> None:
+        """
+        Listens until cancelled. Start it with task_group.start to get the port once the server is listening.
+        """
+        listener = await anyio.create_tcp_listener(local_host=self.host, local_port=self.port)
+        async with listener:
+            self.port = listener.extra(SocketAttribute.local_port)  # noqa: S610 Not Django
+            self.logger.info("Listening on http://%s:%s", self.host, self.port)
+            task_status.started(self.port)
+            await listener.serve(self.handle_connection)
+
+    async def handle_connection(self, stream: SocketStream) -> None:
+        async with stream:
+            receiver = BufferedByteReceiveStream(stream)
+            if self.max_pipelined > 1:
+                await self.handle_pipelined(stream, receiver)
+                return
+            while True:
+                request = await self.receive_request(receiver)
+                if request is None:
+                    return
+                if isinstance(request, HttpError):
+                    await self.send_response(stream, receiver, None, self.error_response(request))
+                    return
+                response = await self.call_handler(request)
+                if not await self.send_response(stream, receiver, request, response):
+                    return
+
+    async def handle_pipelined(self, stream: SocketStream, receiver: BufferedByteReceiveStream) -> None:
+        """
+        Reads the requests of a connection ahead and starts their handlers right away, while the responses are sent in
+        order. Reading pauses while max_pipelined responses are waiting to be sent.
+        """
+        send_pending, receive_pending = anyio.create_memory_object_stream[PendingResponse](self.max_pipelined - 1)
+
+        async def read(tg: TaskGroup) -> None:
+            async with send_pending:
+                while True:
+                    request = await self.receive_request(receiver)
+                    if request is None:
+                        return
+                    if isinstance(request, HttpError):
+                        await send_pending.send(PendingResponse(None, self.error_response(request)))
+                        return
+                    pending = PendingResponse(request)
+                    tg.start_soon(pending.run, self.call_handler)
+                    await send_pending.send(pending)
+                    # Nothing after an upgrade is a request, and after a close there should be nothing at all
+                    if not request.keep_alive or "upgrade" in request.headers:
+                        return
+
+        async with anyio.create_task_group() as tg:
+            tg.start_soon(read, tg)
+            async with receive_pending:
+                async for pending in receive_pending:
+                    await pending.done.wait()
+                    if not await self.send_response(stream, receiver, pending.request, pending.response):
+                        break
+            tg.cancel_scope.cancel()
+
+    async def receive_request(self, receiver: BufferedByteReceiveStream) -> HttpRequest | HttpError | None:
+        """
+        Reads the next request, waiting at most keepalive_timeout.
+
+        Returns:
+            HttpRequest | HttpError | None: The request, the error to answer with if it is malformed (the connection
+                has to be closed after it, we don't know where the next request would start) or None if the client
+                closed the connection or was idle for too long.
+        """
+        try:
+            with anyio.move_on_after(self.keepalive_timeout):
+                return await self.read_request(receiver)
+        except HttpError as e:
+            return e
+        except (anyio.EndOfStream, anyio.IncompleteRead, anyio.BrokenResourceError, anyio.ClosedResourceError):
+            return None
+        return None
+
+    async def send_response(
+        self,
+        stream: SocketStream,
+        receiver: BufferedByteReceiveStream,
+        request: HttpRequest | None,
+        response: HttpResponse,
+    ) -> bool:
+        """
+        Sends the response or hands the connection to its upgrade.
+
+        Returns:
+            bool: Whether the connection stays open for the next request.
+        """
+        if response.upgrade is not None:
+            lines = [f"HTTP/1.1 {response.status} {reason_phrase(response.status)}"]
+            lines.extend(f"{name}: {value}" for name, value in response.headers.items())
+            try:
+                await stream.send(("\r\n".join(lines) + "\r\n\r\n").encode("latin-1"))
+                await response.upgrade(stream, receiver)
+            except (anyio.BrokenResourceError, anyio.ClosedResourceError):
+                pass
+            return False
+
+        keep_alive = request is not None and request.keep_alive and response.headers.get("connection") != "close"
+        head = request is not None and request.method == "HEAD"
+        try:
+            await self.write_response(stream, response, keep_alive=keep_alive, head=head)
+        except (anyio.BrokenResourceError, anyio.ClosedResourceError):
+            return False
+        return keep_alive
+
+    async def call_handler(self, request: HttpRequest) -> HttpResponse:
+        try:
+            return await self.handler(request)
+        except HttpError as e:
+            return self.error_response(e)
+        except Exception:
+            self.logger.exception("Handler failed on %s %s", request.method, request.path)
+            return self.error_response(HttpError(500))
+
+    async def read_request(self, receiver: BufferedByteReceiveStream) -> HttpRequest | None:
+        """
+        Reads the next request of a connection.
+
+        Args:
+            receiver (BufferedByteReceiveStream): The connection.
+
+        Returns:
+            HttpRequest | None: The request, None if the client closed the connection.
+
+        Raises:
+            HttpError: If the request is malformed or too big.
+        """
+        try:
+            head = await receiver.receive_until(b"\r\n\r\n", self.max_header_size)
+        except anyio.DelimiterNotFound as e:
+            raise HttpError(431) from e
+        except anyio.IncompleteRead:
+            return None
+
+        request_line, *header_lines = head.decode("latin-1").split("\r\n")
+        try:
+            method, target, version = request_line.split(" ")
+        except ValueError as e:
+            raise HttpError(400, "Malformed request line") from e
+        if not version.startswith("HTTP/1."):
+            raise HttpError(505)
+        headers = {}
+        for line in header_lines:
+            name, sep, value = line.partition(":")
+            if not sep:
+                raise HttpError(400, "Malformed header")
+            headers[name.strip().lower()] = value.strip()
+
+        body = await self.read_body(receiver, headers)
+        return HttpRequest(method, target, version, headers, body)
+
+    async def read_body(self, receiver: BufferedByteReceiveStream, headers: dict[str, str]) -> bytes:
+        if "transfer-encoding" in headers and "content-length" in headers:
+            # Proxies in front of us could pick the other one, the body would be read as the next request
+            raise HttpError(400, "Transfer-encoding and content-length can't be combined")
+        if headers.get("transfer-encoding", "").lower() == "chunked":
+            return await self.read_chunked_body(receiver)
+        content_length = headers.get("content-length", "0")
+        # int() would also take a sign, whitespace or underscores
+        if not (content_length.isascii() and content_length.isdigit()):
+            raise HttpError(400, "Malformed content-length")
+        length = int(content_length)
+        if length > self.max_body_size:
+            raise HttpError(413)
+        return await receiver.receive_exactly(length) if length else b""
+
+    async def read_chunked_body(self, receiver: BufferedByteReceiveStream) -> bytes:
+        chunks = []
+        size = 0
+        while True:
+            try:
+                line = await receiver.receive_until(b"\r\n", 1024)
+            except anyio.DelimiterNotFound as e:
+                raise HttpError(400, "Malformed chunk") from e
+            digits, extension, _ = line.partition(b";")
+            if extension:
+                digits = digits.rstrip(b" \t")  # Whitespace is allowed before the extension, not around the size
+            # int() would also take a sign, whitespace, underscores or a 0x prefix
+            if not digits or not HEX_DIGITS.issuperset(digits):
+                raise HttpError(400, "Malformed chunk")
+            chunk_size = int(digits, 16)
+            if chunk_size == 0:
+                # Skip the trailers
+                while await receiver.receive_until(b"\r\n", self.max_header_size):
+                    pass
+                return b"".join(chunks)
+            size += chunk_size
+            if size > self.max_body_size:
+                raise HttpError(413)
+            chunks.append(await receiver.receive_exactly(chunk_size))
+            await receiver.receive_exactly(2)
+
+    async def write_response(
+        self,
+        stream: SocketStream,
+        response: HttpResponse,
+        *,
+        keep_alive: bool,
+        head: bool = False,
+    ) -> None:
+        headers = dict(response.headers)
+        headers["connection"] = "keep-alive" if keep_alive else "close"
+        if response.stream is None:
+            headers["content-length"] = str(len(response.body))
+        else:
+            headers["transfer-encoding"] = "chunked"
+        lines = [f"HTTP/1.1 {response.status} {reason_phrase(response.status)}"]
+        lines.extend(f"{name}: {value}" for name, value in headers.items())
+        data = ("\r\n".join(lines) + "\r\n\r\n").encode("latin-1")
+
+        if head:
+            await stream.send(data)
+        elif response.stream is None:
+            await stream.send(data + response.body)
+        else:
+            await stream.send(data)
+            async for chunk in response.stream:
+                if chunk:
+                    await stream.send(b"%x\r\n%s\r\n" % (len(chunk), chunk))
+            await stream.send(b"0\r\n\r\n")
+
+    def error_response(self, error: HttpError) -> HttpResponse:
+        return HttpResponse.json({"error": error.message}, error.status, error.headers)
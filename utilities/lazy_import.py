@@ -0,0 +1,33 @@
+import importlib.util
+import sys
+from types import ModuleType
+
+
+def lazy_import(name: str) -> ModuleType:
+    """
+    Imports a top level package lazily: the module object is returned right away, the package is executed on the
+    first attribute access. Every plugin module is imported during plugin discovery, activated or not, so plugins use
+    this for heavy SDKs that are only needed once the plugin is set up.
+
+    Args:
+        name (str): The name of the package, submodules are reached through its attributes.
+
+    Raises:
+        ModuleNotFoundError: If the package is not installed.
+
+    Returns:
+        ModuleType: The module.
+    """
+    module = sys.modules.get(name)
+    if module is not None:
+        return module
+    spec = importlib.util.find_spec(name)
+    if spec is None or spec.loader is None:
+        msg = f"No module named {name!r}"
+        raise ModuleNotFoundError(msg, name=name)
+    loader = importlib.util.LazyLoader(spec.loader)
+    spec.loader = loader
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[name] = module
+    loader.exec_module(module)
+    return module
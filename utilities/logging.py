@@ -1,6 +1,17 @@
+import atexit
+import contextlib
+import json
 import logging
+import queue
+import random
+from collections.abc import Iterator
+from contextvars import ContextVar
+from datetime import UTC, datetime
+from logging.handlers import QueueHandler, QueueListener
+from typing import Literal
 
 import colorlog
+from pydantic_settings import BaseSettings, SettingsConfigDict
 
 formatter = colorlog.ColoredFormatter(
     "%(light_white)s%(asctime)s%(reset)s  "
@@ -18,6 +29,10 @@ logging.basicConfig(
     handlers=[handler],
 )
 
+# The request that is being handled, set by the receivers for the whole workflow (tasks started from it inherit them)
+request_id_var: ContextVar[str | None] = ContextVar("request_id", default=None)
+user_id_var: ContextVar[str | None] = ContextVar("user_id", default=None)
+
 
 def get_logger(name: str) -> logging.Logger:
     """
@@ -31,3 +46,171 @@ def get_logger(name: str) -> logging.Logger:
 
     """
     return logging.getLogger(name)
+
+
+@contextlib.contextmanager
+def log_context(*, request_id: str | None = None, user_id: str | None = None) -> Iterator[None]:
+    """
+    Adds the request id and user id to every record logged inside the block, in this task and the tasks it starts.
+    """
+    request_token = request_id_var.set(request_id)
+    user_token = user_id_var.set(user_id)
+    try:
+        yield
+    finally:
+        user_id_var.reset(user_token)
+        request_id_var.reset(request_token)
+
+
+class LoggingConfig(BaseSettings):
+    """
+    Read from the environment (or .env), e.g. LOG_FORMAT=json or LOG_LEVELS='{"httpx": "WARNING"}'.
+    """
+
+    model_config = SettingsConfigDict(env_prefix="LOG_", frozen=True)
+
+    format: Literal["text", "json"] = "text"  # json writes one object per line with request_id and user_id
+    level: str = "INFO"  # level of the root logger
+    levels: dict[str, str] = {}  # levels of single loggers (and their children), e.g. {"httpx": "WARNING"}
+    sample_rates: dict[str, float] = {}  # fraction of DEBUG/INFO records of a logger that are kept, e.g. {"httpx": 0.1}
+    background: bool = True  # write the logs from a background thread, so the event loop never waits on stderr
+
+
+class ContextFilter(logging.Filter):
+    """
+    Adds request_id and user_id to the records. Has to run in the thread that logs, the context variables are not
+    visible from the background thread.
+    """
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        record.request_id = request_id_var.get()
+        record.user_id = user_id_var.get()
+        return True
+
+
+class SamplingFilter(logging.Filter):
+    """
+    Drops a part of the DEBUG and INFO records of chatty loggers, warnings and errors are always kept. A rate applies
+    to the logger and all its children.
+    """
+
+    def __init__(self, sample_rates: dict[str, float]) -> None:
+        super().__init__()
+        self.sample_rates = sample_rates
+        self._rates: dict[str, float | None] = {}  # resolved rate per logger name
+
+    def rate(self, name: str) -> float | None:
+        if name not in self._rates:
+            rate = None
+            candidate = name
+            while candidate:
+                if candidate in self.sample_rates:
+                    rate = self.sample_rates[candidate]
+                    break
+                candidate = candidate.rpartition(".")[0]
+            self._rates[name] = rate
+        return self._rates[name]
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno >= logging.WARNING:
+            return True
+        rate = self.rate(record.name)
+        return rate is None or random.random() < rate  # noqa: S311 Not used for cryptography
+
+
+class JsonFormatter(logging.Formatter):
+    """
+    Formats records as one json object per line.
+    """
+
+    def format(self, record: logging.LogRecord) -> str:
+        data = {
+            "time": datetime.fromtimestamp(record.created, UTC).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+            "request_id": getattr(record, "request_id", None),
+            "user_id": getattr(record, "user_id", None),
+        }
+        if record.exc_info:
+            data["exception"] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            data["exception"] = record.exc_text
+        if record.stack_info:
+            data["stack"] = self.formatStack(record.stack_info)
+        return json.dumps(data, default=str)
+
+
+class BackgroundQueueHandler(QueueHandler):
+    """
+    Puts the records into the queue of a QueueListener. Unlike the default QueueHandler it only merges the message
+    with its arguments, the formatting (and the exception traceback) is done by the background thread.
+    """
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # The arguments could change before the background thread gets to them
+        record.msg = record.getMessage()
+        record.args = None
+        return record
+
+
+_listener: QueueListener | None = None
+
+
+def configure_logging(config: LoggingConfig | None = None) -> None:
+    """
+    Replaces the default logging setup (colored text, written directly) with the one of the config. Can be called
+    again, e.g. after a .env file was loaded.
+
+    Args:
+        config (LoggingConfig | None, optional): The config, read from the environment if None. Defaults to None.
+
+    Returns:
+        None
+    """
+    global _listener  # noqa: PLW0603 The one listener of the process
+    config = config or LoggingConfig()
+    stop_background_logging()
+
+    output = colorlog.StreamHandler()
+    output.setFormatter(JsonFormatter() if config.format == "json" else formatter)
+    if config.background:
+        log_queue = queue.SimpleQueue()
+        root_handler = BackgroundQueueHandler(log_queue)
+        _listener = QueueListener(log_queue, output)
+        _listener.start()
+    else:
+        root_handler = output
+    root_handler.addFilter(ContextFilter())
+    if config.sample_rates:
+        root_handler.addFilter(SamplingFilter(config.sample_rates))
+
+    root = logging.getLogger()
+    for old_handler in root.handlers[:]:
+        root.removeHandler(old_handler)
+    root.addHandler(root_handler)
+    root.setLevel(config.level.upper())
+    for name, level in config.levels.items():
+        logging.getLogger(name).setLevel(level.upper())
+
+
+def stop_background_logging() -> None:
+    """
+    Writes out everything that is still queued and stops the background thread. Later records are written directly,
+    so nothing logged during the shutdown is lost.
+    """
+    global _listener  # noqa: PLW0603 The one listener of the process
+    if _listener is None:
+        return
+    _listener.stop()
+    root = logging.getLogger()
+    for queue_handler in [h for h in root.handlers if isinstance(h, BackgroundQueueHandler)]:
+        root.removeHandler(queue_handler)
+        for output in _listener.handlers:
+            for log_filter in queue_handler.filters:
+                output.addFilter(log_filter)
+            root.addHandler(output)
+    _listener = None
+
+
+atexit.register(stop_background_logging)
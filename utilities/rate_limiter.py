@@ -0,0 +1,259 @@
+import heapq
+import itertools
+import time
+from collections.abc import Mapping
+from typing import NamedTuple
+
+import anyio
+
+from utilities.logging import get_logger
+
+
+class TokenBucket:
+    """
+    A token bucket that refills continuously with rate tokens per minute and holds at most one minute worth of tokens.
+    The rate adapts AIMD style: it grows additively while requests succeed and is cut in half when the provider
+    rate limits us, but never exceeds the limit.
+
+    Attributes:
+        limit (float | None): The max tokens per minute, None means unlimited until the provider tells us its limit.
+        rate (float | None): The current tokens per minute.
+        tokens (float): The tokens that are available right now.
+    """
+
+    def __init__(self, limit: float | None, *, min_fraction: float = 0.1, increase: float = 0.05) -> None:
+        """
+        Initializes a TokenBucket object.
+
+        Args:
+            limit (float | None): The max tokens per minute, None means unlimited.
+            min_fraction (float, optional): The rate never drops below this fraction of the limit. Defaults to 0.1.
+            increase (float, optional): Fraction of the limit added to the rate per success. Defaults to 0.05.
+
+        Returns:
+            None
+        """
+        self.limit = limit
+        self.rate = limit
+        self.tokens = limit or 0.0
+        self.min_fraction = min_fraction
+        self.increase = increase
+        self.updated = time.monotonic()
+
+    def refill(self) -> None:
+        now = time.monotonic()
+        if self.rate is not None:
+            self.tokens = min(self.rate, self.tokens + (now - self.updated) * self.rate / 60)
+        self.updated = now
+
+    def delay(self, amount: float) -> float:
+        """
+        Returns the seconds until amount tokens are available. Amounts larger than the bucket only wait for a full
+        bucket, otherwise they could never be served.
+        """
+        if self.rate is None:
+            return 0
+        self.refill()
+        missing = min(amount, self.rate) - self.tokens
+        return max(missing, 0) * 60 / self.rate
+
+    def take(self, amount: float) -> None:
+        if self.rate is not None:
+            self.refill()
+            self.tokens -= min(amount, self.rate)
+
+    def give_back(self, amount: float) -> None:
+        if self.rate is not None:
+            self.refill()
+            self.tokens = min(self.rate, self.tokens + amount)
+
+    def on_success(self) -> None:
+        if self.limit is not None:
+            self.rate = min(self.limit, self.rate + self.limit * self.increase)
+
+    def on_rate_limited(self) -> None:
+        if self.limit is not None:
+            self.rate = max(self.limit * self.min_fraction, self.rate / 2)
+            self.refill()
+            self.tokens = min(self.tokens, 0)
+
+    def observe(self, limit: float | None, remaining: float | None) -> None:
+        """
+        Syncs the bucket with the limits the provider reported in its response headers.
+        """
+        if limit is not None and limit != self.limit:
+            self.rate = limit if self.rate is None else min(self.rate, limit)
+            self.limit = limit
+        if remaining is not None and self.rate is not None:
+            self.refill()
+            self.tokens = min(self.tokens, remaining)
+
+
+class Reservation(NamedTuple):
+    input_tokens: int
+    output_tokens: int
+
+
+class AdaptiveRateLimiter:
+    """
+    Client side rate limiter for LLM requests. It keeps token buckets for requests, input tokens and output tokens per
+    minute and adapts them from the rate limit headers and 429 responses of the provider, so bursts are smoothed out
+    below the limit instead of bouncing off it.
+
+    Waiting requests are served one after another, higher priorities first and FIFO within the same priority. Output
+    tokens are unknown before the response, so acquire reserves the max tokens and release settles the reservation
+    with the real usage.
+    """
+
+    BUCKETS = ("requests", "input-tokens", "output-tokens")
+
+    def __init__(  # noqa: PLR0913
+        self,
+        requests_per_minute: float | None = None,
+        input_tokens_per_minute: float | None = None,
+        output_tokens_per_minute: float | None = None,
+        *,
+        header_prefix: str | None = "anthropic-ratelimit-",
+        min_fraction: float = 0.1,
+        increase: float = 0.05,
+    ) -> None:
+        """
+        Initializes an AdaptiveRateLimiter object. Limits that are None are learned from the response headers.
+
+        Args:
+            requests_per_minute (float | None, optional): Max requests per minute. Defaults to None.
+            input_tokens_per_minute (float | None, optional): Max input tokens per minute. Defaults to None.
+            output_tokens_per_minute (float | None, optional): Max output tokens per minute. Defaults to None.
+            header_prefix (str | None, optional): Prefix of the rate limit headers, followed by the bucket name and
+                -limit/-remaining. None ignores the headers. Defaults to "anthropic-ratelimit-".
+            min_fraction (float, optional): The rates never drop below this fraction of the limits. Defaults to 0.1.
+            increase (float, optional): Fraction of the limit the rates grow per success. Defaults to 0.05.
+
+        Returns:
+            None
+        """
+        self.logger = get_logger(__name__)
+        self.header_prefix = header_prefix
+        self.buckets = {
+            name: TokenBucket(limit, min_fraction=min_fraction, increase=increase)
+            for name, limit in zip(
+                self.BUCKETS,
+                (requests_per_minute, input_tokens_per_minute, output_tokens_per_minute),
+                strict=True,
+            )
+        }
+        self.paused_until = 0.0
+        self._queue: list[tuple[int, int, anyio.Event]] = []
+        self._counter = itertools.count()
+
+    @property
+    def waiting(self) -> int:
+        return len(self._queue)
+
+    async def acquire(self, input_tokens: int, output_tokens: int, priority: int = 0) -> Reservation:
+        """
+        Waits until the request fits into all buckets and takes the tokens.
+
+        Args:
+            input_tokens (int): The estimated input tokens of the request.
+            output_tokens (int): The max output tokens of the request.
+            priority (int, optional): Requests with a higher priority are served first. Defaults to 0.
+
+        Returns:
+            Reservation: The reserved tokens, settle them with release once the response is there.
+        """
+        amounts = {"requests": 1, "input-tokens": input_tokens, "output-tokens": output_tokens}
+        entry = (-priority, next(self._counter), anyio.Event())
+        heapq.heappush(self._queue, entry)
+        try:
+            while True:
+                if self._queue[0] is not entry:
+                    # Only the head of the queue waits for the buckets, the others wait for their turn
+                    await entry[2].wait()
+                    entry = self._replace_event(entry)
+                    continue
+                delay = max(
+                    self.paused_until - time.monotonic(),
+                    *(bucket.delay(amounts[name]) for name, bucket in self.buckets.items()),
+                )
+                if delay <= 0:
+                    break
+                await anyio.sleep(delay)
+            for name, bucket in self.buckets.items():
+                bucket.take(amounts[name])
+        finally:
+            self._remove(entry)
+        return Reservation(input_tokens, output_tokens)
+
+    def release(self, reservation: Reservation, input_tokens: int = 0, output_tokens: int = 0) -> None:
+        """
+        Settles a reservation with the real usage, the difference is given back (or taken additionally).
+
+        Args:
+            reservation (Reservation): The reservation of acquire.
+            input_tokens (int, optional): The real input tokens, 0 if the request failed. Defaults to 0.
+            output_tokens (int, optional): The real output tokens, 0 if the request failed. Defaults to 0.
+
+        Returns:
+            None
+        """
+        for name, reserved, used in (
+            ("input-tokens", reservation.input_tokens, input_tokens),
+            ("output-tokens", reservation.output_tokens, output_tokens),
+        ):
+            if used < reserved:
+                self.buckets[name].give_back(reserved - used)
+            else:
+                self.buckets[name].take(used - reserved)
+
+    def on_success(self, headers: Mapping[str, str]) -> None:
+        self.observe(headers)
+        for bucket in self.buckets.values():
+            bucket.on_success()
+
+    def on_rate_limited(self, headers: Mapping[str, str], retry_after: float | None = None) -> None:
+        """
+        Backs off after the provider rate limited a request: all rates are cut in half and nothing is sent until
+        retry_after passed.
+
+        Args:
+            headers (Mapping[str, str]): The headers of the 429 response.
+            retry_after (float | None, optional): Seconds the provider asked us to wait. Defaults to None.
+
+        Returns:
+            None
+        """
+        self.observe(headers)
+        for bucket in self.buckets.values():
+            bucket.on_rate_limited()
+        if retry_after is not None:
+            self.paused_until = max(self.paused_until, time.monotonic() + retry_after)
+        rates = ", ".join(f"{bucket.rate:.0f} {name}/min" for name, bucket in self.buckets.items() if bucket.rate)
+        self.logger.warning("Rate limited, backing off to %s", rates or "unknown limits")
+
+    def observe(self, headers: Mapping[str, str]) -> None:
+        if self.header_prefix is None:
+            return
+        for name, bucket in self.buckets.items():
+            bucket.observe(
+                self._header_number(headers, f"{self.header_prefix}{name}-limit"),
+                self._header_number(headers, f"{self.header_prefix}{name}-remaining"),
+            )
+
+    def _header_number(self, headers: Mapping[str, str], name: str) -> float | None:
+        try:
+            return float(headers[name])
+        except (KeyError, ValueError):
+            return None
+
+    def _replace_event(self, entry: tuple[int, int, anyio.Event]) -> tuple[int, int, anyio.Event]:
+        # anyio events can't be reset, swap in a new one at the same position of the heap
+        new_entry = (entry[0], entry[1], anyio.Event())
+        self._queue[self._queue.index(entry)] = new_entry
+        return new_entry
+
+    def _remove(self, entry: tuple[int, int, anyio.Event]) -> None:
+        self._queue.remove(entry)
+        heapq.heapify(self._queue)
+        if self._queue:
+            self._queue[0][2].set()
@@ -0,0 +1,52 @@
+import random
+import time
+from collections.abc import Mapping
+from email.utils import parsedate_to_datetime
+
+RETRYABLE_STATUS_CODES = frozenset({408, 409, 429, 500, 502, 503, 504, 529})
+
+
+def parse_retry_after(headers: Mapping[str, str]) -> float | None:
+    """
+    Reads how long the server wants us to wait from the retry-after-ms or retry-after header. retry-after can either
+    be a number of seconds or a http date.
+
+    Args:
+        headers (Mapping[str, str]): The response headers.
+
+    Returns:
+        float | None: The seconds to wait, None if the server didn't say.
+    """
+    retry_after_ms = headers.get("retry-after-ms")
+    if retry_after_ms is not None:
+        try:
+            return max(float(retry_after_ms) / 1000, 0)
+        except ValueError:
+            pass
+
+    retry_after = headers.get("retry-after")
+    if retry_after is None:
+        return None
+    try:
+        return max(float(retry_after), 0)
+    except ValueError:
+        pass
+    try:
+        return max(parsedate_to_datetime(retry_after).timestamp() - time.time(), 0)
+    except (TypeError, ValueError):
+        return None
+
+
+def backoff_delay(attempt: int, base_delay: float, max_delay: float) -> float:
+    """
+    Exponential backoff with full jitter, so clients that failed together don't retry together.
+
+    Args:
+        attempt (int): The number of the failed attempt, starting at 0.
+        base_delay (float): The max delay after the first failed attempt in seconds.
+        max_delay (float): The upper bound of the delay in seconds.
+
+    Returns:
+        float: The seconds to wait before the next attempt.
+    """
+    return random.uniform(0, min(max_delay, base_delay * 2**attempt))  # noqa: S311 Not used for cryptography
@@ -0,0 +1,181 @@
+"""
+Measures where the time until the engine is ready goes: the phases of the startup (config load, plugin discovery,
+activation, plugin_setup, first receiver ready) and, with import timing enabled, every module that is imported on the
+way. Start the engine with --profile-startup to get the report.
+"""
+
+import contextlib
+import importlib.abc
+import importlib.machinery
+import sys
+import time
+from collections.abc import Iterator, Sequence
+from types import ModuleType
+from typing import NamedTuple
+
+from utilities.logging import get_logger
+
+
+class ImportTime(NamedTuple):
+    name: str
+    total: float  # seconds, including the modules it imported
+    own: float  # seconds, without the modules it imported
+
+
+class TimedLoader(importlib.abc.Loader):
+    """
+    Wraps the loader of a module and measures how long the module takes to execute. The module gets its original
+    loader back once it is executed.
+    """
+
+    def __init__(self, loader: importlib.abc.Loader, timer: "ImportTimer") -> None:
+        self.loader = loader
+        self.timer = timer
+
+    def create_module(self, spec: importlib.machinery.ModuleSpec) -> ModuleType | None:
+        return self.loader.create_module(spec)
+
+    def exec_module(self, module: ModuleType) -> None:
+        module.__loader__ = self.loader
+        if module.__spec__ is not None:
+            module.__spec__.loader = self.loader
+        self.timer.enter()
+        try:
+            self.loader.exec_module(module)
+        finally:
+            self.timer.exit(module.__name__)
+
+    def __getattr__(self, name: str) -> object:
+        return getattr(self.loader, name)
+
+
+class ImportTimer(importlib.abc.MetaPathFinder):
+    """
+    A meta path finder that finds nothing itself, it asks the other finders and wraps the loader they return so the
+    execution of the module is timed.
+    """
+
+    def __init__(self) -> None:
+        self.times: list[ImportTime] = []
+        self._stack: list[float] = []  # start of every module that is executing, children add their time to the end
+
+    def find_spec(
+        self,
+        fullname: str,
+        path: Sequence[str] | None,
+        target: ModuleType | None = None,
+    ) -> importlib.machinery.ModuleSpec | None:
+        for finder in sys.meta_path:
+            if finder is self or not hasattr(finder, "find_spec"):
+                continue
+            spec = finder.find_spec(fullname, path, target)
+            if spec is not None:
+                if spec.loader is not None and hasattr(spec.loader, "exec_module"):
+                    spec.loader = TimedLoader(spec.loader, self)
+                return spec
+        return None
+
+    def enter(self) -> None:
+        self._stack.append(time.perf_counter())
+        self._stack.append(0.0)
+
+    def exit(self, name: str) -> None:
+        children = self._stack.pop()
+        total = time.perf_counter() - self._stack.pop()
+        if self._stack:
+            self._stack[-1] += total
+        self.times.append(ImportTime(name, total, total - children))
+
+    def install(self) -> None:
+        if self not in sys.meta_path:
+            sys.meta_path.insert(0, self)
+
+    def uninstall(self) -> None:
+        with contextlib.suppress(ValueError):
+            sys.meta_path.remove(self)
+
+
+class Phase(NamedTuple):
+    name: str
+    start: float  # seconds since the profiler was created
+    duration: float
+
+
+class StartupProfiler:
+    """
+    Collects the phases of the startup. Phases are always recorded (it is only a few perf_counter calls), the import
+    timing has to be enabled because it slows down imports a little.
+    """
+
+    def __init__(self) -> None:
+        self.logger = get_logger(__name__)
+        self.started = time.perf_counter()
+        self.phases: list[Phase] = []
+        self.marks: dict[str, float] = {}
+        self.import_timer: ImportTimer | None = None
+
+    def enable_import_timing(self) -> None:
+        if self.import_timer is None:
+            self.import_timer = ImportTimer()
+            self.import_timer.install()
+
+    @contextlib.contextmanager
+    def phase(self, name: str) -> Iterator[None]:
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            end = time.perf_counter()
+            self.phases.append(Phase(name, start - self.started, end - start))
+            self.logger.debug("Startup phase '%s' took %.1f ms", name, (end - start) * 1000)
+
+    def mark(self, name: str) -> bool:
+        """
+        Records the first time something happened (e.g. the first receiver is ready).
+
+        Args:
+            name (str): The name of the mark.
+
+        Returns:
+            bool: True if this was the first time, False if the mark was already set.
+        """
+        if name in self.marks:
+            return False
+        self.marks[name] = time.perf_counter() - self.started
+        return True
+
+    def report(self, top: int = 25) -> str:
+        """
+        Formats the phases, marks and the slowest imports as a table.
+
+        Args:
+            top (int, optional): The number of imports to list. Defaults to 25.
+
+        Returns:
+            str: The report.
+        """
+        lines = ["Startup profile (ms since start, duration in ms):"]
+        lines.extend(f"  {p.start * 1000:9.1f}  {p.duration * 1000:9.1f}  {p.name}" for p in self.phases)
+        lines.extend(f"  {at * 1000:9.1f}  {'':>9}  {name}" for name, at in self.marks.items())
+        if self.import_timer is not None:
+            times = self.import_timer.times
+            lines.append(f"Slowest of {len(times)} imports (own ms, total ms):")
+            lines.extend(
+                f"  {t.own * 1000:9.1f}  {t.total * 1000:9.1f}  {t.name}"
+                for t in sorted(times, key=lambda t: t.own, reverse=True)[:top]
+            )
+            # Packages show the time of everything they pulled in, that is where lazy imports help the most
+            packages = {}
+            for t in times:
+                root = t.name.partition(".")[0]
+                packages[root] = packages.get(root, 0.0) + t.own
+            lines.append("Imports by top level package (ms):")
+            lines.extend(
+                f"  {seconds * 1000:9.1f}  {name}"
+                for name, seconds in sorted(packages.items(), key=lambda item: item[1], reverse=True)[:top]
+            )
+        return "\n".join(lines)
+
+
+# One profiler for the whole process, the engine and the plugin manager record their phases on it
+startup_profiler = StartupProfiler()
@@ -0,0 +1,15 @@
+import math
+
+
+def estimate_tokens(text: str) -> int:
+    """
+    Roughly estimates the number of LLM tokens of a text without needing a tokenizer. Most tokenizers end up at about
+    four characters per token for english text, that is good enough for budgets and limits.
+
+    Args:
+        text (str): The text to estimate.
+
+    Returns:
+        int: The estimated number of tokens.
+    """
+    return math.ceil(len(text) / 4)
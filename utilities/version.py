@@ -1,8 +1,16 @@
+import functools
 import tomllib
 from pathlib import Path
 
+PYPROJECT_FILE = Path(__file__).resolve().parent.parent / "pyproject.toml"
 
-def get_version() -> str:  #
-    with Path.open(Path("pyproject.toml"), "rb") as f:
+
+@functools.cache
+def get_version() -> str:
+    """
+    Reads the version of the engine from its pyproject.toml, once. The file is found relative to this module, so it
+    does not depend on the working directory.
+    """
+    with PYPROJECT_FILE.open("rb") as f:
         data = tomllib.load(f)
         return data["tool"]["poetry"]["version"]
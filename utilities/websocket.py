@@ -0,0 +1,223 @@
+"""
+WebSockets (RFC 6455) for the HttpServer: websocket_response answers the upgrade request and hands the connection to a
+handler that sends and receives messages. Extensions (e.g. compression) are not supported, clients work without them.
+"""
+
+import base64
+import contextlib
+import hashlib
+import struct
+from collections.abc import Awaitable, Callable
+
+import anyio
+from anyio.abc import SocketStream
+from anyio.streams.buffered import BufferedByteReceiveStream
+
+from utilities.http_server import HttpError, HttpRequest, HttpResponse
+
+WEBSOCKET_GUID = "258EAFA5-E914-47DA-95CA-C5AB0DC85B11"
+
+OPCODE_CONTINUATION = 0x0
+OPCODE_TEXT = 0x1
+OPCODE_BINARY = 0x2
+OPCODE_CLOSE = 0x8
+OPCODE_PING = 0x9
+OPCODE_PONG = 0xA
+
+CLOSE_NORMAL = 1000
+CLOSE_PROTOCOL_ERROR = 1002
+CLOSE_INVALID_DATA = 1007
+CLOSE_TOO_BIG = 1009
+
+SHORT_LENGTH = 126  # lengths from here on are sent in 2 bytes
+LONG_LENGTH = 2**16  # lengths from here on are sent in 8 bytes
+
+
+class WebSocketClosedError(Exception):
+    """
+    Raised by receive and send once the connection is closed.
+    """
+
+    def __init__(self, code: int = CLOSE_NORMAL) -> None:
+        self.code = code
+        super().__init__(f"The websocket is closed ({code})")
+
+
+def unmask(payload: bytes, mask: bytes) -> bytes:
+    # XOR as one big integer, a lot faster than byte by byte in python
+    length = len(payload)
+    if not length:
+        return payload
+    key = (mask * (length // 4 + 1))[:length]
+    return (int.from_bytes(payload, "little") ^ int.from_bytes(key, "little")).to_bytes(length, "little")
+
+
+def encode_frame(opcode: int, payload: bytes) -> bytes:
+    length = len(payload)
+    if length < SHORT_LENGTH:
+        header = struct.pack("!BB", 0x80 | opcode, length)
+    elif length < LONG_LENGTH:
+        header = struct.pack("!BBH", 0x80 | opcode, SHORT_LENGTH, length)
+    else:
+        header = struct.pack("!BBQ", 0x80 | opcode, 127, length)
+    return header + payload
+
+
+class WebSocket:
+    """
+    The server side of a websocket connection. receive and send can be used from different tasks at the same time.
+    """
+
+    def __init__(self, stream: SocketStream, receiver: BufferedByteReceiveStream, max_message_size: int) -> None:
+        self.stream = stream
+        self.receiver = receiver
+        self.max_message_size = max_message_size
+        self.send_lock = anyio.Lock()
+        self.closed = False
+
+    async def receive(self) -> str | bytes:
+        """
+        Waits for the next message, pings are answered on the way.
+
+        Raises:
+            WebSocketClosedError: If the client closed the connection or broke the protocol.
+
+        Returns:
+            str | bytes: The message, str for text messages.
+        """
+        message_opcode = None
+        fragments: list[bytes] = []
+        size = 0
+        while True:
+            fin, opcode, payload = await self.receive_frame()
+            if opcode == OPCODE_PING:
+                await self.send_frame(OPCODE_PONG, payload)
+                continue
+            if opcode == OPCODE_PONG:
+                continue
+            if opcode == OPCODE_CLOSE:
+                code = struct.unpack("!H", payload[:2])[0] if len(payload) >= 2 else CLOSE_NORMAL  # noqa: PLR2004
+                await self.close(code)
+                raise WebSocketClosedError(code)
+            if (opcode == OPCODE_CONTINUATION) == (message_opcode is None):
+                # A continuation without a message or a new message in the middle of one
+                await self.close(CLOSE_PROTOCOL_ERROR)
+                raise WebSocketClosedError(CLOSE_PROTOCOL_ERROR)
+            message_opcode = message_opcode or opcode
+            size += len(payload)
+            if size > self.max_message_size:
+                await self.close(CLOSE_TOO_BIG)
+                raise WebSocketClosedError(CLOSE_TOO_BIG)
+            fragments.append(payload)
+            if fin:
+                data = b"".join(fragments)
+                if message_opcode != OPCODE_TEXT:
+                    return data
+                try:
+                    return data.decode()
+                except UnicodeDecodeError as e:
+                    await self.close(CLOSE_INVALID_DATA)
+                    raise WebSocketClosedError(CLOSE_INVALID_DATA) from e
+
+    async def receive_frame(self) -> tuple[bool, int, bytes]:
+        try:
+            first, second = await self.receiver.receive_exactly(2)
+            length = second & 0x7F
+            if length == SHORT_LENGTH:
+                length = struct.unpack("!H", await self.receiver.receive_exactly(2))[0]
+            elif length == 127:  # noqa: PLR2004 The marker of 8 byte lengths
+                length = struct.unpack("!Q", await self.receiver.receive_exactly(8))[0]
+            if length > self.max_message_size:
+                await self.close(CLOSE_TOO_BIG)
+                raise WebSocketClosedError(CLOSE_TOO_BIG)
+            if not second & 0x80:
+                # Clients have to mask their frames
+                await self.close(CLOSE_PROTOCOL_ERROR)
+                raise WebSocketClosedError(CLOSE_PROTOCOL_ERROR)
+            mask = await self.receiver.receive_exactly(4)
+            payload = unmask(await self.receiver.receive_exactly(length), mask) if length else b""
+        except (anyio.EndOfStream, anyio.IncompleteRead, anyio.BrokenResourceError, anyio.ClosedResourceError) as e:
+            self.closed = True
+            raise WebSocketClosedError from e
+        return bool(first & 0x80), first & 0x0F, payload
+
+    async def send(self, data: str | bytes) -> None:
+        """
+        Sends a text (str) or binary (bytes) message.
+
+        Raises:
+            WebSocketClosedError: If the connection is closed.
+        """
+        if isinstance(data, str):
+            await self.send_frame(OPCODE_TEXT, data.encode())
+        else:
+            await self.send_frame(OPCODE_BINARY, data)
+
+    async def send_frame(self, opcode: int, payload: bytes) -> None:
+        if self.closed:
+            raise WebSocketClosedError
+        async with self.send_lock:
+            try:
+                await self.stream.send(encode_frame(opcode, payload))
+            except (anyio.BrokenResourceError, anyio.ClosedResourceError) as e:
+                self.closed = True
+                raise WebSocketClosedError from e
+
+    async def close(self, code: int = CLOSE_NORMAL) -> None:
+        """
+        Sends the close frame, if it was not sent yet.
+        """
+        if self.closed:
+            return
+        with contextlib.suppress(WebSocketClosedError):
+            await self.send_frame(OPCODE_CLOSE, struct.pack("!H", code))
+        self.closed = True
+
+
+def websocket_response(
+    request: HttpRequest,
+    handler: Callable[[WebSocket], Awaitable[None]],
+    max_message_size: int = 10 * 2**20,
+) -> HttpResponse:
+    """
+    Accepts a websocket upgrade request. The handler gets the websocket once the upgrade is sent, the connection is
+    closed when it returns.
+
+    Args:
+        request (HttpRequest): The upgrade request.
+        handler (Callable[[WebSocket], Awaitable[None]]): Serves the websocket.
+        max_message_size (int, optional): Max size of a received message. Defaults to 10 MiB.
+
+    Raises:
+        HttpError: If the request is no websocket upgrade.
+
+    Returns:
+        HttpResponse: The 101 response.
+    """
+    key = request.headers.get("sec-websocket-key")
+    if (
+        request.method != "GET"
+        or request.headers.get("upgrade", "").lower() != "websocket"
+        or "upgrade" not in request.headers.get("connection", "").lower()
+        or not key
+    ):
+        raise HttpError(400, "Expected a websocket upgrade")
+    if request.headers.get("sec-websocket-version") != "13":
+        raise HttpError(426, headers={"sec-websocket-version": "13"})
+    accept = base64.b64encode(hashlib.sha1((key + WEBSOCKET_GUID).encode()).digest()).decode()  # noqa: S324 The protocol
+
+    async def upgrade(stream: SocketStream, receiver: BufferedByteReceiveStream) -> None:
+        websocket = WebSocket(stream, receiver, max_message_size)
+        try:
+            await handler(websocket)
+        except WebSocketClosedError:
+            pass
+        finally:
+            with anyio.CancelScope(shield=True):
+                await websocket.close()
+
+    return HttpResponse(
+        101,
+        headers={"upgrade": "websocket", "connection": "Upgrade", "sec-websocket-accept": accept},
+        upgrade=upgrade,
+    )
@@ -0,0 +1,239 @@
+import contextlib
+import enum
+import os
+from collections.abc import Awaitable, Callable, Iterator
+from pathlib import Path
+from typing import BinaryIO
+
+import anyio
+
+from utilities.logging import get_logger
+
+
+class Durability(enum.StrEnum):
+    """
+    How hard a flush tries to make the written data survive a crash.
+
+    Attributes:
+        NONE: Write the data and let the OS decide when it hits the disk.
+        BATCH: fsync once per group commit.
+        WRITE: Flush and fsync every single change before the caller continues.
+    """
+
+    NONE = "none"
+    BATCH = "batch"
+    WRITE = "write"
+
+
+class WriteBehindError(Exception):
+    """
+    Raised by WriteBehindQueue.mark_dirty once the background flushes failed more than max_retries times in a row, and
+    by close if its last flush fails. The changes stay dirty, close tries to write them one last time.
+    """
+
+
+class WriteBehindQueue:
+    """
+    Collects changed keys (e.g. user ids) and hands them to a flush callback in batches. Changes are grouped until
+    either flush_interval seconds passed since the first change or flush_max_changes changes came in, so a burst of
+    changes from many users ends up in a single write. The dirty set is bounded, if it is full the caller has to wait
+    until the next flush is done.
+
+    The run method has to be started as a background task (see PluginManager.start_background_task) and close should
+    be called on shutdown to flush everything that is left. A failed flush is retried with a growing delay, after
+    max_retries failures in a row the queue counts as failed and mark_dirty and close raise WriteBehindError.
+    """
+
+    def __init__(  # noqa: PLR0913
+        self,
+        flush: Callable[..., Awaitable[None]],
+        *,
+        flush_interval: float = 0.5,
+        flush_max_changes: int = 50,
+        max_dirty: int = 1000,
+        durability: Durability = Durability.BATCH,
+        max_retries: int = 5,
+    ) -> None:
+        """
+        Initializes a WriteBehindQueue object.
+
+        Args:
+            flush (Callable[..., Awaitable[None]]): Called as flush(keys, fsync=bool) with the set of dirty keys.
+            flush_interval (float, optional): Max seconds a change waits before it gets flushed. Defaults to 0.5.
+            flush_max_changes (int, optional): Number of changes that triggers an early flush. Defaults to 50.
+            max_dirty (int, optional): Max number of dirty keys before callers have to wait. Defaults to 1000.
+            durability (Durability, optional): The durability policy. Defaults to Durability.BATCH.
+            max_retries (int, optional): Failed flushes in a row until the queue gives up. Defaults to 5.
+
+        Returns:
+            None
+        """
+        self.logger = get_logger(__name__)
+        self.durability = durability
+        self._flush = flush
+        self._flush_interval = flush_interval
+        self._flush_max_changes = flush_max_changes
+        self._max_dirty = max_dirty
+        self._max_retries = max_retries
+        self._failures = 0
+        self.error: BaseException | None = None  # The last flush error once the queue gave up
+        self._dirty: set[str] = set()
+        self._changes = 0
+        self._closed = False
+        self._lock = anyio.Lock()
+        self._wakeup = anyio.Event()
+        self._flushed = anyio.Event()
+
+    @property
+    def pending(self) -> int:
+        return len(self._dirty)
+
+    async def mark_dirty(self, key: str) -> None:
+        """
+        Marks the given key as changed. Returns right away unless the durability policy is Durability.WRITE or the
+        dirty set is full.
+
+        Args:
+            key (str): The key that changed.
+
+        Raises:
+            WriteBehindError: If the queue gave up flushing, the change is kept but not written.
+
+        Returns:
+            None
+        """
+        self._dirty.add(key)
+        self._changes += 1
+        self._raise_if_failed()
+        if self._closed or self.durability is Durability.WRITE:
+            await self.flush()
+            return
+
+        self._wakeup.set()
+        while len(self._dirty) > self._max_dirty:
+            await self._flushed.wait()
+            self._raise_if_failed()
+
+    async def run(self) -> None:
+        """
+        Flushes the dirty keys in batches until close is called.
+        """
+        while not self._closed and self.error is None:
+            if self._failures:
+                # The keys of the failed flush are still dirty, retry them later even if nothing else changes
+                await anyio.sleep(self._flush_interval * 2**self._failures)
+            else:
+                await self._wakeup.wait()
+                self._wakeup = anyio.Event()
+                # Give other changes the chance to join this batch
+                with anyio.move_on_after(self._flush_interval):
+                    while not self._batch_full():
+                        await self._wakeup.wait()
+                        self._wakeup = anyio.Event()
+            try:
+                await self.flush()
+            except Exception as e:
+                self._failures += 1
+                if self._failures > self._max_retries:
+                    self.error = e
+                    self.logger.exception("Failed to flush %s dirty entries, giving up", self.pending)
+                    return
+                self.logger.exception(
+                    "Failed to flush %s dirty entries, retry %s of %s",
+                    self.pending,
+                    self._failures,
+                    self._max_retries,
+                )
+            else:
+                self._failures = 0
+
+    async def flush(self) -> None:
+        """
+        Flushes all dirty keys right now. If the flush callback fails the keys stay dirty and the error is raised.
+        """
+        async with self._lock:
+            if not self._dirty:
+                return
+            keys, self._dirty = self._dirty, set()
+            changes, self._changes = self._changes, 0
+            try:
+                await self._flush(keys, fsync=self.durability is not Durability.NONE)
+            except BaseException:
+                self._dirty |= keys
+                self._changes += changes
+                raise
+            finally:
+                self._flushed.set()
+                self._flushed = anyio.Event()
+            self.logger.debug("Flushed %s keys (%s changes)", len(keys), changes)
+
+    async def close(self) -> None:
+        """
+        Stops the background loop and flushes everything that is left.
+
+        Raises:
+            WriteBehindError: If the last flush failed, the dirty changes are lost.
+        """
+        self._closed = True
+        self._wakeup.set()
+        try:
+            await self.flush()
+        except Exception as e:
+            msg = f"Failed to flush {self.pending} dirty entries on close"
+            raise WriteBehindError(msg) from e
+
+    def _raise_if_failed(self) -> None:
+        if self.error is not None:
+            msg = f"Flushing failed {self._failures} times in a row, {self.pending} dirty entries are not written"
+            raise WriteBehindError(msg) from self.error
+
+    def _batch_full(self) -> bool:
+        return self._closed or self._changes >= self._flush_max_changes or len(self._dirty) >= self._max_dirty
+
+
+@contextlib.contextmanager
+def open_atomic(path: Path, *, fsync: bool) -> Iterator[BinaryIO]:
+    """
+    Opens a temporary file next to path for writing and replaces path with it once the block is done, so readers never
+    see a half written file. If the block raises, path is left untouched. This is blocking, run it in a worker thread.
+
+    Args:
+        path (Path): The file to write.
+        fsync (bool): Whether to fsync the file and its directory before returning.
+
+    Yields:
+        BinaryIO: The temporary file to write to.
+    """
+    tmp_path = path.with_name(path.name + ".tmp")
+    try:
+        with tmp_path.open("wb") as f:
+            yield f
+            if fsync:
+                f.flush()
+                os.fsync(f.fileno())
+    except BaseException:
+        tmp_path.unlink(missing_ok=True)
+        raise
+    tmp_path.replace(path)
+    if fsync:
+        dir_fd = os.open(path.parent, os.O_RDONLY)
+        try:
+            os.fsync(dir_fd)
+        finally:
+            os.close(dir_fd)
+
+
+def write_file_atomic(path: Path, data: bytes, *, fsync: bool) -> None:
+    """
+    Writes data to path atomically, see open_atomic. This is blocking, run it in a worker thread.
+
+    Args:
+        path (Path): The file to write.
+        data (bytes): The new content of the file.
+        fsync (bool): Whether to fsync the file and its directory before returning.
+
+    Returns:
+        None
+    """
+    with open_atomic(path, fsync=fsync) as f:
+        f.write(data)